@@ -0,0 +1,286 @@
+"""
+End-to-end API benchmark
+
+Starts the API with uvicorn on a database of your choice, typically one built by
+data_collection/synthetic_db.py, and drives every /api endpoint in turn from
+--concurrency keep-alive clients. Each endpoint runs for --requests requests or
+--seconds seconds, whichever ends first, after --warmup untimed requests; endpoints are
+only driven once /api/ready reports the server warm. Reports throughput, p50/p95/p99
+latency and errors per endpoint plus the server's peak RSS and startup time.
+--startup-budget fails the run when the server takes too long to start listening, --json
+saves a run together with the git commit, and --compare prints the change against a
+saved run.
+
+    python ../data_collection/synthetic_db.py --out /tmp/campus_3y.db --aq-years 3
+    python bench_api.py --db /tmp/campus_3y.db --concurrency 8 --json before.json
+    python bench_api.py --db /tmp/campus_3y.db --concurrency 8 --compare before.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HERE = Path(__file__).parent
+
+SERVER = """
+import sys
+sys.path.insert(0, {here!r})
+import uvicorn
+from main import app
+uvicorn.run(app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def _day(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _month(year: int, month: int, offset: int = 0) -> str:
+    index = year * 12 + month - 1 + offset
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def endpoints(db_path: str) -> Dict[str, Tuple[str, str, Optional[Any]]]:
+    """name -> (method, path, JSON body), with parameters picked from the data in db_path"""
+    conn = sqlite3.connect(db_path)
+    try:
+        aq_end = conn.execute("SELECT MAX(ts) FROM aq_hourly").fetchone()[0]
+        first = conn.execute("SELECT year, month FROM vegetation_data ORDER BY year, month LIMIT 1").fetchone()
+        last = conn.execute("SELECT year, month FROM vegetation_data ORDER BY year DESC, month DESC LIMIT 1").fetchone()
+        cells = conn.execute("SELECT lat, lon FROM vegetation_data WHERE year = ? AND month = ? LIMIT 100", last).fetchall()
+        stops = conn.execute("SELECT stop_lat, stop_lon FROM transit_stops LIMIT 100").fetchall()
+    finally:
+        conn.close()
+
+    year_ago, today = _day(aq_end - 365 * 86400), _day(aq_end)
+    lat, lon = stops[0]
+    points = [{"lat": la, "lon": lo} for la, lo in stops]
+    box = f"south={lat - 0.01}&west={lon - 0.01}&north={lat + 0.01}&east={lon + 0.01}"
+    change = (f"before_start={_month(*first)}&before_end={_month(*first, 11)}"
+              f"&after_start={_month(*last, -11)}&after_end={_month(*last)}")
+    return {
+        "health": ("GET", "/api/health", None),
+        "aq_current": ("GET", "/api/air-quality/current", None),
+        "aq_historical": ("GET", "/api/air-quality/historical?limit=720", None),
+        "aq_historical_daily": ("GET", f"/api/air-quality/historical?start_date={year_ago}&end_date={today}&resolution=day&limit=400", None),
+        "aq_historical_lttb": ("GET", f"/api/air-quality/historical?start_date={year_ago}&end_date={today}&max_points=500&limit=10000", None),
+        "aq_openaq": ("GET", "/api/air-quality/openaq?hours=168", None),
+        "aq_rollups": ("GET", "/api/air-quality/rollups?metric=pm2_5&period=day", None),
+        "aq_percentiles": ("GET", f"/api/air-quality/percentiles?q=0.05,0.5,0.95&start_date={year_ago}&end_date={today}", None),
+        "weather_forecast": ("GET", "/api/weather/forecast", None),
+        "weather_historical": ("GET", "/api/weather/historical?limit=365", None),
+        "weather_climatology": ("GET", "/api/weather/climatology", None),
+        "weather_current": ("GET", "/api/weather/current", None),
+        "ndvi_latest": ("GET", "/api/ndvi/latest", None),
+        "ndvi_timeseries": ("GET", f"/api/ndvi/timeseries?lat={cells[0][0]}&lon={cells[0][1]}", None),
+        "ndvi_timeseries_batch": ("POST", "/api/ndvi/timeseries/batch", {"points": [{"lat": a, "lon": b} for a, b in cells]}),
+        "ndvi_stats": ("GET", "/api/ndvi/stats", None),
+        "ndvi_monthly": ("GET", "/api/ndvi/monthly-average", None),
+        "ndvi_rasters": ("GET", "/api/ndvi/rasters", None),
+        "ndvi_raster": ("GET", "/api/ndvi/raster", None),
+        "ndvi_raster_png": ("GET", "/api/ndvi/raster.png", None),
+        "ndvi_change": ("GET", f"/api/ndvi/change?{change}", None),
+        "ndvi_trend": ("GET", "/api/ndvi/trend", None),
+        "transit_stops": ("GET", "/api/transit/stops", None),
+        "transit_routes": ("GET", "/api/transit/routes", None),
+        "stops_nearest": ("GET", f"/api/transit/stops/nearest?lat={lat}&lon={lon}&k=5", None),
+        "stops_within": ("GET", f"/api/transit/stops/within?lat={lat}&lon={lon}&radius_m=500", None),
+        "stops_bbox": ("GET", f"/api/transit/stops/bbox?{box}", None),
+        "stops_nearest_batch": ("POST", "/api/transit/stops/nearest/batch", {"points": points, "k": 5}),
+        "stops_within_batch": ("POST", "/api/transit/stops/within/batch", {"points": points, "radius_m": 500}),
+        "dashboard": ("GET", "/api/dashboard/summary", None),
+        "correlation": ("GET", "/api/analytics/correlation?max_lag=14", None),
+        "ml_forecast": ("GET", "/api/ml/air-quality-forecast?days=7", None),
+        "ml_energy": ("GET", "/api/ml/energy-prediction?hours=24", None),
+        "ml_anomalies": ("GET", "/api/ml/anomalies", None),
+        "ml_model_info": ("GET", "/api/ml/model-info", None),
+        "batch_dashboard": ("POST", "/api/batch", {"requests": [
+            {"path": "/api/health"}, {"path": "/api/air-quality/current"}, {"path": "/api/weather/current"},
+            {"path": "/api/ndvi/stats"}, {"path": "/api/transit/routes"}, {"path": "/api/dashboard/summary"}]}),
+        "metrics": ("GET", "/metrics", None),
+    }
+
+
+def _get_status(port: int, path: str) -> Optional[int]:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", path)
+        return conn.getresponse().status
+    except OSError:
+        return None
+
+
+def start_server(db_path: str, port: int, verbose: bool = False) -> Tuple[subprocess.Popen, Dict[str, float]]:
+    """Run the API in a child process and wait until it is ready; returns it and the
+    seconds from launch until it answered /api/health (listening) and /api/ready (warm)"""
+    code = SERVER.format(here=str(HERE), port=port)
+    env = dict(os.environ, DATABASE_PATH=str(Path(db_path).resolve()))
+    launched = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=HERE, env=env,
+                            stdout=None if verbose else subprocess.DEVNULL,
+                            stderr=None if verbose else subprocess.DEVNULL)
+    startup = {}
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("API server exited during startup (rerun with --verbose)")
+        for phase, path in (("listening_s", "/api/health"), ("ready_s", "/api/ready")):
+            if phase not in startup and _get_status(port, path) == 200:
+                startup[phase] = round(time.perf_counter() - launched, 3)
+        if "ready_s" in startup:
+            startup.setdefault("listening_s", startup["ready_s"])
+            return proc, startup
+        time.sleep(0.05)
+    proc.kill()
+    raise SystemExit("API server was not ready within 120 s (see /api/ready)")
+
+
+def stop_server(proc: subprocess.Popen) -> float:
+    """Stop the server; returns its peak RSS in MB"""
+    proc.send_signal(signal.SIGINT)
+    # wait4 gives the rusage of exactly this child, including its peak RSS
+    _, _, rusage = os.wait4(proc.pid, 0)
+    return round(rusage.ru_maxrss / 1024, 1)   # ru_maxrss is in KiB on Linux
+
+
+def drive(port: int, method: str, path: str, body: Optional[Any], concurrency: int,
+          requests: int, seconds: float, warmup: int) -> Dict[str, Any]:
+    """Send one request repeatedly from concurrency clients; returns throughput and latency percentiles"""
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload else {}
+
+    def call(conn) -> Tuple[float, int]:
+        start = time.perf_counter()
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return time.perf_counter() - start, response.status
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    for _ in range(warmup):
+        call(conn)
+    conn.close()
+
+    issued = itertools.count()
+    deadline = time.perf_counter() + seconds
+
+    def client() -> List[Tuple[float, int]]:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+        samples = []
+        try:
+            while next(issued) < requests and time.perf_counter() < deadline:
+                try:
+                    samples.append(call(conn))
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+                    samples.append((math.nan, 0))
+        finally:
+            conn.close()
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        samples = [s for future in [pool.submit(client) for _ in range(concurrency)] for s in future.result()]
+    wall = time.perf_counter() - start
+
+    ok = np.array([latency for latency, status in samples if 200 <= status < 400])
+    p50, p95, p99 = (np.percentile(ok, [50, 95, 99]) * 1000).tolist() if len(ok) else (math.nan,) * 3
+    return {"requests": len(samples), "errors": len(samples) - len(ok),
+            "rps": round(len(samples) / wall, 1) if wall > 0 else 0.0,
+            "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _change(new: float, old: float) -> str:
+    if not old or math.isnan(old) or math.isnan(new):
+        return ""
+    return f" ({(new - old) / old * 100:+.0f}%)"
+
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None):
+    print(f"{'endpoint':<24}{'reqs':>7}{'req/s':>16}{'p50 ms':>16}{'p95 ms':>16}{'p99 ms':>16}{'errors':>8}")
+    for r in results:
+        old = (baseline or {}).get(r["endpoint"], {})
+        cells = [f"{r[k]:.1f}" + _change(r[k], old.get(k, math.nan)) for k in ("rps", "p50_ms", "p95_ms", "p99_ms")]
+        print(f"{r['endpoint']:<24}{r['requests']:>7}" + "".join(f"{c:>16}" for c in cells) + f"{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint against a database")
+    parser.add_argument("--db", required=True, help="database to serve (see data_collection/synthetic_db.py)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent keep-alive clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint (upper bound)")
+    parser.add_argument("--seconds", type=float, default=5, help="time per endpoint (upper bound)")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests per endpoint first")
+    parser.add_argument("--only", nargs="+", metavar="ENDPOINT", help="endpoint names to run (default: all)")
+    parser.add_argument("--json", help="write the run to this file")
+    parser.add_argument("--compare", help="show changes against a run saved with --json")
+    parser.add_argument("--startup-budget", type=float, metavar="SECONDS",
+                        help="exit with status 1 if the server takes longer than this to start listening")
+    parser.add_argument("--verbose", action="store_true", help="show the server's output")
+    args = parser.parse_args()
+
+    catalogue = endpoints(args.db)
+    if unknown := set(args.only or []) - set(catalogue):
+        raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}; expected some of {', '.join(catalogue)}")
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server, startup = start_server(args.db, port, args.verbose)
+    print(f"startup: listening after {startup['listening_s']:.2f} s, ready after {startup['ready_s']:.2f} s",
+          file=sys.stderr, flush=True)
+    results = []
+    try:
+        for name in args.only or catalogue:
+            method, path, body = catalogue[name]
+            results.append({"endpoint": name, "method": method, "path": path,
+                            **drive(port, method, path, body, args.concurrency, args.requests, args.seconds, args.warmup)})
+            print(f"{name:<24}{results[-1]['rps']:>10.1f} req/s", file=sys.stderr, flush=True)
+    finally:
+        peak_rss_mb = stop_server(server)
+
+    baseline, baseline_rss, baseline_startup = None, math.nan, {}
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = {r["endpoint"]: r for r in saved["results"]}
+        baseline_rss = saved.get("peak_rss_mb", math.nan)
+        baseline_startup = saved.get("startup", {})
+        print(f"compared with {saved.get('commit')} (concurrency {saved.get('concurrency')})\n")
+    print_results(results, baseline)
+    print(f"\nserver peak RSS: {peak_rss_mb} MB{_change(peak_rss_mb, baseline_rss)}")
+    for phase, label in (("listening_s", "listening after"), ("ready_s", "ready after")):
+        print(f"server {label}: {startup[phase]:.2f} s{_change(startup[phase], baseline_startup.get(phase, math.nan))}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": git_commit(), "db": str(Path(args.db).resolve()),
+                       "db_mb": round(os.path.getsize(args.db) / 1e6, 1), "concurrency": args.concurrency,
+                       "requests": args.requests, "seconds": args.seconds, "peak_rss_mb": peak_rss_mb,
+                       "startup": startup, "results": results}, f, indent=2)
+
+    if args.startup_budget is not None and startup["listening_s"] > args.startup_budget:
+        raise SystemExit(f"startup took {startup['listening_s']:.2f} s, over the {args.startup_budget:.2f} s budget")
@@ -0,0 +1,125 @@
+"""
+Memory footprint per uvicorn worker
+
+Starts `uvicorn main:app --workers N` on a database twice: once with every worker training
+its own forecaster (SIGAIDA_MODEL_PATH empty) and once with the workers mapping one shared
+artifact (see ml/forest.py). After /api/ready answers and each worker has served a few
+forecasts, it reads /proc/<pid>/smaps_rollup of every worker:
+
+    RSS  resident pages, counting shared pages in full in every worker
+    PSS  shared pages divided among the processes mapping them; the sum over all workers
+         is what the deployment really uses
+    USS  pages private to the worker
+
+plus the RSS and PSS of the artifact mapping itself. Linux only.
+
+    python bench_workers.py --db /tmp/campus_3y.db --workers 4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from bench_api import HERE, _get_status
+
+
+def worker_pids(parent: int) -> List[int]:
+    """Worker processes uvicorn spawned, by their command line"""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if ppid == parent and b"spawn_main" in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory(pid: int, artifact: str) -> Dict[str, float]:
+    """RSS, PSS and USS of a process, and RSS and PSS of its mapping of artifact, in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    mapped = {"Rss": 0, "Pss": 0}
+    if artifact:
+        in_artifact = False
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                parts = line.split()
+                if "-" in parts[0] and len(parts) >= 5:   # mapping header: address perms offset dev inode [path]
+                    in_artifact = len(parts) == 6 and parts[5] == artifact
+                elif in_artifact and parts[0].rstrip(":") in mapped:
+                    mapped[parts[0].rstrip(":")] += int(parts[1])
+    return {"rss": fields["Rss"] / 1024, "pss": fields["Pss"] / 1024,
+            "uss": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+            "artifact_rss": mapped["Rss"] / 1024, "artifact_pss": mapped["Pss"] / 1024}
+
+
+def measure(db_path: str, workers: int, artifact: str, verbose: bool = False) -> Dict[str, object]:
+    """Start N workers with the given SIGAIDA_MODEL_PATH ("" trains per worker) and measure them"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, DATABASE_PATH=os.path.abspath(db_path), SIGAIDA_MODEL_PATH=artifact)
+    launched = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                             "--workers", str(workers), "--log-level", "warning"], cwd=HERE, env=env,
+                            stdout=None if verbose else subprocess.DEVNULL,
+                            stderr=None if verbose else subprocess.DEVNULL)
+    try:
+        # Requests land on arbitrary workers; call it ready once many in a row say so
+        ready_in_a_row, deadline = 0, time.monotonic() + 300
+        while ready_in_a_row < 5 * workers:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit("workers did not become ready (rerun with --verbose)")
+            ready_in_a_row = ready_in_a_row + 1 if _get_status(port, "/api/ready") == 200 else 0
+            if not ready_in_a_row:
+                time.sleep(0.1)
+        ready = time.perf_counter() - launched
+        for _ in range(5 * workers):
+            _get_status(port, "/api/ml/air-quality-forecast?days=30")
+        per_worker = [memory(pid, artifact) for pid in worker_pids(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+    return {"ready_s": ready, "workers": per_worker}
+
+
+def print_run(label: str, run: Dict[str, object]):
+    workers = run["workers"]
+    print(f"\n{label}: {len(workers)} workers ready after {run['ready_s']:.1f} s")
+    print(f"{'worker':<8}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}{'artifact RSS':>14}{'artifact PSS':>14}")
+    for i, w in enumerate(workers):
+        print(f"{i:<8}{w['rss']:>10.1f}{w['pss']:>10.1f}{w['uss']:>10.1f}{w['artifact_rss']:>14.2f}{w['artifact_pss']:>14.2f}")
+    print(f"{'total':<8}{sum(w['rss'] for w in workers):>10.1f}{sum(w['pss'] for w in workers):>10.1f}"
+          f"{sum(w['uss'] for w in workers):>10.1f}")
+
+
+if __name__ == "__main__":
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("needs Linux /proc/<pid>/smaps_rollup")
+    parser = argparse.ArgumentParser(description="Measure per-worker memory with private and shared ML models")
+    parser.add_argument("--db", required=True, help="database to serve (see data_collection/synthetic_db.py)")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--verbose", action="store_true", help="show the server's output")
+    args = parser.parse_args()
+
+    print_run("private models", measure(args.db, args.workers, "", args.verbose))
+    with tempfile.TemporaryDirectory(prefix="bench_workers_") as tmp:
+        artifact = os.path.join(tmp, "air_quality_forest.joblib")
+        print_run("shared artifact, first start (one worker trains)", measure(args.db, args.workers, artifact, args.verbose))
+        print_run("shared artifact, restart", measure(args.db, args.workers, artifact, args.verbose))
@@ -0,0 +1,78 @@
+"""
+In-process LRU cache for results derived from slowly changing tables
+
+Callers put the data version (e.g. a digest of the NDVI rasters) into the key, so an
+ingest never serves stale results: entries of the old version simply stop being hit
+and age out of the LRU order.
+
+Given sizeof, a cache is also bounded by maxbytes: the least recently used entries are
+evicted until the total fits, and a value larger than maxbytes is not stored at all.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping holding at most maxsize entries (and maxbytes)"""
+
+    def __init__(self, maxsize: int = 64, maxbytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached value for key, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # Computed outside the lock; concurrent misses on one key may both compute it
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value for key, or None on a miss (for callers that compute asynchronously)"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            self._discard(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                self._discard(next(iter(self._data)))
+
+    def _discard(self, key: Hashable) -> None:
+        if key in self._data:
+            del self._data[key]
+            self.bytes -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
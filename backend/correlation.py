@@ -0,0 +1,136 @@
+"""
+Correlation analytics across data sources
+
+Series are aligned on one daily index (NaN where a source has no value) and every
+statistic is computed for all variable pairs at once with masked matrix products, so a
+pair only uses the days on which both of its variables have data (pairwise-complete).
+
+- cross_corr:  Pearson correlation of every column of X with every column of Y
+- corr_matrix: the full matrix of one set of columns, Pearson or Spearman (ranked per
+               pair on its shared days, see spearman_cross)
+- lagged_corr: correlation of X[t] with Y[t - lag] for every lag in -max_lag..max_lag
+"""
+from typing import Tuple
+import warnings
+
+import numpy as np
+
+MIN_PAIRS = 3
+
+
+def cross_corr(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(T, A) and (T, B) arrays -> (A, B) Pearson r and (A, B) pair counts"""
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    # Centering on the column means first avoids cancellation in the sums of squares
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        x = x - np.nanmean(x, axis=0)
+        y = y - np.nanmean(y, axis=0)
+    fx, fy = mx.astype(np.float64), my.astype(np.float64)
+    zx, zy = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+
+    n = fx.T @ fy
+    sx, sy = zx.T @ fy, fx.T @ zy            # sums of x and of y over the shared days
+    sxx, syy = (zx ** 2).T @ fy, fx.T @ (zy ** 2)
+    sxy = zx.T @ zy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx ** 2 / n
+        var_y = syy - sy ** 2 / n
+        r = cov / np.sqrt(var_x * var_y)
+    r = np.where(n >= MIN_PAIRS, np.clip(r, -1.0, 1.0), np.nan)
+    return r, n.astype(np.int64)
+
+
+def _tie_groups(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """For each row of a (K, T) array: its sort order (NaN last) and, per sorted position,
+    the first and last sorted position of its run of equal values"""
+    order = np.argsort(x, axis=1, kind="stable")
+    ordered = np.take_along_axis(x, order, axis=1)
+    pos = np.broadcast_to(np.arange(x.shape[1]), x.shape)
+    differs = ordered[:, 1:] != ordered[:, :-1]
+    edge = np.ones((len(x), 1), dtype=bool)
+    first = np.maximum.accumulate(np.where(np.hstack([edge, differs]), pos, 0), axis=1)
+    last = np.minimum.accumulate(np.where(np.hstack([differs, edge]), pos, x.shape[1])[:, ::-1], axis=1)[:, ::-1]
+    return order, first, last
+
+
+def _ranks_within(order: np.ndarray, first: np.ndarray, last: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """Average ranks within the days set in each row of masks (K, T), for rows whose
+    _tie_groups() are order, first and last. Values outside a mask are meaningless."""
+    counts = np.cumsum(np.take_along_axis(masks, order, axis=1), axis=1, dtype=np.int32)
+    below = np.take_along_axis(counts, np.maximum(first - 1, 0), axis=1)
+    below[first == 0] = 0
+    ties = np.take_along_axis(counts, last, axis=1) - below
+    ranks = np.empty(masks.shape)
+    np.put_along_axis(ranks, order, below + (ties + 1) / 2, axis=1)
+    return ranks
+
+
+def _value_ranks_within(order: np.ndarray, first: np.ndarray, last: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """_ranks_within() for one series (_tie_groups() of shape (T,)) ranked within every row of masks"""
+    counts = np.cumsum(masks[:, order], axis=1, dtype=np.int32)
+    below = counts[:, np.maximum(first - 1, 0)]
+    below[:, first == 0] = 0
+    ties = counts[:, last] - below
+    ranks = np.empty(masks.shape)
+    ranks[:, order] = below + (ties + 1) / 2
+    return ranks
+
+
+def _masked_corr(a: np.ndarray, b: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pearson r and counts of the paired rows of a and b over the days in mask"""
+    n = mask.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        da = np.where(mask, a - (np.where(mask, a, 0).sum(axis=1) / n)[:, None], 0.0)
+        db = np.where(mask, b - (np.where(mask, b, 0).sum(axis=1) / n)[:, None], 0.0)
+        r = (da * db).sum(axis=1) / np.sqrt((da ** 2).sum(axis=1) * (db ** 2).sum(axis=1))
+    return np.where(n >= MIN_PAIRS, np.clip(r, -1.0, 1.0), np.nan), n
+
+
+def spearman_cross(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(T, A) and (T, B) arrays -> (A, B) Spearman r and pair counts. Like pandas, each pair
+    is ranked on the days both of its columns have (ties get their average rank). Every
+    column is sorted once; the ranks within each pair's days are counted off that order."""
+    x, y = np.ascontiguousarray(x.T), np.ascontiguousarray(y.T)   # one row per column
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x_groups, y_groups = _tie_groups(x), _tie_groups(y)
+    r = np.empty((len(x), len(y)))
+    n = np.empty((len(x), len(y)), dtype=np.int64)
+    for i in range(len(x)):
+        shared = mx[i] & my
+        rx = _value_ranks_within(*(g[i] for g in x_groups), shared)
+        r[i], n[i] = _masked_corr(rx, _ranks_within(*y_groups, shared), shared)
+    return r, n
+
+
+def corr_matrix(x: np.ndarray, method: str = "pearson") -> Tuple[np.ndarray, np.ndarray]:
+    """Correlation matrix of the columns of a (T, V) array, Pearson or Spearman"""
+    if method == "spearman":
+        return spearman_cross(x, x)
+    if method != "pearson":
+        raise ValueError(f"Unknown method: {method}")
+    return cross_corr(x, x)
+
+
+def shifted(y: np.ndarray, lag: int) -> np.ndarray:
+    """y[t - lag] on the same index, NaN where that falls outside the range"""
+    out = np.full_like(y, np.nan)
+    if lag >= 0:
+        out[lag:] = y[:len(y) - lag]
+    else:
+        out[:lag] = y[-lag:]
+    return out
+
+
+def lagged_corr(x: np.ndarray, y: np.ndarray, max_lag: int, method: str = "pearson") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cross-correlation of (T, A) x with (T, B) y for lags -max_lag..max_lag -> (A, B, lags)
+    r and counts. A positive lag correlates x with y from `lag` days earlier (y leads).
+    """
+    lags = range(-max_lag, max_lag + 1)
+    # All lags in one product: (T, B * lags) columns, lag-major
+    stacked = np.hstack([shifted(y, lag) for lag in lags])
+    r, n = spearman_cross(x, stacked) if method == "spearman" else cross_corr(x, stacked)
+    shape = (x.shape[1], len(lags), y.shape[1])
+    return r.reshape(shape).transpose(0, 2, 1), n.reshape(shape).transpose(0, 2, 1)
@@ -1,39 +1,268 @@
 """
 Database connection and query management for SIGAIDA Campus Energy
 """
+import functools
+import hashlib
+import json
+import math
 import sqlite3
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from cache import LRUCache
+from correlation import corr_matrix, lagged_corr
+from metrics import observe_query, register_cache
+from downsample import AGGREGATES, bucket_sql, lttb_keys
+from ndvi_change import compare, month_index, trend
+from ndvi_grid import cell_centers, cell_grid, from_mercator, month_labels
+from sketch import merge, quantiles
+from slow_queries import slow_log
+from spatial import bbox_around, haversine_m
+
+# Time-series tables are keyed by integer epoch seconds (see data_collection/storage.py).
+# Hourly rows use UTC epochs; daily weather rows use 00:00 UTC of the local calendar date.
+LOCAL_TZ = ZoneInfo("America/Chicago")
+AQ_TIME_SQL = "strftime('%Y-%m-%dT%H:%M:%SZ', ts, 'unixepoch')"
+DAY_SQL = "strftime('%Y-%m-%d', ts, 'unixepoch')"
+# NDVI stacks and change results, keyed by the grid version (digest of every raster)
+ndvi_cache = LRUCache(maxsize=64)
+# Correlation results, keyed by range, variables and the ingest versions of both sources
+analytics_cache = LRUCache(maxsize=64)
+register_cache("ndvi", ndvi_cache)
+register_cache("analytics", analytics_cache)
+
+# Connection shared by every query inside DatabaseManager.snapshot() (one /api/batch call)
+_snapshot_conn: ContextVar[Optional["SharedConnection"]] = ContextVar("snapshot_conn", default=None)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DB_PATH = REPO_ROOT / "data_collection" / "campus_data.db"
+# Serving from immutable snapshots: the file naming the current one, and the mmap window
+SNAPSHOT_POINTER = "CURRENT"
+MMAP_SIZE = 1 << 30
+
+
+def to_epoch(value: str, end: bool = False) -> int:
+    """Parse a YYYY-MM-DD or ISO datetime parameter into UTC epoch seconds.
+    Bare dates are local (America/Chicago) days; end=True returns the last second of that day."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=LOCAL_TZ)
+    if end and len(value) == 10:
+        return int((parsed + timedelta(days=1)).timestamp()) - 1
+    return int(parsed.timestamp())
+
+
+def bucket_start(day_epoch: int, period: str) -> int:
+    """Key of the day/week/month rollup bucket containing a day key"""
+    day = datetime.fromtimestamp(day_epoch, ZoneInfo("UTC"))
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    elif period == "month":
+        day = day.replace(day=1)
+    return int(day.timestamp())
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _local_bucket_start(hour: int, period: str) -> int:
+    day = datetime.fromtimestamp(hour * 3600, LOCAL_TZ).replace(hour=0, minute=0, second=0)
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    elif period == "month":
+        day = day.replace(day=1)
+    # zoneinfo resolves the offset from the wall time, so this is right across DST changes
+    return int(day.timestamp())
+
+
+def local_bucket_start(ts: int, period: str) -> int:
+    """UTC epoch of the local (America/Chicago) midnight starting the day/week/month
+    containing the UTC epoch ts; registered as the SQL function local_bucket_start"""
+    # Offsets are whole hours, so every second of an hour shares its bucket
+    return _local_bucket_start(ts // 3600, period)
+
+
+def _register_functions(conn: sqlite3.Connection) -> None:
+    conn.create_function("local_bucket_start", 2, local_bucket_start, deterministic=True)
+
+
+def rollup_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    """n/sum/min/max/sumsq of one or more merged buckets -> mean and standard deviation"""
+    n = row["n"] or 0
+    mean = row["sum"] / n if n else None
+    variance = max(row["sumsq"] / n - mean * mean, 0.0) if n else None
+    return {"time": row.get("time"), "n": n, "mean": mean, "min": row["min"], "max": row["max"],
+            "std": variance ** 0.5 if variance is not None else None}
+
+
+def leap_doy(day: datetime) -> int:
+    """Day of year on a leap-year calendar (Feb 29 = 60, Mar 1 = 61), as in weather_climatology"""
+    doy = day.timetuple().tm_yday
+    is_leap = day.year % 4 == 0 and (day.year % 100 != 0 or day.year % 400 == 0)
+    return doy + (1 if not is_leap and day.month > 2 else 0)
+
+
+def to_day_epoch(value: str, end: bool = False) -> int:
+    """Parse a YYYY-MM-DD parameter into the day key used by daily tables"""
+    day = datetime.fromisoformat(value[:10]).replace(tzinfo=ZoneInfo("UTC"))
+    return int(day.timestamp()) + (86400 - 1 if end else 0)
+
+
+def _caller_name() -> str:
+    """Name of the method that called execute_query; closures report their enclosing method"""
+    code = sys._getframe(2).f_code
+    return getattr(code, "co_qualname", code.co_name).split(".<locals>")[0].rpartition(".")[2]
+
+
+def _env_path(name: str) -> Optional[Path]:
+    """Path from an environment variable; relative values are taken from the repository
+    root, as in .env.example, whichever directory the server was started from"""
+    value = os.getenv(name)
+    if not value:
+        return None
+    path = Path(value).expanduser()
+    return path if path.is_absolute() else REPO_ROOT / path
+
+
+class SharedConnection:
+    """The connection of an open snapshot; close() is a no-op, the snapshot closes it"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        pass
 
 
 class DatabaseManager:
     """Manages SQLite database connections and queries"""
 
-    def __init__(self):
-        # Path to the database file
-        self.db_path = Path(__file__).parent.parent / "data_collection" / "campus_data.db"
-        if not self.db_path.exists():
-            raise FileNotFoundError(f"Database not found at {self.db_path}")
+    def __init__(self, db_path: Optional[str] = None, snapshot_dir: Optional[str] = None):
+        # Path to the database file; nothing is opened until the first query, so a missing
+        # database shows up in /api/ready instead of failing the import
+        self.db_path = Path(db_path) if db_path else _env_path("DATABASE_PATH") or DEFAULT_DB_PATH
+        # Serving mode: read the immutable snapshot named by snapshot_dir/CURRENT instead
+        # (published by data_collection/publish_snapshot.py)
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else _env_path("SIGAIDA_SNAPSHOT_DIR")
+        self.mmap_size = int(os.getenv("SIGAIDA_MMAP_SIZE", str(MMAP_SIZE)))
+        self._pointer = (None, None)   # (stat signature of CURRENT, snapshot path)
+        self._local = threading.local()
+
+    def current_path(self) -> Path:
+        """The database file queries go to: the current snapshot in serving mode, else db_path"""
+        if self.snapshot_dir is None:
+            return self.db_path
+        pointer = self.snapshot_dir / SNAPSHOT_POINTER
+        stat = pointer.stat()
+        # The publisher replaces CURRENT atomically, so a new pointer is a new inode
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._pointer[0]:
+            self._pointer = (signature, self.snapshot_dir / pointer.read_text().strip())
+        return self._pointer[1]
+
+    def check(self) -> int:
+        """Open the database and read its schema; returns the table count. Raises if it is missing or unreadable."""
+        path = self.current_path()
+        if not path.exists():
+            raise FileNotFoundError(f"Database not found at {path}")
+        rows = self.execute_query("SELECT COUNT(*) AS tables FROM sqlite_master WHERE type = 'table'")
+        return rows[0]["tables"]
 
     def get_connection(self):
-        """Create a new database connection"""
-        conn = sqlite3.connect(str(self.db_path))
+        """Create a new database connection, or return the open snapshot's"""
+        shared = _snapshot_conn.get()
+        if shared is not None:
+            return shared
+        if self.snapshot_dir is not None:
+            return self._immutable_connection()
+        # mode=rw: a missing file is an error rather than a new empty database
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=rw", uri=True)
         conn.row_factory = sqlite3.Row  # Access columns by name
+        _register_functions(conn)
         return conn
 
-    def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """Execute a SELECT query and return results as list of dicts"""
+    def _immutable_connection(self) -> "SharedConnection":
+        """
+        This thread's connection to the current snapshot. An immutable file needs no locks
+        and cannot change under a cached connection, so one connection per thread serves
+        every query until CURRENT moves on. A superseded connection is only dropped, not
+        closed: requests still holding it (e.g. an open batch) finish on the old file.
+        """
+        path = self.current_path()
+        local = self._local
+        if getattr(local, "path", None) != path:
+            if not path.exists():
+                raise FileNotFoundError(f"Database not found at {path}")
+            conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            conn.row_factory = sqlite3.Row
+            _register_functions(conn)
+            conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+            local.conn, local.path = SharedConnection(conn), path
+        return local.conn
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Serve every query made in this context (including asyncio tasks started from it)
+        from one connection inside one read transaction, so they all see the same data
+        and skip the per-query connect.
+        """
+        if _snapshot_conn.get() is not None:
+            yield
+            return
+        conn = self.get_connection()
+        if self.snapshot_dir is not None:
+            # An immutable file is already a consistent snapshot; no transaction needed
+            token = _snapshot_conn.set(conn)
+            try:
+                yield
+            finally:
+                _snapshot_conn.reset(token)
+            return
+        conn.execute("BEGIN")
+        # Reading takes the shared lock, which fixes the snapshot from here on
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        token = _snapshot_conn.set(SharedConnection(conn))
+        try:
+            yield
+        finally:
+            _snapshot_conn.reset(token)
+            conn.rollback()
+            conn.close()
+
+    def in_snapshot(self) -> bool:
+        """Whether this context's queries go to an open snapshot() connection"""
+        return _snapshot_conn.get() is not None
+
+    def execute_query(self, query: str, params: tuple = (), name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute a SELECT query and return results as list of dicts. Timed on /metrics and
+        in the slow-query log under name, by default the calling method's name."""
+        name = name or _caller_name()
+        started = time.perf_counter()
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute(query, params)
             columns = [description[0] for description in cursor.description]
             results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-            return results
+            elapsed = time.perf_counter() - started
+            if elapsed >= slow_log.threshold:
+                slow_log.record(conn, name, query, params, elapsed, len(results))
         finally:
             conn.close()
+        observe_query(name, elapsed, len(results))
+        return results
 
     # Pandas not required for basic functionality
     # def execute_query_df(self, query: str, params: tuple = ()) -> pd.DataFrame:
@@ -49,42 +278,166 @@ class DatabaseManager:
 
     def get_current_air_quality(self) -> Dict[str, Any]:
         """Get the most recent air quality data from historical records"""
-        query = """
-        SELECT *, date as time FROM historical_air_quality_data
-        ORDER BY date DESC
+        query = f"""
+        SELECT *, {AQ_TIME_SQL} as date, {AQ_TIME_SQL} as time FROM aq_hourly
+        ORDER BY ts DESC
         LIMIT 1
         """
         results = self.execute_query(query)
         return results[0] if results else {}
 
+    def get_table_columns(self, table: str) -> Dict[str, str]:
+        """Value columns of a typed time-series table (everything except the ts key) and their types"""
+        return {row["name"]: row["type"] for row in self.execute_query(f"PRAGMA table_info({table})")
+                if row["name"] != "ts"}
+
+    def get_downsampled_series(self, table: str, time_sql: str, where: str, params: list,
+                               resolution: Optional[str] = None, agg: str = "mean",
+                               max_points: Optional[int] = None, limit: Optional[int] = None,
+                               lttb_column: Optional[str] = None,
+                               day_keys: bool = False) -> List[Dict[str, Any]]:
+        """Rows of an epoch-keyed table, newest first, optionally aggregated into
+        resolution buckets in SQL and then thinned to max_points with LTTB.
+        day_keys marks tables keyed by local dates (weather_daily) rather than UTC instants."""
+        columns = self.get_table_columns(table) if resolution or max_points else {}
+        if resolution:
+            # Categorical integer codes (weather_code) don't average; keep the most severe
+            select = ", ".join(f"{'MAX' if kind == 'INTEGER' else AGGREGATES[agg]}({c}) as {c}"
+                               for c, kind in columns.items())
+            source = f"(SELECT {bucket_sql(resolution, day_keys)} as ts, {select} FROM {table} WHERE {where} GROUP BY 1)"
+        else:
+            source = f"(SELECT * FROM {table} WHERE {where})"
+        params = list(params)
+
+        query = f"SELECT *, {time_sql} as date, {time_sql} as time FROM {source}"
+        if max_points:
+            # Pick the points from (ts, value) pairs only, then fetch just those rows
+            if lttb_column not in columns:
+                raise ValueError(f"Unknown column for downsampling: {lttb_column}")
+            series = self.execute_query(f"SELECT ts, {lttb_column} as value FROM {source} ORDER BY ts", tuple(params))
+            keep = lttb_keys([r["ts"] for r in series], [r["value"] for r in series], max_points)
+            query += " WHERE ts IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(keep))
+        query += " ORDER BY ts DESC"
+        # With max_points the whole range is reduced, so limit only applies without it
+        if limit and not max_points:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        return self.execute_query(query, tuple(params))
+
     def get_historical_air_quality(self, start_date: Optional[str] = None,
                                    end_date: Optional[str] = None,
-                                   limit: int = 1000) -> List[Dict[str, Any]]:
+                                   limit: int = 1000,
+                                   resolution: Optional[str] = None,
+                                   agg: str = "mean",
+                                   max_points: Optional[int] = None,
+                                   lttb_column: str = "pm2_5") -> List[Dict[str, Any]]:
         """Get historical air quality data within date range"""
-        query = "SELECT *, date as time FROM historical_air_quality_data WHERE 1=1"
+        where = "1=1"
         params = []
 
         if start_date:
-            query += " AND date >= ?"
-            params.append(start_date)
+            where += " AND ts >= ?"
+            params.append(to_epoch(start_date))
         if end_date:
-            query += " AND date <= ?"
-            params.append(end_date)
+            where += " AND ts <= ?"
+            params.append(to_epoch(end_date, end=True))
 
-        query += " ORDER BY date DESC LIMIT ?"
-        params.append(limit)
-
-        return self.execute_query(query, tuple(params))
+        return self.get_downsampled_series("aq_hourly", AQ_TIME_SQL, where, params, resolution, agg,
+                                           max_points, limit, lttb_column)
 
     def get_openaq_data(self, hours: int = 24) -> List[Dict[str, Any]]:
         """Get recent OpenAQ sensor data (PM2.5)"""
-        query = """
-        SELECT value, parameter_name, datetime_utc as datetime FROM historical_aq_openaq
-        ORDER BY datetime_utc DESC
+        query = f"""
+        SELECT value, parameter as parameter_name, {AQ_TIME_SQL} as datetime FROM openaq_measurements
+        ORDER BY ts DESC
         LIMIT ?
         """
         return self.execute_query(query, (hours,))
 
+    def get_rollups(self, metric: str, period: str = "day", source: str = "air_quality",
+                    start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    limit: int = 366) -> List[Dict[str, Any]]:
+        """Get day/week/month rollups of one metric (see data_collection/rollups.py), newest first"""
+        query = f"""
+        SELECT *, {DAY_SQL} as time FROM (
+            SELECT bucket as ts, n, sum, min, max, sumsq FROM aq_rollups
+            WHERE source = ? AND period = ? AND metric = ?
+        ) WHERE 1=1"""
+        params = [source, period, metric]
+
+        if start_date:
+            query += " AND ts >= ?"
+            params.append(bucket_start(to_day_epoch(start_date), period))
+        if end_date:
+            query += " AND ts <= ?"
+            params.append(to_day_epoch(end_date))
+
+        query += " ORDER BY ts DESC LIMIT ?"
+        params.append(limit)
+
+        return [rollup_stats(row) for row in self.execute_query(query, tuple(params))]
+
+    def get_recent_rollup_means(self, metrics: List[str], days: int = 7,
+                                source: str = "air_quality") -> Dict[str, Optional[float]]:
+        """Merge the most recent `days` daily rollups into one mean per metric"""
+        placeholders = ", ".join("?" * len(metrics))
+        query = f"""
+        SELECT metric, SUM(n) as n, SUM(sum) as sum, MIN(min) as min, MAX(max) as max, SUM(sumsq) as sumsq
+        FROM aq_rollups
+        WHERE source = ? AND period = 'day' AND metric IN ({placeholders})
+        AND bucket > (SELECT MAX(bucket) FROM aq_rollups WHERE source = ? AND period = 'day') - ? * 86400
+        GROUP BY metric
+        """
+        rows = self.execute_query(query, (source, *metrics, source, days))
+        return {row["metric"]: rollup_stats(row)["mean"] for row in rows}
+
+    def get_percentiles(self, metric: str, qs: List[float], start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, source: str = "air_quality") -> Optional[Dict[str, Any]]:
+        """
+        Percentiles of a metric over a date range from the quantile sketches (see
+        data_collection/sketches.py): whole months use the month sketches, the partial
+        months at either end the day sketches. None if there is no data in the range.
+        """
+        if start_date:
+            first = to_day_epoch(start_date)
+        else:
+            first = self.execute_query("SELECT MIN(bucket) AS b FROM aq_sketches WHERE source = ? AND period = 'day' "
+                                       "AND metric = ?", (source, metric))[0]["b"]
+        last = to_day_epoch(end_date) if end_date else 2 ** 62
+        if first is None:
+            return None
+
+        # Months lying entirely inside [first, last]
+        month_lo = bucket_start(first, "month")
+        if month_lo < first:
+            month_lo = int((datetime.fromtimestamp(month_lo, ZoneInfo("UTC")) + timedelta(days=32))
+                           .replace(day=1).timestamp())
+        month_end = bucket_start(last + 86400, "month") if last < 2 ** 62 else 2 ** 62
+
+        if month_lo < month_end:
+            query = """
+            SELECT sketch FROM aq_sketches WHERE source = ? AND metric = ? AND (
+                (period = 'month' AND bucket >= ? AND bucket < ?)
+                OR (period = 'day' AND ((bucket >= ? AND bucket < ?) OR (bucket >= ? AND bucket <= ?)))
+            )"""
+            params = (source, metric, month_lo, month_end, first, month_lo, month_end, last)
+        else:
+            query = "SELECT sketch FROM aq_sketches WHERE source = ? AND metric = ? AND period = 'day' AND bucket BETWEEN ? AND ?"
+            params = (source, metric, first, last)
+        rows = self.execute_query(query, params)
+        merged = merge(row["sketch"] for row in rows)
+        if merged is None:
+            return None
+        return {
+            "values": quantiles(merged, qs),
+            "count": int(merged["zero"] + merged["counts"].sum()),
+            "min": merged["min"],
+            "max": merged["max"],
+            "sketches": len(rows),
+        }
+
     # Weather Queries
 
     def get_weather_forecast(self) -> List[Dict[str, Any]]:
@@ -97,22 +450,64 @@ class DatabaseManager:
 
     def get_historical_weather(self, start_date: Optional[str] = None,
                               end_date: Optional[str] = None,
-                              limit: int = 365) -> List[Dict[str, Any]]:
+                              limit: int = 365,
+                              resolution: Optional[str] = None,
+                              agg: str = "mean",
+                              max_points: Optional[int] = None,
+                              lttb_column: str = "temperature_2m_max") -> List[Dict[str, Any]]:
         """Get historical daily weather data"""
-        query = "SELECT *, date as time FROM historical_weather_data WHERE 1=1"
+        where = "1=1"
         params = []
 
         if start_date:
-            query += " AND date >= ?"
-            params.append(start_date)
+            where += " AND ts >= ?"
+            params.append(to_day_epoch(start_date))
         if end_date:
-            query += " AND date <= ?"
-            params.append(end_date)
-
-        query += " ORDER BY date DESC LIMIT ?"
-        params.append(limit)
-
-        return self.execute_query(query, tuple(params))
+            where += " AND ts <= ?"
+            params.append(to_day_epoch(end_date, end=True))
+
+        return self.get_downsampled_series("weather_daily", DAY_SQL, where, params, resolution, agg,
+                                           max_points, limit, lttb_column, day_keys=True)
+
+    def get_weather_climatology(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                variables: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Day-of-year normals, percentiles and records (see data_collection/climatology.py)
+        for each day in the range, next to the observed value where there is one"""
+        today = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d")
+        first, last = to_day_epoch(start_date or today), to_day_epoch(end_date or start_date or today)
+        if last - first > 366 * 86400:
+            raise ValueError("Date range is limited to one year")
+        days = [datetime.fromtimestamp(ts, ZoneInfo("UTC")) for ts in range(first, last + 1, 86400)]
+        if not days:
+            return []
+        doys = {leap_doy(day) for day in days}
+        variables = variables or ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"]
+
+        var_params = ", ".join("?" * len(variables))
+        normals = {(row["variable"], row["doy"]): row for row in self.execute_query(
+            f"SELECT * FROM weather_climatology WHERE variable IN ({var_params}) "
+            f"AND doy IN ({', '.join('?' * len(doys))})", (*variables, *doys))}
+        known = {variable for variable, _ in normals}
+        if unknown := [v for v in variables if v not in known]:
+            raise ValueError(f"No climatology for: {', '.join(unknown)}")
+
+        # Only validated names reach the SQL below
+        hot_columns = self.get_table_columns("weather_daily")
+        observed_columns = ", ".join(f"w.{v}" if v in hot_columns else f"e.{v}" for v in variables)
+        observed = {row["ts"]: row for row in self.execute_query(
+            f"SELECT w.ts, {observed_columns} FROM weather_daily w "
+            f"LEFT JOIN weather_daily_extra e ON e.ts = w.ts WHERE w.ts BETWEEN ? AND ?", (first, last))}
+
+        results = []
+        for day in days:
+            ts, doy = int(day.timestamp()), leap_doy(day)
+            for variable in variables:
+                row = dict(normals.get((variable, doy), {"variable": variable, "doy": doy}))
+                value = observed.get(ts, {}).get(variable)
+                row.update(time=day.strftime("%Y-%m-%d"), observed=value,
+                           anomaly=value - row["mean"] if value is not None and row["mean"] is not None else None)
+                results.append(row)
+        return results
 
     def get_weather_gov_forecast(self) -> List[Dict[str, Any]]:
         """Get NWS weather.gov forecast"""
@@ -150,6 +545,33 @@ class DatabaseManager:
         params = (lat - tolerance, lat + tolerance, lon - tolerance, lon + tolerance)
         return self.execute_query(query, params)
 
+    def get_ndvi_cell_series(self, cell_ids: List[int]) -> Dict[str, Any]:
+        """
+        Monthly NDVI of many cells with one indexed query (idx_vegetation_cell), as a shared
+        month axis plus one value list per cell (None where a month has no value)
+        """
+        query = """
+        SELECT v.cell_id, v.year, v.month, AVG(v.ndvi) AS ndvi
+        FROM (SELECT DISTINCT value AS cell_id FROM json_each(?)) c
+        JOIN vegetation_data v ON v.cell_id = c.cell_id
+        GROUP BY v.cell_id, v.year, v.month
+        """
+        rows = self.execute_query(query, (json.dumps([int(c) for c in cell_ids]),))
+        months = sorted({(r["year"], r["month"]) for r in rows})
+        position = {m: i for i, m in enumerate(months)}
+        series: Dict[int, List[Optional[float]]] = {}
+        for r in rows:
+            values = series.setdefault(r["cell_id"], [None] * len(months))
+            values[position[(r["year"], r["month"])]] = r["ndvi"]
+
+        ids = sorted(series)
+        centers = cell_centers(ids)
+        return {
+            "months": month_labels(months),
+            "cells": [{"cell_id": cell, "lat": float(lat), "lon": float(lon), "ndvi": series[cell]}
+                      for cell, lat, lon in zip(ids, centers["lat"], centers["lon"])],
+        }
+
     def get_ndvi_stats(self) -> Dict[str, Any]:
         """Get NDVI statistics (mean, min, max, greenest areas)"""
         # Latest snapshot stats
@@ -197,6 +619,134 @@ class DatabaseManager:
         """
         return self.execute_query(query)
 
+    def get_ndvi_rasters(self) -> List[Dict[str, Any]]:
+        """Metadata of every precomputed monthly NDVI raster, with its bounds in lat/lon"""
+        query = """
+        SELECT year, month, width, height, origin_x, origin_y, cell_size,
+               valid_cells, min, max, mean, digest
+        FROM ndvi_rasters
+        ORDER BY year, month
+        """
+        rasters = self.execute_query(query)
+        for raster in rasters:
+            west, north = from_mercator(raster["origin_x"], raster["origin_y"])
+            east, south = from_mercator(raster["origin_x"] + raster["width"] * raster["cell_size"],
+                                        raster["origin_y"] - raster["height"] * raster["cell_size"])
+            raster["bounds"] = {"west": float(west), "south": float(south), "east": float(east), "north": float(north)}
+        return rasters
+
+    def get_ndvi_raster(self, year: Optional[int] = None, month: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """One month's raster row including the float32 grid and PNG blobs (default: latest month)"""
+        query = """
+        SELECT * FROM ndvi_rasters
+        WHERE (? IS NULL OR (year = ? AND month = ?))
+        ORDER BY year DESC, month DESC
+        LIMIT 1
+        """
+        results = self.execute_query(query, (year, year, month))
+        return results[0] if results else None
+
+    def get_ndvi_grid_version(self) -> Optional[str]:
+        """Digest identifying the current set of monthly rasters; changes whenever a month is reloaded"""
+        rows = self.execute_query("SELECT year, month, digest FROM ndvi_rasters ORDER BY year, month")
+        if not rows:
+            return None
+        return hashlib.sha256(",".join(f"{r['year']}-{r['month']}:{r['digest']}" for r in rows).encode()).hexdigest()[:16]
+
+    def get_ndvi_stack(self, version: str) -> Dict[str, Any]:
+        """Every monthly raster as one aligned (months, height, width) float32 array, cached per grid version"""
+        def load():
+            rows = self.execute_query("""
+            SELECT year, month, width, height, origin_x, origin_y, cell_size, data
+            FROM ndvi_rasters ORDER BY year, month
+            """)
+            shape = (rows[0]["height"], rows[0]["width"])
+            return {
+                "months": [(r["year"], r["month"]) for r in rows],
+                "stack": np.stack([np.frombuffer(r["data"], dtype="<f4").reshape(shape) for r in rows]),
+                "cells": cell_grid(rows[0]["width"], rows[0]["height"], rows[0]["origin_x"],
+                                   rows[0]["origin_y"], rows[0]["cell_size"]),
+            }
+        return ndvi_cache.get_or_compute(("stack", version), load)
+
+    def get_ndvi_change(self, before: tuple, after: tuple, alpha: float = 0.05) -> Optional[Dict[str, Any]]:
+        """
+        Per-cell NDVI change between two periods, each an inclusive (YYYY-MM, YYYY-MM) range.
+        Returns None when no rasters have been built.
+        """
+        version = self.get_ndvi_grid_version()
+        if version is None:
+            return None
+
+        def run():
+            grid = self.get_ndvi_stack(version)
+            index = month_index(grid["months"])
+            periods = [month_index([tuple(map(int, m.split("-"))) for m in period]) for period in (before, after)]
+            masks = [(index >= start) & (index <= end) for start, end in periods]
+            result = compare(grid["stack"][masks[0]], grid["stack"][masks[1]], alpha)
+            return self._ndvi_cells(grid["cells"], result, "delta", version, {
+                "before_months": int(masks[0].sum()), "after_months": int(masks[1].sum())})
+
+        return ndvi_cache.get_or_compute(("change", before, after, alpha, version), run)
+
+    def get_ndvi_trend(self, start: Optional[str] = None, end: Optional[str] = None,
+                       months_of_year: tuple = (), alpha: float = 0.05) -> Optional[Dict[str, Any]]:
+        """
+        Per-cell linear NDVI trend (per year) over every month from start to end (YYYY-MM,
+        default the whole record), optionally only the given calendar months (e.g. summer).
+        """
+        version = self.get_ndvi_grid_version()
+        if version is None:
+            return None
+
+        def run():
+            grid = self.get_ndvi_stack(version)
+            index = month_index(grid["months"])
+            mask = np.ones(len(index), dtype=bool)
+            if start:
+                mask &= index >= month_index([tuple(map(int, start.split("-")))])[0]
+            if end:
+                mask &= index <= month_index([tuple(map(int, end.split("-")))])[0]
+            if months_of_year:
+                mask &= np.isin(index % 12 + 1, months_of_year)
+            # Mid-month, in years
+            result = trend(grid["stack"][mask], (index[mask] + 0.5) / 12, alpha)
+            return self._ndvi_cells(grid["cells"], result, "slope", version, {"months": int(mask.sum())})
+
+        return ndvi_cache.get_or_compute(("trend", start, end, months_of_year, alpha, version), run)
+
+    @staticmethod
+    def _ndvi_cells(cells: Dict[str, np.ndarray], result: Dict[str, np.ndarray], key: str,
+                    version: str, extra: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten per-cell result grids into JSON-ready rows for the cells with a value, plus a summary"""
+        flat = {name: values.ravel() for name, values in result.items()}
+        keep = np.flatnonzero(~np.isnan(flat[key]))
+        p = flat["p_value"][keep]
+        tested = ~np.isnan(p)
+        significant = flat["significant"][keep] & tested
+        data = []
+        for i, cell in enumerate(keep.tolist()):
+            row = {"cell_id": int(cells["cell_id"][cell]), "lat": float(cells["lat"][cell]),
+                   "lon": float(cells["lon"][cell])}
+            for name, values in flat.items():
+                if name == "significant":
+                    row[name] = bool(significant[i]) if tested[i] else None
+                elif name == "n":
+                    row[name] = int(values[cell])
+                else:
+                    value = float(values[cell])
+                    row[name] = None if math.isnan(value) else value
+            data.append(row)
+        values = flat[key][keep]
+        summary = {
+            "cells": len(data),
+            f"mean_{key}": float(values.mean()) if len(values) else None,
+            "significant_increase": int((significant & (values > 0)).sum()),
+            "significant_decrease": int((significant & (values < 0)).sum()),
+            **extra,
+        }
+        return {"data": data, "summary": summary, "grid_version": version}
+
     # Transit Queries
 
     def get_transit_stops(self) -> List[Dict[str, Any]]:
@@ -204,11 +754,207 @@ class DatabaseManager:
         query = "SELECT * FROM transit_stops"
         return self.execute_query(query)
 
+    @staticmethod
+    def _stops_in_box(conn, south: float, north: float, west: float, east: float,
+                      limit: int = -1) -> List[Dict[str, Any]]:
+        """Stops inside a lat/lon box, via the transit_stops_rtree index"""
+        cursor = conn.execute("""
+        SELECT s.stop_id, s.stop_name, s.stop_lat, s.stop_lon
+        FROM transit_stops_rtree r JOIN transit_stops s ON s.rowid = r.id
+        WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?
+        LIMIT ?
+        """, (south, north, west, east, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _with_distances(stops: List[Dict[str, Any]], lat: float, lon: float, max_m: float) -> List[Dict[str, Any]]:
+        """Stops within max_m of a point, nearest first, with distance_m set"""
+        if not stops:
+            return []
+        distances = haversine_m(lat, lon, [s["stop_lat"] for s in stops], [s["stop_lon"] for s in stops])
+        order = np.argsort(distances, kind="stable")
+        return [dict(stops[i], distance_m=float(distances[i])) for i in order.tolist() if distances[i] <= max_m]
+
+    def get_stops_in_bbox(self, south: float, west: float, north: float, east: float,
+                          limit: int = 1000) -> List[Dict[str, Any]]:
+        """Stops inside a bounding box"""
+        conn = self.get_connection()
+        try:
+            return self._stops_in_box(conn, south, north, west, east, limit)
+        finally:
+            conn.close()
+
+    def get_stops_within(self, points: List[tuple], radius_m: float, limit: int = 100) -> List[List[Dict[str, Any]]]:
+        """For each (lat, lon): stops within radius_m, nearest first, at most limit"""
+        conn = self.get_connection()
+        try:
+            return [self._with_distances(self._stops_in_box(conn, *bbox_around(lat, lon, radius_m)),
+                                         lat, lon, radius_m)[:limit]
+                    for lat, lon in points]
+        finally:
+            conn.close()
+
+    def get_nearest_stops(self, points: List[tuple], k: int = 5,
+                          max_distance_m: float = 5000) -> List[List[Dict[str, Any]]]:
+        """
+        For each (lat, lon): the k nearest stops within max_distance_m. The search box grows
+        until it holds k stops within its inscribed radius, so the result is exact.
+        """
+        conn = self.get_connection()
+        try:
+            results = []
+            for lat, lon in points:
+                radius = min(250.0, max_distance_m)
+                while True:
+                    nearby = self._with_distances(self._stops_in_box(conn, *bbox_around(lat, lon, radius)),
+                                                  lat, lon, radius)
+                    if len(nearby) >= k or radius >= max_distance_m:
+                        break
+                    radius = min(radius * 4, max_distance_m)
+                results.append(nearby[:k])
+            return results
+        finally:
+            conn.close()
+
     def get_transit_routes(self) -> List[Dict[str, Any]]:
         """Get all transit routes"""
         query = "SELECT * FROM transit_routes"
         return self.execute_query(query)
 
+    # Analytics Queries
+
+    def get_ingest_versions(self, *sources: str) -> Dict[str, int]:
+        """Ingest version counter of each source (ingest_state); 0 for sources never ingested"""
+        rows = {row["source"]: row["version"] for row in self.execute_query(
+            f"SELECT source, version FROM ingest_state WHERE source IN ({', '.join('?' * len(sources))})", sources)}
+        return {source: rows.get(source, 0) for source in sources}
+
+    def get_data_version(self, *sources: str) -> str:
+        """Ingest version counters of the given sources, as one cache key part"""
+        return ",".join(f"{source}:{version}" for source, version in self.get_ingest_versions(*sources).items())
+
+    def get_derived_version(self, name: str) -> str:
+        """Ingest versions a derived table (rollups, sketches, climatology) has caught up to,
+        from derived_state, as one cache key part"""
+        rows = self.execute_query("SELECT source, version FROM derived_state WHERE name = ? ORDER BY source", (name,))
+        return ",".join(f"{row['source']}:{row['version']}" for row in rows)
+
+    def get_daily_aligned(self, aq_variables: List[str], weather_variables: List[str],
+                          start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Daily air quality means (from the day rollups) and daily weather on one contiguous
+        day index, as a (days, variables) array with NaN gaps. Defaults to the range both
+        sources cover.
+        """
+        aq_columns, weather_columns = self.get_table_columns("aq_hourly"), self.get_table_columns("weather_daily")
+        if unknown := [v for v in aq_variables if v not in aq_columns] + \
+                [v for v in weather_variables if v not in weather_columns]:
+            raise ValueError(f"Unknown variables: {', '.join(unknown)}")
+
+        aq_range = self.execute_query(
+            "SELECT MIN(bucket) AS first, MAX(bucket) AS last FROM aq_rollups WHERE source = 'air_quality' AND period = 'day'")[0]
+        weather_range = self.execute_query("SELECT MIN(ts) AS first, MAX(ts) AS last FROM weather_daily")[0]
+        if aq_range["first"] is None or weather_range["first"] is None:
+            raise ValueError("No air quality rollups or weather data to correlate")
+        first = to_day_epoch(start_date) if start_date else max(aq_range["first"], weather_range["first"])
+        last = to_day_epoch(end_date) if end_date else min(aq_range["last"], weather_range["last"])
+        days = (last - first) // 86400 + 1
+        if days < 2:
+            raise ValueError("Date range must span at least two days with data from both sources")
+        if days > 366 * 30:
+            raise ValueError("Date range is limited to 30 years")
+
+        values = np.full((days, len(aq_variables) + len(weather_variables)), np.nan)
+        if aq_variables:
+            rows = self.execute_query(f"""
+            SELECT bucket, metric, sum / n AS mean FROM aq_rollups
+            WHERE source = 'air_quality' AND period = 'day' AND n > 0 AND bucket BETWEEN ? AND ?
+            AND metric IN ({', '.join('?' * len(aq_variables))})
+            """, (first, last, *aq_variables))
+            column = {v: i for i, v in enumerate(aq_variables)}
+            for row in rows:
+                values[(row["bucket"] - first) // 86400, column[row["metric"]]] = row["mean"]
+        if weather_variables:
+            # Only validated names reach the SQL below
+            rows = self.execute_query(
+                f"SELECT ts, {', '.join(weather_variables)} FROM weather_daily WHERE ts BETWEEN ? AND ?",
+                (first, last))
+            if rows:
+                # None (missing values) becomes NaN
+                block = np.array([[row["ts"]] + [row[v] for v in weather_variables] for row in rows], dtype=np.float64)
+                values[((block[:, 0] - first) // 86400).astype(int), len(aq_variables):] = block[:, 1:]
+
+        return {"values": values, "first": first, "last": last}
+
+    def get_correlations(self, aq_variables: List[str], weather_variables: List[str],
+                         start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         method: str = "pearson", max_lag: int = 7) -> Dict[str, Any]:
+        """
+        Correlation matrix of all requested variables on daily values, plus lagged
+        cross-correlations of every air quality variable with every weather variable.
+        Cached per (range, variables, method, lags, data version).
+        """
+        version = self.get_data_version("air_quality", "weather")
+        key = (tuple(aq_variables), tuple(weather_variables), start_date, end_date, method, max_lag, version)
+
+        def run():
+            aligned = self.get_daily_aligned(aq_variables, weather_variables, start_date, end_date)
+            values = aligned["values"]
+            r, n = corr_matrix(values, method)
+            variables = aq_variables + weather_variables
+            lagged = []
+            if aq_variables and weather_variables:
+                k = len(aq_variables)
+                lag_r, lag_n = lagged_corr(values[:, :k], values[:, k:], max_lag, method)
+                lags = list(range(-max_lag, max_lag + 1))
+                for i, x in enumerate(aq_variables):
+                    for j, y in enumerate(weather_variables):
+                        series = lag_r[i, j]
+                        best = None if np.isnan(series).all() else int(np.nanargmax(np.abs(series)))
+                        lagged.append({
+                            "x": x, "y": y, "lags": lags,
+                            "r": [None if np.isnan(v) else float(v) for v in series],
+                            "n": lag_n[i, j].tolist(),
+                            "best_lag": lags[best] if best is not None else None,
+                            "best_r": float(series[best]) if best is not None else None,
+                        })
+            return {
+                "variables": variables,
+                "matrix": [[None if np.isnan(v) else float(v) for v in row] for row in r],
+                "n": n.tolist(),
+                "lagged": lagged,
+                "start_date": datetime.fromtimestamp(aligned["first"], ZoneInfo("UTC")).strftime("%Y-%m-%d"),
+                "end_date": datetime.fromtimestamp(aligned["last"], ZoneInfo("UTC")).strftime("%Y-%m-%d"),
+                "days": len(values),
+                "data_version": version,
+            }
+
+        return analytics_cache.get_or_compute(key, run)
+
+    # Live Update Queries
+
+    def get_ingest_low(self, source: str, since_version: int) -> Optional[int]:
+        """Oldest key written to source by the ingests after since_version (ingest_log)"""
+        rows = self.execute_query("SELECT MIN(low) AS low FROM ingest_log WHERE source = ? AND version > ?",
+                                  (source, since_version))
+        return rows[0]["low"] if rows else None
+
+    def get_air_quality_since(self, ts: int, limit: int) -> List[Dict[str, Any]]:
+        """Air quality rows from epoch ts on, oldest first"""
+        query = f"""
+        SELECT *, {AQ_TIME_SQL} as date, {AQ_TIME_SQL} as time FROM aq_hourly
+        WHERE ts >= ? ORDER BY ts LIMIT ?
+        """
+        return self.execute_query(query, (ts, limit))
+
+    def get_openaq_since(self, ts: int, limit: int) -> List[Dict[str, Any]]:
+        """OpenAQ measurements from epoch ts on, oldest first"""
+        query = f"""
+        SELECT value, parameter as parameter_name, {AQ_TIME_SQL} as datetime FROM openaq_measurements
+        WHERE ts >= ? ORDER BY ts LIMIT ?
+        """
+        return self.execute_query(query, (ts, limit))
+
     # Dashboard Summary
 
     def get_dashboard_summary(self) -> Dict[str, Any]:
@@ -217,9 +963,9 @@ class DatabaseManager:
         current_aq = self.get_current_air_quality()
 
         # Latest weather
-        latest_weather_query = """
-        SELECT * FROM historical_weather_data
-        ORDER BY date DESC
+        latest_weather_query = f"""
+        SELECT *, {DAY_SQL} as date FROM weather_daily
+        ORDER BY ts DESC
         LIMIT 1
         """
         latest_weather = self.execute_query(latest_weather_query)
@@ -230,20 +976,29 @@ class DatabaseManager:
         except Exception:
             ndvi_stats = {"statistics": {}, "greenest_areas": []}
 
-        # Recent trends (average of most recent 168 records ~7 days of hourly data)
-        recent_aq_query = """
-        SELECT
-            AVG(pm2_5) as avg_pm25,
-            AVG(pm10) as avg_pm10,
-            AVG(us_aqi) as avg_aqi
-        FROM (
-            SELECT pm2_5, pm10, us_aqi
-            FROM historical_air_quality_data
-            ORDER BY date DESC
-            LIMIT 168
-        )
-        """
-        recent_trends = self.execute_query(recent_aq_query)
+        # Recent trends: 7-day means merged from the daily rollups
+        try:
+            means = self.get_recent_rollup_means(["pm2_5", "pm10", "us_aqi"])
+        except sqlite3.OperationalError:
+            means = {}  # rollups not built yet
+        if means:
+            recent_trends = [{"avg_pm25": means.get("pm2_5"), "avg_pm10": means.get("pm10"),
+                              "avg_aqi": means.get("us_aqi")}]
+        else:
+            # Fall back to the average of most recent 168 records ~7 days of hourly data
+            recent_aq_query = """
+            SELECT
+                AVG(pm2_5) as avg_pm25,
+                AVG(pm10) as avg_pm10,
+                AVG(us_aqi) as avg_aqi
+            FROM (
+                SELECT pm2_5, pm10, us_aqi
+                FROM aq_hourly
+                ORDER BY ts DESC
+                LIMIT 168
+            )
+            """
+            recent_trends = self.execute_query(recent_aq_query)
 
         return {
             "current_air_quality": current_aq,
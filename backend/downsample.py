@@ -0,0 +1,88 @@
+"""
+Server-side downsampling for long time-series ranges
+
+Two complementary reductions, both applied before serialization:
+- bucket aggregation (mean/min/max per hour/day/week/month), done in SQL
+- LTTB (Largest-Triangle-Three-Buckets), which keeps the visual shape of a series
+  when thinning it to roughly the number of pixels a chart can draw
+"""
+from typing import List, Optional
+
+import numpy as np
+
+RESOLUTIONS = ("hour", "day", "week", "month")
+AGGREGATES = {"mean": "AVG", "min": "MIN", "max": "MAX"}
+
+# Epoch of Monday 1970-01-05, so weekly buckets start on Mondays
+_WEEK_ORIGIN = 4 * 86400
+
+
+def _floor_sql(step: int, origin: int = 0) -> str:
+    # SQLite's % truncates toward zero, so normalise the remainder for pre-1970 keys
+    return f"(ts - (((ts - {origin}) % {step}) + {step}) % {step})"
+
+
+def bucket_sql(resolution: str, day_keys: bool = False) -> str:
+    """
+    SQL expression mapping the epoch key ts to the start of its bucket. Day, week and
+    month buckets follow local (America/Chicago) calendar days: UTC instants go through
+    local_bucket_start(), the SQL function DatabaseManager registers, while day_keys
+    (00:00 UTC of the local date, as in weather_daily) are already local and are floored
+    directly. Hours are the same in both, local offsets being whole hours.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    if resolution == "hour":
+        return _floor_sql(3600)
+    if not day_keys:
+        return f"local_bucket_start(ts, '{resolution}')"
+    if resolution == "day":
+        return _floor_sql(86400)
+    if resolution == "week":
+        return _floor_sql(7 * 86400, _WEEK_ORIGIN)
+    return "CAST(strftime('%s', ts, 'unixepoch', 'start of month') AS INTEGER)"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points LTTB keeps when reducing (x, y) to threshold points.
+    x must be sorted ascending; NaN values in y are never selected."""
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if threshold >= n:
+        return valid
+    if threshold < 3:
+        return valid[np.linspace(0, n - 1, max(threshold, 1)).astype(int)]
+
+    xs, ys = x[valid].astype(np.float64), y[valid].astype(np.float64)
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xs[end:next_end].mean(), ys[end:next_end].mean()
+
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return valid[selected]
+
+
+def lttb_keys(ts: List[int], values: List[Optional[float]], threshold: int) -> List[int]:
+    """Timestamps LTTB keeps when thinning the series (ts ascending, values may be None)
+    to threshold points"""
+    x = np.asarray(ts, dtype=np.float64)
+    y = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if len(x) <= threshold:
+        return list(ts)
+    if np.isnan(y).all():
+        # Nothing to preserve the shape of; fall back to an even stride
+        picked = np.linspace(0, len(x) - 1, threshold).astype(int)
+    else:
+        picked = lttb_indices(x, y, threshold)
+    return [ts[i] for i in picked.tolist()]
@@ -0,0 +1,141 @@
+"""
+Server-sent live updates
+
+One in-process Publisher polls ingest_state (one row per source) and, when a collector
+commits a new version, reads only what that ingest wrote (the key range in ingest_log)
+and broadcasts it to the subscribers of the matching topics. Each event is encoded once
+and the same bytes are queued for every connection; a subscriber that falls QUEUE_SIZE
+events behind is dropped, and its EventSource reconnects and refetches.
+
+Topics:
+    aq         new or changed aq_hourly rows (source air_quality)
+    openaq     new or changed OpenAQ measurements
+    forecast   the replaced 16-day forecast (source weather_forecast)
+    anomalies  anomalies inside the key range of an air quality ingest
+
+A delta larger than MAX_DELTA_ROWS (a backfill) is sent as {"reset": true} instead; the
+client should refetch over REST.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from database import db
+
+TOPICS = ("aq", "openaq", "forecast", "anomalies")
+SOURCE_TOPICS = {
+    "air_quality": ("aq", "anomalies"),
+    "openaq": ("openaq",),
+    "weather_forecast": ("forecast",),
+}
+POLL_SECONDS = 2.0
+KEEPALIVE_SECONDS = 15.0
+QUEUE_SIZE = 64
+MAX_DELTA_ROWS = 1000
+
+
+def sse_message(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    """One text/event-stream message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    """A connection's topics and its queue of encoded messages"""
+
+    def __init__(self, topics: Iterable[str]):
+        self.topics = tuple(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = False
+
+
+class Publisher:
+    """Fans ingest deltas out from one polling task to every subscription"""
+
+    def __init__(self, poll_seconds: float = POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.subscribers: Dict[str, Set[Subscription]] = {topic: set() for topic in TOPICS}
+        self.versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connections(self) -> int:
+        return len(set().union(*self.subscribers.values()))
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Register a subscription; starts the polling task if it isn't running"""
+        subscription = Subscription(topics)
+        for topic in subscription.topics:
+            self.subscribers[topic].add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            self.subscribers[topic].discard(subscription)
+
+    def publish(self, topic: str, message: bytes):
+        for subscription in list(self.subscribers[topic]):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    async def _run(self):
+        """Poll until the last subscriber leaves. Versions are re-read on every start, so
+        a new run only sends what is ingested after it began."""
+        self.versions = await asyncio.to_thread(db.get_ingest_versions, *SOURCE_TOPICS)
+        while self.connections:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                events = await asyncio.to_thread(self.poll)
+            except Exception as e:
+                print(f"Live update poll failed: {e}")
+                continue
+            for topic, message in events:
+                self.publish(topic, message)
+
+    def poll(self) -> List[Tuple[str, bytes]]:
+        """Deltas of every source whose version moved since the last poll, as (topic, message)"""
+        events = []
+        for source, version in db.get_ingest_versions(*SOURCE_TOPICS).items():
+            seen = self.versions.get(source, 0)
+            if version <= seen:
+                continue
+            topics = [topic for topic in SOURCE_TOPICS[source] if self.subscribers[topic]]
+            if topics:
+                low = db.get_ingest_low(source, seen)
+                event_id = f"{source}:{version}"
+                for topic in topics:
+                    events.append((topic, sse_message(topic, self.delta(topic, low, version), event_id)))
+            self.versions[source] = version
+        return events
+
+    @staticmethod
+    def delta(topic: str, low: Optional[int], version: int) -> Dict[str, Any]:
+        """What changed for one topic since key low"""
+        if topic == "forecast":
+            return {"version": version, "rows": db.get_weather_forecast()}
+        if low is None:
+            return {"version": version, "reset": True}
+        if topic == "anomalies":
+            from ml.predict import ml_predictor
+            result = ml_predictor.detect_anomalies("air_quality")
+            start = datetime.fromtimestamp(low, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            anomalies = [a for a in result.get("anomalies", []) if a["timestamp"] >= start]
+            return {"version": version, "rows": anomalies}
+
+        read = db.get_air_quality_since if topic == "aq" else db.get_openaq_since
+        rows = read(low, MAX_DELTA_ROWS + 1)
+        if len(rows) > MAX_DELTA_ROWS:
+            return {"version": version, "reset": True}
+        return {"version": version, "rows": rows}
+
+
+publisher = Publisher()
@@ -2,51 +2,131 @@
 SIGAIDA Campus Energy - FastAPI Backend
 Main application entry point
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
+import asyncio
+import json
+import os
+import secrets
 import sys
+import time
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent))
 
-from database import db
+from database import LOCAL_TZ, db
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, TimedRoute, render as render_metrics
+from live import KEEPALIVE_SECONDS, SOURCE_TOPICS, TOPICS, publisher, sse_message
+from ndvi_grid import cell_ids, cells_in_polygon
+from profiling import FORMATS as PROFILE_FORMATS, ProfilingMiddleware, profiles
+from sketch import RELATIVE_ACCURACY
+from singleflight import singleflight
+from slow_queries import slow_log
+from startup import readiness
 from models import (
     HealthResponse,
+    ReadyResponse,
     CurrentAirQualityResponse,
     HistoricalAirQualityResponse,
     OpenAQResponse,
+    RollupResponse,
+    PercentileResponse,
     HistoricalWeatherResponse,
+    ClimatologyResponse,
     WeatherForecastResponse,
     LatestNDVIResponse,
     NDVITimeSeriesResponse,
+    NDVIBatchRequest,
+    NDVIBatchTimeSeriesResponse,
     NDVIStatsResponse,
     NDVIMonthlyAverageResponse,
+    NDVIRastersResponse,
+    NDVIChangeResponse,
+    NDVITrendResponse,
     TransitStopsResponse,
     TransitRoutesResponse,
+    NearbyStopsResponse,
+    NearbyStopsBatchResponse,
+    NearestStopsBatchRequest,
+    StopsWithinBatchRequest,
     DashboardSummary,
     AirQualityData,
     OpenAQData,
+    RollupPoint,
+    PercentileValue,
     WeatherData,
+    ClimatologyPoint,
     WeatherForecastData,
     NDVIGridCell,
     NDVITimeSeriesPoint,
     NDVIMonthlyAverage,
+    NDVIRasterInfo,
+    NDVIChangeCell,
+    NDVITrendCell,
     TransitStop,
-    TransitRoute
+    TransitRoute,
+    CorrelationResponse,
+    BatchRequest,
+    BatchSubRequest,
+    BatchResponse,
+    SlowQueryLogResponse,
+    ProfileListResponse
 )
 
+# Georeference of /api/ndvi/raster bodies, readable by the browser
+RASTER_HEADERS = ["X-Raster-Width", "X-Raster-Height", "X-Raster-Origin-X", "X-Raster-Origin-Y",
+                  "X-Raster-Cell-Size", "X-Raster-CRS", "X-Raster-Year", "X-Raster-Month", "ETag"]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start listening right away and warm the database, caches and models in the background"""
+    warmup = asyncio.create_task(asyncio.to_thread(readiness.warmup))
+    yield
+    if not warmup.done():
+        print("Shutting down before warmup finished")
+        readiness.stop()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="SIGAIDA Campus Energy API",
     description="Environmental data API for UIUC campus monitoring",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
+# Data version of each route whose responses are cached precompressed; a route is only
+# listed if its response depends on nothing but the query string and that version
+_ndvi_version = db.get_ndvi_grid_version
+CACHED_RESPONSES = {
+    "/api/air-quality/historical": lambda: db.get_data_version("air_quality"),
+    "/api/air-quality/openaq": lambda: db.get_data_version("openaq"),
+    "/api/air-quality/rollups": lambda: db.get_derived_version("aq_rollups"),
+    "/api/air-quality/percentiles": lambda: db.get_derived_version("aq_sketches"),
+    "/api/weather/forecast": lambda: db.get_data_version("weather_forecast"),
+    "/api/weather/historical": lambda: db.get_data_version("weather"),
+    # The default range is today, so the local date is part of the version
+    "/api/weather/climatology": lambda: f"{db.get_derived_version('weather_climatology')}@{datetime.now(LOCAL_TZ).date()}",
+    "/api/ndvi/latest": _ndvi_version,
+    "/api/ndvi/timeseries": _ndvi_version,
+    "/api/ndvi/stats": _ndvi_version,
+    "/api/ndvi/monthly-average": _ndvi_version,
+    "/api/ndvi/change": _ndvi_version,
+    "/api/ndvi/trend": _ndvi_version,
+}
+
+# Compression and the precompressed response cache, inside CORS so cached responses get its headers
+app.add_middleware(CompressionMiddleware, cached=CACHED_RESPONSES, exclude=["/api/stream"])
+
 # CORS middleware - allow all origins for development
 app.add_middleware(
     CORSMiddleware,
@@ -54,20 +134,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=RASTER_HEADERS,
 )
 
+# Per-route latency and serialization histograms for /metrics; the stream's latency is its lifetime
+app.router.route_class = TimedRoute
+app.add_middleware(MetricsMiddleware, exclude=["/api/stream"])
+
+# Opt-in request profiling, outermost so middleware time is included; not installed unless enabled
+if profiles.enabled:
+    app.add_middleware(ProfilingMiddleware, store=profiles, exclude=["/api/stream"])
+
 
 # Health Check
 
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint"""
+    """Liveness check; cheap enough for every probe (see /api/ready for warm state)"""
     try:
-        # Test database connection
-        db.get_connection().close()
-        database_connected = True
-    except Exception:
-        database_connected = False
+        database_connected = db.current_path().exists()
+    except OSError:
+        database_connected = False  # snapshot mode without a published snapshot
 
     return {
         "status": "healthy" if database_connected else "degraded",
@@ -77,6 +164,15 @@ async def health_check():
     }
 
 
+@app.get("/api/ready", response_model=ReadyResponse)
+async def ready_check(response: Response):
+    """Readiness check: 200 once the database, caches and models are warm, 503 until then"""
+    report = readiness.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+
 # Air Quality Endpoints
 
 @app.get("/api/air-quality/current", response_model=CurrentAirQualityResponse)
@@ -99,11 +195,15 @@ async def get_current_air_quality():
 async def get_historical_air_quality(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of records")
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of records"),
+    resolution: Optional[Literal["hour", "day", "week", "month"]] = Query(None, description="Aggregate into buckets of this size"),
+    agg: Literal["mean", "min", "max"] = Query("mean", description="Bucket aggregate"),
+    max_points: Optional[int] = Query(None, ge=2, le=10000, description="Downsample the whole range to this many points with LTTB (e.g. chart width); overrides limit"),
+    lttb_column: str = Query("pm2_5", description="Column whose shape LTTB preserves")
 ):
     """Get historical air quality data within a date range"""
     try:
-        data = db.get_historical_air_quality(start_date, end_date, limit)
+        data = db.get_historical_air_quality(start_date, end_date, limit, resolution, agg, max_points, lttb_column)
 
         return {
             "data": [AirQualityData(**item) for item in data],
@@ -111,6 +211,9 @@ async def get_historical_air_quality(
             "start_date": start_date,
             "end_date": end_date
         }
+    except ValueError as e:
+        # Unknown lttb_column or malformed date
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching historical data: {str(e)}")
 
@@ -132,6 +235,66 @@ async def get_openaq_data(
         raise HTTPException(status_code=500, detail=f"Error fetching OpenAQ data: {str(e)}")
 
 
+@app.get("/api/air-quality/rollups", response_model=RollupResponse)
+async def get_air_quality_rollups(
+    metric: str = Query("pm2_5", description="Pollutant column (air_quality) or OpenAQ parameter, e.g. pm25"),
+    period: Literal["day", "week", "month"] = Query("day", description="Rollup bucket size"),
+    source: Literal["air_quality", "openaq"] = Query("air_quality", description="Open-Meteo model data or the OpenAQ sensor"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    limit: int = Query(366, ge=1, le=10000, description="Maximum number of buckets")
+):
+    """Get daily/weekly/monthly count, mean, min, max and standard deviation of a metric"""
+    try:
+        data = db.get_rollups(metric, period, source, start_date, end_date, limit)
+
+        return {
+            "data": [RollupPoint(**item) for item in data],
+            "count": len(data),
+            "source": source,
+            "metric": metric,
+            "period": period
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching rollups: {str(e)}")
+
+
+@app.get("/api/air-quality/percentiles", response_model=PercentileResponse)
+async def get_air_quality_percentiles(
+    metric: str = Query("pm2_5", description="Pollutant column (air_quality) or OpenAQ parameter, e.g. pm25"),
+    q: str = Query("0.05,0.5,0.95", description="Comma-separated quantiles between 0 and 1"),
+    source: Literal["air_quality", "openaq"] = Query("air_quality", description="Open-Meteo model data or the OpenAQ sensor"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD), default first day with data"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD), default latest")
+):
+    """Get arbitrary percentiles of a metric over any date range from the mergeable quantile sketches"""
+    try:
+        qs = [float(v) for v in q.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be comma-separated numbers")
+    if not qs or any(not 0 <= v <= 1 for v in qs):
+        raise HTTPException(status_code=400, detail="Quantiles must be between 0 and 1")
+    try:
+        result = db.get_percentiles(metric, qs, start_date, end_date, source)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching percentiles: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No {metric} data in this range")
+
+    return {
+        "data": [PercentileValue(q=v, value=value) for v, value in zip(qs, result["values"])],
+        "metric": metric,
+        "source": source,
+        "count": result["count"],
+        "min": result["min"],
+        "max": result["max"],
+        "relative_accuracy": RELATIVE_ACCURACY,
+        "sketches_merged": result["sketches"],
+        "start_date": start_date,
+        "end_date": end_date
+    }
+
+
 # Weather Endpoints
 
 @app.get("/api/weather/forecast", response_model=WeatherForecastResponse)
@@ -152,11 +315,15 @@ async def get_weather_forecast():
 async def get_historical_weather(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    limit: int = Query(365, ge=1, le=10000, description="Maximum number of records")
+    limit: int = Query(365, ge=1, le=10000, description="Maximum number of records"),
+    resolution: Optional[Literal["day", "week", "month"]] = Query(None, description="Aggregate into buckets of this size"),
+    agg: Literal["mean", "min", "max"] = Query("mean", description="Bucket aggregate"),
+    max_points: Optional[int] = Query(None, ge=2, le=10000, description="Downsample the whole range to this many points with LTTB (e.g. chart width); overrides limit"),
+    lttb_column: str = Query("temperature_2m_max", description="Column whose shape LTTB preserves")
 ):
     """Get historical daily weather data"""
     try:
-        data = db.get_historical_weather(start_date, end_date, limit)
+        data = db.get_historical_weather(start_date, end_date, limit, resolution, agg, max_points, lttb_column)
 
         return {
             "data": [WeatherData(**item) for item in data],
@@ -164,10 +331,35 @@ async def get_historical_weather(
             "start_date": start_date,
             "end_date": end_date
         }
+    except ValueError as e:
+        # Unknown lttb_column or malformed date
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching historical weather: {str(e)}")
 
 
+@app.get("/api/weather/climatology", response_model=ClimatologyResponse)
+async def get_weather_climatology(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD), default today"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD), default start_date"),
+    variables: str = Query("temperature_2m_max,temperature_2m_min,precipitation_sum", description="Comma-separated daily weather columns")
+):
+    """Get day-of-year normals, percentiles and records, compared with observed weather"""
+    try:
+        data = db.get_weather_climatology(start_date, end_date, [v.strip() for v in variables.split(",") if v.strip()])
+
+        return {
+            "data": [ClimatologyPoint(**item) for item in data],
+            "count": len(data),
+            "start_date": start_date,
+            "end_date": end_date
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching weather climatology: {str(e)}")
+
+
 @app.get("/api/weather/current")
 async def get_current_weather():
     """Get current weather conditions (from latest historical data)"""
@@ -233,6 +425,30 @@ async def get_ndvi_timeseries(
         raise HTTPException(status_code=500, detail=f"Error fetching NDVI time series: {str(e)}")
 
 
+@app.post("/api/ndvi/timeseries/batch", response_model=NDVIBatchTimeSeriesResponse)
+async def get_ndvi_timeseries_batch(request: NDVIBatchRequest):
+    """Get NDVI time series for many points and/or every cell inside a polygon in one query"""
+    if not request.points and not request.polygon:
+        raise HTTPException(status_code=400, detail="Give points, a polygon, or both")
+    try:
+        point_ids = cell_ids([p.lat for p in request.points], [p.lon for p in request.points]).tolist()
+        polygon_ids = cells_in_polygon(request.polygon).tolist() if request.polygon else []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = db.get_ndvi_cell_series(point_ids + polygon_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching NDVI time series: {str(e)}")
+
+    found = {cell["cell_id"] for cell in result["cells"]}
+    return {
+        "months": result["months"],
+        "cells": result["cells"],
+        "count": len(result["cells"]),
+        "point_cells": [cell if cell in found else None for cell in point_ids]
+    }
+
+
 @app.get("/api/ndvi/stats", response_model=NDVIStatsResponse)
 async def get_ndvi_stats():
     """Get NDVI statistics including mean, min, max, and greenest areas"""
@@ -265,6 +481,134 @@ async def get_ndvi_monthly_average():
         raise HTTPException(status_code=500, detail=f"Error fetching monthly NDVI: {str(e)}")
 
 
+@app.get("/api/ndvi/rasters", response_model=NDVIRastersResponse)
+async def get_ndvi_rasters():
+    """List the precomputed monthly NDVI rasters with their grid shape and georeference"""
+    try:
+        data = db.get_ndvi_rasters()
+
+        return {
+            "data": [NDVIRasterInfo(**item) for item in data],
+            "count": len(data)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching NDVI rasters: {str(e)}")
+
+
+def _ndvi_raster(request: Request, year: Optional[int], month: Optional[int], media_type: str, column: str) -> Response:
+    """Serve one blob of a monthly raster, honouring If-None-Match"""
+    if (year is None) != (month is None):
+        raise HTTPException(status_code=400, detail="year and month must be given together")
+    try:
+        raster = db.get_ndvi_raster(year, month)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching NDVI raster: {str(e)}")
+    if raster is None:
+        raise HTTPException(status_code=404, detail="No NDVI raster available")
+
+    # Rasters only change when push_ndvi_data.py reloads their month, which changes the digest
+    etag = f'"{raster["digest"]}-{column}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=3600" if year is None else "public, max-age=86400",
+        "X-Raster-Width": str(raster["width"]),
+        "X-Raster-Height": str(raster["height"]),
+        "X-Raster-Origin-X": str(raster["origin_x"]),
+        "X-Raster-Origin-Y": str(raster["origin_y"]),
+        "X-Raster-Cell-Size": str(raster["cell_size"]),
+        "X-Raster-CRS": "EPSG:3857",
+        "X-Raster-Year": str(raster["year"]),
+        "X-Raster-Month": str(raster["month"]),
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=raster[column], media_type=media_type, headers=headers)
+
+
+@app.get("/api/ndvi/raster", response_class=Response)
+async def get_ndvi_raster(
+    request: Request,
+    year: Optional[int] = Query(None, description="Year (default: latest month)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Month (default: latest month)")
+):
+    """
+    Get one month of NDVI as a packed little-endian float32 array (height x width, row-major,
+    north-up, NaN = no data). Shape and EPSG:3857 origin/cell size are in the X-Raster-* headers.
+    """
+    return _ndvi_raster(request, year, month, "application/octet-stream", "data")
+
+
+@app.get("/api/ndvi/raster.png", response_class=Response)
+async def get_ndvi_raster_png(
+    request: Request,
+    year: Optional[int] = Query(None, description="Year (default: latest month)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Month (default: latest month)")
+):
+    """Get one month of NDVI as a color-mapped PNG, one pixel per cell (see /api/ndvi/rasters for bounds)"""
+    return _ndvi_raster(request, year, month, "image/png", "png")
+
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+@app.get("/api/ndvi/change", response_model=NDVIChangeResponse)
+async def get_ndvi_change(
+    before_start: str = Query(..., pattern=MONTH_PATTERN, description="First month of the earlier period (YYYY-MM)"),
+    after_start: str = Query(..., pattern=MONTH_PATTERN, description="First month of the later period (YYYY-MM)"),
+    before_end: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Last month of the earlier period, default before_start"),
+    after_end: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Last month of the later period, default after_start"),
+    alpha: float = Query(0.05, gt=0, lt=1, description="Significance level")
+):
+    """Get the per-cell NDVI change between two periods, with significance where both span 2+ months"""
+    before = (before_start, before_end or before_start)
+    after = (after_start, after_end or after_start)
+    try:
+        result = db.get_ndvi_change(before, after, alpha)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing NDVI change: {str(e)}")
+    if result is None or not result["data"]:
+        raise HTTPException(status_code=404, detail="No NDVI data for these periods")
+
+    return {
+        "data": [NDVIChangeCell(**item) for item in result["data"]],
+        "count": len(result["data"]),
+        "summary": result["summary"],
+        "before": {"start": before[0], "end": before[1]},
+        "after": {"start": after[0], "end": after[1]},
+        "grid_version": result["grid_version"]
+    }
+
+
+@app.get("/api/ndvi/trend", response_model=NDVITrendResponse)
+async def get_ndvi_trend(
+    start_month: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="First month (YYYY-MM), default first available"),
+    end_month: Optional[str] = Query(None, pattern=MONTH_PATTERN, description="Last month (YYYY-MM), default latest"),
+    months_of_year: Optional[str] = Query(None, description="Comma-separated calendar months to include, e.g. 6,7,8"),
+    alpha: float = Query(0.05, gt=0, lt=1, description="Significance level")
+):
+    """Get the per-cell linear NDVI trend (per year) and its significance"""
+    try:
+        months = tuple(sorted({int(m) for m in months_of_year.split(",") if m.strip()})) if months_of_year else ()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="months_of_year must be comma-separated integers")
+    try:
+        result = db.get_ndvi_trend(start_month, end_month, months, alpha)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing NDVI trend: {str(e)}")
+    if result is None or not result["data"]:
+        raise HTTPException(status_code=404, detail="No NDVI data for this range")
+
+    return {
+        "data": [NDVITrendCell(**item) for item in result["data"]],
+        "count": len(result["data"]),
+        "summary": result["summary"],
+        "start_month": start_month,
+        "end_month": end_month,
+        "months_of_year": list(months),
+        "grid_version": result["grid_version"]
+    }
+
+
 # Transit Endpoints
 
 @app.get("/api/transit/stops", response_model=TransitStopsResponse)
@@ -281,6 +625,87 @@ async def get_transit_stops():
         raise HTTPException(status_code=500, detail=f"Error fetching transit stops: {str(e)}")
 
 
+@app.get("/api/transit/stops/nearest", response_model=NearbyStopsResponse)
+async def get_nearest_stops(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    k: int = Query(5, ge=1, le=100, description="Number of stops"),
+    max_distance_m: float = Query(5000, gt=0, le=50000, description="Search radius cap (m)")
+):
+    """Get the k nearest stops to a point, nearest first"""
+    try:
+        data = db.get_nearest_stops([(lat, lon)], k, max_distance_m)[0]
+
+        return {
+            "data": data,
+            "count": len(data),
+            "query": {"lat": lat, "lon": lon, "k": k, "max_distance_m": max_distance_m}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding nearest stops: {str(e)}")
+
+
+@app.get("/api/transit/stops/within", response_model=NearbyStopsResponse)
+async def get_stops_within(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    radius_m: float = Query(500, gt=0, le=50000, description="Radius (m)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of stops")
+):
+    """Get the stops within a radius of a point, nearest first"""
+    try:
+        data = db.get_stops_within([(lat, lon)], radius_m, limit)[0]
+
+        return {
+            "data": data,
+            "count": len(data),
+            "query": {"lat": lat, "lon": lon, "radius_m": radius_m}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding stops: {str(e)}")
+
+
+@app.get("/api/transit/stops/bbox", response_model=NearbyStopsResponse)
+async def get_stops_in_bbox(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of stops")
+):
+    """Get the stops inside a bounding box (e.g. the visible map area)"""
+    try:
+        data = db.get_stops_in_bbox(south, west, north, east, limit)
+
+        return {
+            "data": data,
+            "count": len(data),
+            "query": {"south": south, "west": west, "north": north, "east": east}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding stops: {str(e)}")
+
+
+@app.post("/api/transit/stops/nearest/batch", response_model=NearbyStopsBatchResponse)
+async def get_nearest_stops_batch(request: NearestStopsBatchRequest):
+    """Get the k nearest stops for each of many points"""
+    try:
+        results = db.get_nearest_stops([(p.lat, p.lon) for p in request.points], request.k, request.max_distance_m)
+        return {"results": results, "count": len(results)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding nearest stops: {str(e)}")
+
+
+@app.post("/api/transit/stops/within/batch", response_model=NearbyStopsBatchResponse)
+async def get_stops_within_batch(request: StopsWithinBatchRequest):
+    """Get the stops within a radius of each of many points"""
+    try:
+        results = db.get_stops_within([(p.lat, p.lon) for p in request.points], request.radius_m, request.limit)
+        return {"results": results, "count": len(results)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding stops: {str(e)}")
+
+
 @app.get("/api/transit/routes", response_model=TransitRoutesResponse)
 async def get_transit_routes():
     """Get all transit routes"""
@@ -297,16 +722,51 @@ async def get_transit_routes():
 
 # Dashboard Summary Endpoint
 
+async def _coalesced(name: str, fn, *args):
+    """fn(*args) in a worker thread, one run shared by concurrent identical calls. Inside a
+    batch it runs inline instead, on the batch's snapshot connection."""
+    if db.in_snapshot():
+        return fn(*args)
+    return await singleflight.do(name, fn, *args)
+
+
 @app.get("/api/dashboard/summary", response_model=DashboardSummary)
 async def get_dashboard_summary():
     """Get aggregated data for dashboard overview"""
     try:
-        summary = db.get_dashboard_summary()
+        summary = await _coalesced("dashboard_summary", db.get_dashboard_summary)
         return DashboardSummary(**summary)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching dashboard summary: {str(e)}")
 
 
+# Analytics Endpoints
+
+@app.get("/api/analytics/correlation", response_model=CorrelationResponse)
+async def get_correlation(
+    aq_variables: str = Query("pm2_5,ozone", description="Comma-separated air quality columns (daily means)"),
+    weather_variables: str = Query("temperature_2m_max,wind_speed_10m_max,precipitation_sum", description="Comma-separated daily weather columns"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD), default first day both sources cover"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD), default last day both sources cover"),
+    method: Literal["pearson", "spearman"] = Query("pearson", description="Correlation coefficient"),
+    max_lag: int = Query(7, ge=0, le=60, description="Largest lag in days for the cross-correlations")
+):
+    """Get the correlation matrix of air quality and weather variables on a daily index, and
+    lagged cross-correlations of each air quality variable with each weather variable"""
+    aq = [v.strip() for v in aq_variables.split(",") if v.strip()]
+    weather = [v.strip() for v in weather_variables.split(",") if v.strip()]
+    if len(aq) + len(weather) < 2:
+        raise HTTPException(status_code=400, detail="At least two variables are required")
+    try:
+        result = db.get_correlations(aq, weather, start_date, end_date, method, max_lag)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing correlations: {str(e)}")
+
+    return {**result, "method": method}
+
+
 # ML Prediction Endpoints
 
 @app.get("/api/ml/air-quality-forecast")
@@ -314,7 +774,7 @@ async def get_air_quality_forecast(days: int = Query(7, ge=1, le=30, description
     """Get ML-based air quality forecast (placeholder implementation)"""
     try:
         from ml.predict import ml_predictor
-        predictions = ml_predictor.predict_air_quality(days)
+        predictions = await _coalesced("air_quality_forecast", ml_predictor.predict_air_quality, days)
         return {
             "predictions": predictions,
             "days": days,
@@ -343,7 +803,7 @@ async def detect_anomalies(data_type: str = Query("air_quality", description="Ty
     """Detect anomalies in environmental data (placeholder implementation)"""
     try:
         from ml.predict import ml_predictor
-        anomalies = ml_predictor.detect_anomalies(data_type)
+        anomalies = await _coalesced("anomalies", ml_predictor.detect_anomalies, data_type)
         return anomalies
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting anomalies: {str(e)}")
@@ -359,6 +819,184 @@ async def get_model_info():
         raise HTTPException(status_code=500, detail=f"Error fetching model info: {str(e)}")
 
 
+# Live Update Endpoint
+
+@app.get("/api/stream")
+async def stream_updates(
+    request: Request,
+    topics: str = Query(",".join(TOPICS), description=f"Comma-separated topics: {', '.join(TOPICS)}")
+):
+    """
+    Server-sent events carrying only what each ingest changed, per topic. The first event
+    (`ready`) lists the topics and current versions; comment lines keep idle connections open.
+    """
+    selected = [t.strip() for t in topics.split(",") if t.strip()]
+    if not selected or any(t not in TOPICS for t in selected):
+        raise HTTPException(status_code=400, detail=f"topics must be among: {', '.join(TOPICS)}")
+
+    async def events():
+        # Subscribed when the response starts streaming and released in the same finally, so
+        # a client gone before the first event leaves no queue behind. Subscribing before
+        # reading the versions means no delta is missed between the two.
+        subscription = publisher.subscribe(selected)
+        try:
+            versions = await asyncio.to_thread(db.get_ingest_versions, *SOURCE_TOPICS)
+            yield b"retry: 5000\n" + sse_message("ready", {"topics": selected, "versions": versions})
+            while not subscription.dropped:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if not subscription.dropped:
+                    yield message
+        finally:
+            publisher.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Batch Endpoint
+
+async def _run_subrequest(request: Request, index: int, item: BatchSubRequest) -> bytes:
+    """Call one batch item through the app in-process; returns its BatchResult as JSON"""
+    path, _, query = item.path.partition("?")
+    body = json.dumps(item.body).encode() if item.body is not None else b""
+    headers = [(b"host", request.headers.get("host", "localhost").encode())]
+    if body:
+        headers.append((b"content-type", b"application/json"))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": item.method, "scheme": request.url.scheme, "root_path": "",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "headers": headers, "client": request.scope.get("client"), "server": request.scope.get("server"),
+    }
+    start, chunks = {}, []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    started = time.perf_counter()
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        # The app has already sent its 500 response if it got that far
+        start.setdefault("status", 500)
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    content_type = next((v.decode() for k, v in start.get("headers", []) if k == b"content-type"), None)
+    content = b"".join(chunks)
+    is_json = content_type is not None and content_type.startswith("application/json") and content
+    # The endpoint's JSON is spliced in as-is rather than parsed and serialized again
+    return (b'{"id":' + json.dumps(item.id if item.id is not None else str(index)).encode()
+            + b',"status":' + str(start.get("status", 500)).encode()
+            + b',"duration_ms":' + json.dumps(round(duration_ms, 3)).encode()
+            + b',"content_type":' + json.dumps(content_type).encode()
+            + b',"body":' + (content if is_json else b"null") + b"}")
+
+
+def _run_batch(request: Request, items) -> List[bytes]:
+    """Run the sub-requests one after another inside one snapshot, on a private event
+    loop in the calling worker thread"""
+    async def run_all():
+        with db.snapshot():
+            return [await _run_subrequest(request, i, item) for i, item in enumerate(items)]
+    return asyncio.run(run_all())
+
+
+@app.post("/api/batch", response_model=BatchResponse)
+async def batch(request: Request, payload: BatchRequest):
+    """
+    Run up to 50 API calls in one round trip. Sub-requests run in-process,
+    sequentially, in a worker thread (the handlers query SQLite synchronously, so the event
+    loop stays free for other requests). They share one database connection and read
+    snapshot, so their results are consistent with each other. Each result carries its
+    own status and timing; a failing item does not fail the batch.
+    """
+    for item in payload.requests:
+        path = item.path.partition("?")[0]
+        if not path.startswith("/api/") or path.rstrip("/") in ("/api/batch", "/api/stream"):
+            raise HTTPException(status_code=400, detail=f"Cannot batch {item.path}")
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.to_thread(_run_batch, request, payload.requests)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running batch: {str(e)}")
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    content = (b'{"results":[' + b",".join(results) + b'],"count":' + str(len(results)).encode()
+               + b',"duration_ms":' + json.dumps(round(duration_ms, 3)).encode() + b"}")
+    return Response(content=content, media_type="application/json")
+
+
+# Admin Endpoints
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need the X-Admin-Token header to match SIGAIDA_ADMIN_TOKEN"""
+    token = os.getenv("SIGAIDA_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set SIGAIDA_ADMIN_TOKEN")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/api/admin/slow-queries", response_model=SlowQueryLogResponse, dependencies=[Depends(require_admin)])
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000, description="Maximum number of records")):
+    """Get the newest queries that exceeded the slow-query threshold, with their plans"""
+    return slow_log.report(limit)
+
+
+@app.delete("/api/admin/slow-queries", response_model=SlowQueryLogResponse, dependencies=[Depends(require_admin)])
+async def clear_slow_queries():
+    """Empty the slow-query log and reset its counters"""
+    slow_log.clear()
+    return slow_log.report()
+
+
+@app.get("/api/admin/profiles", response_model=ProfileListResponse, dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """List the stored request profiles (see SIGAIDA_PROFILING)"""
+    return profiles.report()
+
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str,
+                      format: Literal["html", "speedscope"] = Query("html", description="html flamegraph or speedscope JSON")):
+    """Download one request profile, for a browser (html) or https://www.speedscope.app (speedscope)"""
+    try:
+        content = profiles.render(profile_id, format)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering profile: {str(e)}")
+    if content is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    extension = "html" if format == "html" else "speedscope.json"
+    return Response(content=content, media_type=PROFILE_FORMATS[format],
+                    headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.{extension}"'})
+
+
+@app.delete("/api/admin/profiles", response_model=ProfileListResponse, dependencies=[Depends(require_admin)])
+async def clear_profiles():
+    """Delete the stored request profiles"""
+    profiles.clear()
+    return profiles.report()
+
+
+# Metrics Endpoint
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request, query, serialization and ML latencies and cache hit rates"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -367,7 +1005,8 @@ async def root():
         "message": "SIGAIDA Campus Energy API",
         "version": "1.0.0",
         "docs": "/api/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "ready": "/api/ready"
     }
 
 
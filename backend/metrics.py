@@ -0,0 +1,206 @@
+"""
+Prometheus metrics for the API
+
+Histograms live in process memory and /metrics renders them in the Prometheus text
+format. Observing one value is a bisect and two additions under an uncontended lock;
+nothing is computed until a scrape.
+
+    http_request_duration_seconds{method,route,status}  whole request, by route template
+    http_response_serialize_seconds{route}              endpoint return -> response start
+                                                        (response validation and JSON encoding)
+    db_query_duration_seconds{query}                    execute_query, by DatabaseManager method
+    db_query_rows{query}                                rows returned
+    ml_duration_seconds{model,operation}                model training and inference
+    singleflight_calls_total{call,role}                 coalesced calls: leader ran it, follower
+                                                        shared a run already in flight
+    cache_hits_total / cache_misses_total / cache_entries{cache}   LRUCache stats at scrape time
+    cache_bytes{cache}                                  bytes charged to byte-bounded caches
+"""
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# Set by MetricsMiddleware for the duration of one request
+_request_marks: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_marks", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label combination"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """Observe the duration of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, counts, total in sorted(series):
+            labels = "".join(f'{k}="{_escape(v)}",' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{_format(bound)}"}} {cumulative}')
+            labels = labels.rstrip(",")
+            lines.append(f"{self.name}_sum{{{labels}}} {total!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per label combination"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._series: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str) -> None:
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, count in series:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {count}")
+        return lines
+
+
+request_seconds = Histogram("http_request_duration_seconds", "Request latency", ("method", "route", "status"))
+serialize_seconds = Histogram("http_response_serialize_seconds",
+                              "Time from the endpoint returning to the response starting", ("route",))
+query_seconds = Histogram("db_query_duration_seconds", "SQLite query time", ("query",))
+query_rows = Histogram("db_query_rows", "Rows returned per query", ("query",), ROW_BUCKETS)
+ml_seconds = Histogram("ml_duration_seconds", "Model training and inference time", ("model", "operation"))
+singleflight_calls = Counter("singleflight_calls_total",
+                             "Coalesced calls, by whether they ran the computation or shared one in flight",
+                             ("call", "role"))
+METRICS = (request_seconds, serialize_seconds, query_seconds, query_rows, ml_seconds, singleflight_calls)
+
+_caches: Dict[str, object] = {}
+
+
+def register_cache(name: str, cache) -> None:
+    """Report an LRUCache's hits, misses and size on /metrics"""
+    _caches[name] = cache
+
+
+def observe_query(name: str, seconds: float, rows: int) -> None:
+    query_seconds.observe(seconds, name)
+    query_rows.observe(rows, name)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for metric, kind, attribute in (("cache_hits_total", "counter", "hits"),
+                                    ("cache_misses_total", "counter", "misses"),
+                                    ("cache_entries", "gauge", None),
+                                    ("cache_bytes", "gauge", "bytes")):
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, cache in sorted(_caches.items()):
+            value = len(cache) if attribute is None else getattr(cache, attribute)
+            lines.append(f'{metric}{{cache="{_escape(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that marks when its endpoint returns, so the middleware can split off serialization"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = self._marking(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _marking(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                marks = _request_marks.get()
+                if marks is not None:
+                    marks["returned"] = time.perf_counter()
+        return wrapper
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app, exclude: Iterable[str] = ()):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        marks = {"start": time.perf_counter()}
+        token = _request_marks.set(marks)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                marks["response"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_marks.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            if path not in self.exclude:
+                request_seconds.observe(time.perf_counter() - marks["start"], scope["method"], path, str(status[0]))
+                if "returned" in marks and "response" in marks:
+                    serialize_seconds.observe(marks["response"] - marks["returned"], path)
@@ -0,0 +1,137 @@
+"""
+Shared, memory-mapped random forest artifacts
+
+scikit-learn copies every tree's node arrays into its own memory when a forest is
+unpickled, so loading a RandomForestRegressor with joblib's mmap_mode still gives each
+uvicorn worker a private copy. Here a fitted forest is flattened into plain arrays
+(all trees' nodes concatenated) that joblib can memory-map read-only: every worker maps
+the same file and the tree data lives once in the page cache.
+
+FlatForest.predict walks all trees for all rows at once, one level per step, and returns
+exactly what RandomForestRegressor.predict returns (rows are compared as float32, as
+scikit-learn does).
+
+The artifact stores a digest of the training data and parameters. A worker that finds
+an artifact with a matching digest maps it instead of training; otherwise the first
+worker trains and saves it under a file lock while the others wait and then map it.
+"""
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import joblib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, concurrent workers may each train once
+    fcntl = None
+
+def flatten(model) -> Dict[str, np.ndarray]:
+    """A fitted RandomForestRegressor as concatenated node arrays; leaves point at themselves"""
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        children.append(np.stack([np.where(leaf, nodes, tree.children_left),
+                                  np.where(leaf, nodes, tree.children_right)], axis=1) + offset)
+        values.append(tree.value[:, :, 0])
+        roots.append(offset)
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+    return {
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds),
+        "children": np.concatenate(children).astype(np.int32),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+        "depth": depth,
+    }
+
+
+class FlatForest:
+    """Random forest regressor over flat (possibly memory-mapped) node arrays"""
+
+    def __init__(self, arrays: Dict[str, Any], meta: Optional[Dict[str, Any]] = None):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.depth = int(arrays["depth"])
+        self.meta = meta or {}
+
+    def predict(self, X) -> np.ndarray:
+        """(rows, outputs) mean of the trees' leaf values"""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            go_right = X[rows, self.feature[node]] > self.threshold[node]
+            node = self.children[node, go_right.astype(np.intp)]
+        return self.value[node].mean(axis=1)
+
+
+def digest(X: np.ndarray, y: np.ndarray, params: Dict[str, Any]) -> str:
+    """Identity of a training run: its data and parameters"""
+    h = hashlib.sha256(repr(sorted(params.items())).encode())
+    for array in (X, y):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        h.update(repr(array.shape).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()[:16]
+
+
+def save(path: str, arrays: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    """Write the artifact atomically, so a worker never maps a half-written file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump({"meta": meta, "arrays": arrays}, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def load(path: str) -> Optional[FlatForest]:
+    """Map an artifact read-only; None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    artifact = joblib.load(path, mmap_mode="r")
+    return FlatForest(artifact["arrays"], artifact["meta"])
+
+
+@contextmanager
+def _locked(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_or_train(path: str, key: str, train: Callable[[], Any]) -> FlatForest:
+    """The artifact at path if it was trained on key, else train(), save and map it"""
+    forest = load(path)
+    if forest is not None and forest.meta.get("digest") == key:
+        return forest
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _locked(path):
+        # Another worker may have written it while we waited for the lock
+        forest = load(path)
+        if forest is not None and forest.meta.get("digest") == key:
+            return forest
+        save(path, flatten(train()), {"digest": key})
+    return load(path)
@@ -4,6 +4,7 @@ Implements actual ML models for air quality forecasting, energy prediction, and
 """
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+import os
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor, IsolationForest
@@ -13,7 +14,14 @@ from pathlib import Path
 
 # Add parent directory to path for database imports
 sys.path.append(str(Path(__file__).parent.parent))
-from database import db
+from database import LOCAL_TZ, db
+from metrics import ml_seconds
+from ml import forest
+
+# Shared forecaster artifact, memory-mapped by every worker (see ml/forest.py); set
+# SIGAIDA_MODEL_PATH to an empty string to train a private model in each process instead
+MODEL_PATH = os.getenv("SIGAIDA_MODEL_PATH", str(Path(__file__).parent / "artifacts" / "air_quality_forest.joblib"))
+FOREST_PARAMS = {"n_estimators": 100, "max_depth": 10, "random_state": 42}
 
 
 class MLPredictor:
@@ -66,13 +74,8 @@ class MLPredictor:
             X = df_clean[feature_cols].values
             y = df_clean[target_cols].values
 
-            # Train Random Forest model for air quality
-            self.air_quality_model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
-            )
-            self.air_quality_model.fit(X, y)
+            # Random Forest model for air quality, trained or mapped from the shared artifact
+            self.air_quality_model = self._air_quality_forest(X, y)
 
             # Train Isolation Forest for anomaly detection
             anomaly_features = df[['pm2_5', 'pm10', 'us_aqi', 'ozone']].dropna()
@@ -81,7 +84,8 @@ class MLPredictor:
                     contamination=0.1,
                     random_state=42
                 )
-                self.anomaly_detector.fit(anomaly_features.values)
+                with ml_seconds.time("isolation_forest", "fit"):
+                    self.anomaly_detector.fit(anomaly_features.values)
 
             self.models_trained = True
             print(f"Models trained successfully with {len(df_clean)} samples")
@@ -91,6 +95,20 @@ class MLPredictor:
             self.models_trained = False
 
 
+    @staticmethod
+    def _air_quality_forest(X: np.ndarray, y: np.ndarray):
+        """A RandomForestRegressor, or with MODEL_PATH set a FlatForest mapped from the artifact
+        trained on exactly this data (training and saving it first if there is none)"""
+        def train():
+            model = RandomForestRegressor(**FOREST_PARAMS)
+            with ml_seconds.time("random_forest", "fit"):
+                model.fit(X, y)
+            return model
+
+        if not MODEL_PATH:
+            return train()
+        return forest.load_or_train(MODEL_PATH, forest.digest(X, y, FOREST_PARAMS), train)
+
     def predict_air_quality(self, days: int = 7) -> List[Dict[str, Any]]:
         """
         Predict air quality for the next N days using trained ML model
@@ -109,23 +127,14 @@ class MLPredictor:
             return self._mock_air_quality_predictions(days)
 
         try:
-            # Generate predictions for each day
-            for day in range(days):
-                forecast_date = base_date + timedelta(days=day)
+            # One row per hour of every forecast day, predicted in a single call
+            dates = [base_date + timedelta(days=day) for day in range(days)]
+            features = np.array([[hour, date.weekday(), date.month] for date in dates for hour in range(24)])
+            with ml_seconds.time("random_forest", "predict"):
+                hourly = self.air_quality_model.predict(features)
 
+            for forecast_date, daily_predictions in zip(dates, hourly.reshape(days, 24, -1)):
                 # Average predictions across hours of the day
-                daily_predictions = []
-                for hour in range(24):
-                    features = np.array([[
-                        hour,
-                        forecast_date.weekday(),
-                        forecast_date.month
-                    ]])
-
-                    pred = self.air_quality_model.predict(features)[0]
-                    daily_predictions.append(pred)
-
-                # Average predictions for the day
                 avg_pred = np.mean(daily_predictions, axis=0)
 
                 predictions.append({
@@ -277,35 +286,35 @@ class MLPredictor:
                 training_data = df.iloc[48:]  # Skip first 48 (most recent)
                 recent = df.head(48)  # Test on most recent 48 hours
 
-                # Train anomaly detector on historical data (not recent)
-                if self.anomaly_detector is None or True:  # Retrain each time for fresh detection
-                    training_features = training_data[['pm2_5', 'pm10', 'us_aqi', 'ozone']].dropna()
-                    if len(training_features) >= 50:
-                        # Use contamination=0.05 (expect 5% anomalies, more sensitive)
-                        self.anomaly_detector = IsolationForest(
-                            contamination=0.05,
-                            random_state=42,
-                            n_estimators=100
-                        )
-                        self.anomaly_detector.fit(training_features.values)
+                # Train anomaly detector on historical data (not recent), retrained each time
+                # for fresh detection. Fitted locally: concurrent calls (see singleflight.py,
+                # live.py) run in different threads and must not swap it under each other.
+                detector = self.anomaly_detector
+                training_features = training_data[['pm2_5', 'pm10', 'us_aqi', 'ozone']].dropna()
+                if len(training_features) >= 50:
+                    # Use contamination=0.05 (expect 5% anomalies, more sensitive)
+                    detector = IsolationForest(
+                        contamination=0.05,
+                        random_state=42,
+                        n_estimators=100
+                    )
+                    with ml_seconds.time("isolation_forest", "fit"):
+                        detector.fit(training_features.values)
+                    self.anomaly_detector = detector
 
                 # Detect anomalies in recent data (last 48 hours)
                 features = recent[['pm2_5', 'pm10', 'us_aqi', 'ozone']].dropna()
 
-                if len(features) == 0 or self.anomaly_detector is None:
+                if len(features) == 0 or detector is None:
                     return self._empty_anomaly_result(data_type)
 
-                predictions = self.anomaly_detector.predict(features.values)
-                scores = self.anomaly_detector.score_samples(features.values)
+                with ml_seconds.time("isolation_forest", "predict"):
+                    predictions = detector.predict(features.values)
+                    scores = detector.score_samples(features.values)
 
-                # Calculate expected ranges from training data
+                # Calculate expected ranges over the training period
                 training_features = training_data[['pm2_5', 'pm10', 'us_aqi', 'ozone']].dropna()
-                expected_ranges = {
-                    'pm2_5': [training_features['pm2_5'].quantile(0.05), training_features['pm2_5'].quantile(0.95)],
-                    'pm10': [training_features['pm10'].quantile(0.05), training_features['pm10'].quantile(0.95)],
-                    'us_aqi': [training_features['us_aqi'].quantile(0.05), training_features['us_aqi'].quantile(0.95)],
-                    'ozone': [training_features['ozone'].quantile(0.05), training_features['ozone'].quantile(0.95)]
-                }
+                expected_ranges = self._expected_ranges(training_data, training_features)
 
                 # Find anomalies (prediction = -1)
                 anomalies = []
@@ -377,6 +386,25 @@ class MLPredictor:
 
         return self._empty_anomaly_result(data_type)
 
+    def _expected_ranges(self, training_data: pd.DataFrame, training_features: pd.DataFrame) -> Dict[str, List[float]]:
+        """
+        5th-95th percentile range of each metric over the training period's days, read from
+        the quantile sketches; computed from the training rows when sketches are unavailable
+        """
+        times = pd.to_datetime(training_data['time'], utc=True).dt.tz_convert(LOCAL_TZ)
+        start, end = times.min().strftime('%Y-%m-%d'), times.max().strftime('%Y-%m-%d')
+        ranges = {}
+        for metric in training_features.columns:
+            try:
+                result = db.get_percentiles(metric, [0.05, 0.95], start, end)
+            except Exception:
+                result = None
+            if result is not None:
+                ranges[metric] = result["values"]
+            else:
+                ranges[metric] = [training_features[metric].quantile(0.05), training_features[metric].quantile(0.95)]
+        return ranges
+
     def _empty_anomaly_result(self, data_type: str) -> Dict[str, Any]:
         """Return empty anomaly result"""
         return {
@@ -402,6 +430,7 @@ class MLPredictor:
                 "air_quality_forecaster": {
                     "loaded": self.air_quality_model is not None,
                     "type": "Random Forest Regression",
+                    "artifact": MODEL_PATH if isinstance(self.air_quality_model, forest.FlatForest) else None,
                     "status": "Active" if self.air_quality_model is not None else "Not trained",
                     "features": ["hour", "day_of_week", "month"],
                     "targets": ["PM2.5", "PM10", "AQI", "CO2"]
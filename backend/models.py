@@ -1,8 +1,8 @@
 """
 Pydantic models for API request/response validation
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Dict, Any
 from datetime import datetime
 
 
@@ -55,6 +55,45 @@ class OpenAQResponse(BaseModel):
     sensor_id: str = "8706090"
 
 
+class RollupPoint(BaseModel):
+    """One day/week/month rollup bucket"""
+    time: str
+    n: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    std: Optional[float] = None
+
+
+class RollupResponse(BaseModel):
+    """Rollup series for one metric"""
+    data: List[RollupPoint]
+    count: int
+    source: str
+    metric: str
+    period: str
+
+
+class PercentileValue(BaseModel):
+    """Estimated value at one quantile"""
+    q: float
+    value: float
+
+
+class PercentileResponse(BaseModel):
+    """Percentiles of a metric over a date range, read from the quantile sketches"""
+    data: List[PercentileValue]
+    metric: str
+    source: str
+    count: int
+    min: float
+    max: float
+    relative_accuracy: float = Field(..., description="Bound on the relative error of every estimate")
+    sketches_merged: int
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
 # Weather Models
 
 class WeatherData(BaseModel):
@@ -89,6 +128,35 @@ class WeatherForecastData(BaseModel):
     wind_direction_10m: Optional[float] = None
 
 
+class ClimatologyPoint(BaseModel):
+    """Day-of-year normals and records for one variable, with the observed value"""
+    time: str
+    variable: str
+    doy: int
+    n: Optional[int] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    p10: Optional[float] = None
+    p25: Optional[float] = None
+    p50: Optional[float] = None
+    p75: Optional[float] = None
+    p90: Optional[float] = None
+    record_high: Optional[float] = None
+    record_high_year: Optional[int] = None
+    record_low: Optional[float] = None
+    record_low_year: Optional[int] = None
+    observed: Optional[float] = None
+    anomaly: Optional[float] = Field(None, description="Observed minus the normal mean")
+
+
+class ClimatologyResponse(BaseModel):
+    """Weather climatology response"""
+    data: List[ClimatologyPoint]
+    count: int
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+
 class HistoricalWeatherResponse(BaseModel):
     """Historical weather data response"""
     data: List[WeatherData]
@@ -137,6 +205,53 @@ class NDVITimeSeriesResponse(BaseModel):
     location: Dict[str, float]
 
 
+class GeoPoint(BaseModel):
+    """A WGS84 location"""
+    lat: float = Field(..., ge=-85, le=85)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class NDVIBatchRequest(BaseModel):
+    """Points and/or a polygon whose grid cells' NDVI series are wanted"""
+    points: List[GeoPoint] = Field(default_factory=list, max_length=1000)
+    polygon: Optional[List[List[float]]] = Field(
+        None, min_length=3, max_length=1000,
+        description="Polygon ring as [lon, lat] pairs (GeoJSON order); selects the cells whose center is inside")
+
+    @field_validator("polygon")
+    @classmethod
+    def check_ring(cls, ring: Optional[List[List[float]]]) -> Optional[List[List[float]]]:
+        if ring is None:
+            return ring
+        for i, vertex in enumerate(ring):
+            if len(vertex) != 2:
+                raise ValueError(f"polygon vertex {i} must be a [lon, lat] pair, got {len(vertex)} numbers")
+            lon, lat = vertex
+            if not (-180 <= lon <= 180 and -85 <= lat <= 85):
+                raise ValueError(f"polygon vertex {i} [{lon}, {lat}] is not a valid [lon, lat] pair")
+        # A closed ring repeats its first vertex at the end
+        distinct = len(ring) - 1 if ring[0] == ring[-1] else len(ring)
+        if distinct < 3:
+            raise ValueError("polygon needs at least 3 distinct vertices")
+        return ring
+
+
+class NDVICellSeries(BaseModel):
+    """Monthly NDVI of one grid cell, aligned with the response's months"""
+    cell_id: int
+    lat: float
+    lon: float
+    ndvi: List[Optional[float]]
+
+
+class NDVIBatchTimeSeriesResponse(BaseModel):
+    """NDVI time series of many cells on one shared month axis"""
+    months: List[str]
+    cells: List[NDVICellSeries]
+    count: int
+    point_cells: List[Optional[int]] = Field(..., description="Cell id of each requested point, null if it has no data")
+
+
 class NDVIStatistics(BaseModel):
     """NDVI statistics"""
     mean_ndvi: float
@@ -166,6 +281,93 @@ class NDVIMonthlyAverageResponse(BaseModel):
     count: int
 
 
+class NDVIRasterBounds(BaseModel):
+    """Outer edges of a raster in degrees (EPSG:4326)"""
+    west: float
+    south: float
+    east: float
+    north: float
+
+
+class NDVIRasterInfo(BaseModel):
+    """Shape and georeference of one monthly NDVI raster"""
+    year: int
+    month: int
+    width: int
+    height: int
+    origin_x: float = Field(..., description="EPSG:3857 x of the top-left corner (m)")
+    origin_y: float = Field(..., description="EPSG:3857 y of the top-left corner (m)")
+    cell_size: float = Field(..., description="Cell size (m)")
+    valid_cells: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    digest: str
+    bounds: NDVIRasterBounds
+
+
+class NDVIRastersResponse(BaseModel):
+    """Available monthly NDVI rasters"""
+    data: List[NDVIRasterInfo]
+    count: int
+
+
+class NDVIChangeCell(BaseModel):
+    """NDVI change of one grid cell between two periods"""
+    cell_id: int
+    lat: float
+    lon: float
+    before: Optional[float] = Field(None, description="Mean NDVI over the first period")
+    after: Optional[float] = Field(None, description="Mean NDVI over the second period")
+    delta: float
+    p_value: Optional[float] = Field(None, description="Welch's t-test; null unless both periods have 2+ months")
+    significant: Optional[bool] = None
+
+
+class NDVIChangeSummary(BaseModel):
+    """Grid-wide summary of a change or trend"""
+    cells: int
+    mean_delta: Optional[float] = None
+    mean_slope: Optional[float] = None
+    significant_increase: int
+    significant_decrease: int
+    before_months: Optional[int] = None
+    after_months: Optional[int] = None
+    months: Optional[int] = None
+
+
+class NDVIChangeResponse(BaseModel):
+    """Per-cell NDVI change between two periods"""
+    data: List[NDVIChangeCell]
+    count: int
+    summary: NDVIChangeSummary
+    before: Dict[str, str]
+    after: Dict[str, str]
+    grid_version: str
+
+
+class NDVITrendCell(BaseModel):
+    """Linear NDVI trend of one grid cell"""
+    cell_id: int
+    lat: float
+    lon: float
+    slope: float = Field(..., description="NDVI change per year")
+    n: int
+    p_value: Optional[float] = None
+    significant: Optional[bool] = None
+
+
+class NDVITrendResponse(BaseModel):
+    """Per-cell linear NDVI trends"""
+    data: List[NDVITrendCell]
+    count: int
+    summary: NDVIChangeSummary
+    start_month: Optional[str] = None
+    end_month: Optional[str] = None
+    months_of_year: List[int]
+    grid_version: str
+
+
 # Transit Models
 
 class TransitStop(BaseModel):
@@ -176,6 +378,44 @@ class TransitStop(BaseModel):
     stop_lon: float
 
 
+class NearbyStop(TransitStop):
+    """Transit stop with its distance from the query point"""
+    distance_m: Optional[float] = Field(None, description="Great-circle distance (m)")
+
+
+class NearbyStopsResponse(BaseModel):
+    """Stops found around one point or inside a box"""
+    data: List[NearbyStop]
+    count: int
+    query: Dict[str, float]
+
+
+class StopQueryPoint(BaseModel):
+    """Query location for the batch stop searches"""
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class NearestStopsBatchRequest(BaseModel):
+    """k nearest stops for many points"""
+    points: List[StopQueryPoint] = Field(..., min_length=1, max_length=1000)
+    k: int = Field(5, ge=1, le=100)
+    max_distance_m: float = Field(5000, gt=0, le=50000)
+
+
+class StopsWithinBatchRequest(BaseModel):
+    """Stops within a radius of many points"""
+    points: List[StopQueryPoint] = Field(..., min_length=1, max_length=1000)
+    radius_m: float = Field(500, gt=0, le=50000)
+    limit: int = Field(100, ge=1, le=1000)
+
+
+class NearbyStopsBatchResponse(BaseModel):
+    """One stop list per query point, in request order"""
+    results: List[List[NearbyStop]]
+    count: int
+
+
 class TransitRoute(BaseModel):
     """Transit route information"""
     route_id: str
@@ -212,3 +452,124 @@ class HealthResponse(BaseModel):
     timestamp: str
     database_connected: bool
     version: str = "1.0.0"
+
+
+class SubsystemStatus(BaseModel):
+    """Warm state of one subsystem"""
+    ready: bool
+    seconds: Optional[float] = Field(None, description="Time its warmup took")
+    detail: Optional[str] = None
+    error: Optional[str] = Field(None, description="Error of the last attempt; failed warmups are retried with backoff")
+    attempts: int = 0
+
+
+class ReadyResponse(BaseModel):
+    """Readiness check response"""
+    ready: bool
+    uptime_seconds: float
+    subsystems: Dict[str, SubsystemStatus] = Field(..., description="database, caches and models")
+
+
+# Analytics Models
+
+class LaggedCorrelation(BaseModel):
+    """Cross-correlation of an air quality variable with a weather variable over a range of lags"""
+    x: str
+    y: str
+    lags: List[int] = Field(..., description="Days; positive means the weather variable leads")
+    r: List[Optional[float]]
+    n: List[int]
+    best_lag: Optional[int] = None
+    best_r: Optional[float] = None
+
+
+class CorrelationResponse(BaseModel):
+    """Correlation analytics on daily values"""
+    variables: List[str]
+    method: str
+    matrix: List[List[Optional[float]]]
+    n: List[List[int]] = Field(..., description="Days with both variables present, per pair")
+    lagged: List[LaggedCorrelation]
+    start_date: str
+    end_date: str
+    days: int
+    data_version: str
+
+
+# Batch Models
+
+# Sub-requests run one after another, so this bounds how long one batch holds a worker thread
+MAX_BATCH_REQUESTS = 50
+
+
+class BatchSubRequest(BaseModel):
+    """One API call inside a batch"""
+    id: Optional[str] = Field(None, description="Echoed back in the result; defaults to the item's index")
+    method: Literal["GET", "POST"] = "GET"
+    path: str = Field(..., description="API path with query string, e.g. /api/weather/historical?limit=30")
+    body: Optional[Any] = Field(None, description="JSON body for POST endpoints")
+
+
+class BatchRequest(BaseModel):
+    """API calls to run together against one database snapshot"""
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=MAX_BATCH_REQUESTS)
+
+
+class BatchResult(BaseModel):
+    """Outcome of one sub-request"""
+    id: str
+    status: int
+    duration_ms: float
+    content_type: Optional[str] = None
+    body: Optional[Any] = Field(None, description="The endpoint's JSON response; null for non-JSON responses")
+
+
+class BatchResponse(BaseModel):
+    """Results in request order"""
+    results: List[BatchResult]
+    count: int
+    duration_ms: float
+
+
+# Admin Models
+
+class SlowQueryRecord(BaseModel):
+    """One captured slow query"""
+    time: str
+    query: str = Field(..., description="DatabaseManager method that ran it")
+    sql: str
+    params: List[Any]
+    duration_ms: float
+    rows: int
+    plan: List[str] = Field(..., description="EXPLAIN QUERY PLAN, indented by depth")
+
+
+class SlowQueryLogResponse(BaseModel):
+    """Slow-query log settings, counters and the newest records first"""
+    threshold_ms: float
+    sample_rate: float
+    per_minute: int
+    seen: int = Field(..., description="Slow queries since the last clear")
+    captured: int
+    skipped: int = Field(..., description="Slow queries left out by sampling or the rate limit")
+    records: List[SlowQueryRecord]
+
+
+class ProfileRecord(BaseModel):
+    """One profiled request; download it from /api/admin/profiles/{id}"""
+    id: str
+    time: str
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    samples: int = Field(..., description="Stack samples taken by the profiler")
+    trigger: Literal["header", "sample"]
+
+
+class ProfileListResponse(BaseModel):
+    """Request profiling settings and the stored profiles, newest first"""
+    enabled: bool = Field(..., description="SIGAIDA_PROFILING is set and pyinstrument is installed")
+    sample_rate: float
+    per_minute: int
+    profiles: List[ProfileRecord]
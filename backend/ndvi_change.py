@@ -0,0 +1,78 @@
+"""
+Vectorized NDVI change detection over the monthly rasters
+
+The rasters in ndvi_rasters share one extent (see data_collection/ndvi_raster.py), so
+a (months, height, width) stack of them is aligned cell for cell. Everything here works
+on whole stacks at once; NaN marks cells without a value in a month.
+
+- compare: per-cell mean of two periods, their difference and a Welch t-test
+- trend:   per-cell least-squares slope (NDVI per year) and its t-test
+"""
+from typing import Dict, List, Tuple
+import warnings
+
+import numpy as np
+
+
+def month_index(months: List[Tuple[int, int]]) -> np.ndarray:
+    """(year, month) pairs -> consecutive month numbers (year * 12 + month - 1)"""
+    return np.array([year * 12 + month - 1 for year, month in months], dtype=np.int64)
+
+
+def _period_stats(stack: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-cell count, mean and sample variance over the first axis, ignoring NaN"""
+    n = np.sum(~np.isnan(stack), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(stack, axis=0)
+        var = np.nanvar(stack, axis=0, ddof=1)
+    return n, mean, var
+
+
+def _two_sided_p(t: np.ndarray, df: np.ndarray) -> np.ndarray:
+    """Two-sided Student t p-values; NaN where df < 1 or t is undefined"""
+    from scipy.special import stdtr   # imported on first use, off the startup path
+    with np.errstate(invalid="ignore"):
+        p = 2 * stdtr(df, -np.abs(t))
+    return np.where(df >= 1, p, np.nan)
+
+
+def compare(before: np.ndarray, after: np.ndarray, alpha: float = 0.05) -> Dict[str, np.ndarray]:
+    """
+    Per-cell change between two stacks of months. p_value (Welch's t-test) is NaN where
+    either period has fewer than two values, so single-month comparisons get no mask.
+    """
+    n1, m1, v1 = _period_stats(before)
+    n2, m2, v2 = _period_stats(after)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s1, s2 = v1 / n1, v2 / n2
+        t = (m2 - m1) / np.sqrt(s1 + s2)
+        # Welch-Satterthwaite degrees of freedom
+        df = (s1 + s2) ** 2 / (s1 ** 2 / (n1 - 1) + s2 ** 2 / (n2 - 1))
+    df = np.where((n1 >= 2) & (n2 >= 2), df, np.nan)
+    p = _two_sided_p(t, df)
+    return {"before": m1, "after": m2, "delta": m2 - m1, "p_value": p, "significant": p < alpha}
+
+
+def trend(stack: np.ndarray, t_years: np.ndarray, alpha: float = 0.05) -> Dict[str, np.ndarray]:
+    """
+    Per-cell ordinary least-squares fit of NDVI against time in years. Cells with fewer
+    than three values get a NaN p_value.
+    """
+    valid = ~np.isnan(stack)
+    t = np.where(valid, t_years[:, None, None], 0.0)
+    y = np.where(valid, stack, 0.0)
+    n = valid.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_mean = t.sum(axis=0) / n
+        y_mean = y.sum(axis=0) / n
+        dt = np.where(valid, t - t_mean, 0.0)
+        dy = np.where(valid, y - y_mean, 0.0)
+        sxx = (dt * dt).sum(axis=0)
+        sxy = (dt * dy).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+        slope = sxy / sxx
+        residual = np.maximum(syy - slope * sxy, 0.0) / (n - 2)
+        t_stat = slope / np.sqrt(residual / sxx)
+    p = _two_sided_p(t_stat, np.where(n >= 3, n - 2, np.nan))
+    return {"slope": slope, "n": n, "p_value": p, "significant": p < alpha}
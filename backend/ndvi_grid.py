@@ -0,0 +1,94 @@
+"""
+Geometry of the NDVI grid: 100 m cells on EPSG:3857, as exported by
+data_collection/vegetation_data.py
+
+cell_id = row * CELL_STRIDE + col, where row/col are the cell's integer EPSG:3857
+indices shifted by CELL_OFFSET. This is the only definition of the grid:
+data_collection/ndvi_raster.py imports it from here (the backend image does not
+contain data_collection/).
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+CELL_SIZE_M = 100
+CELL_OFFSET = 500_000     # keeps row/col indices positive
+CELL_STRIDE = 1_000_000   # > number of 100 m columns around the globe
+EARTH_RADIUS_M = 6378137.0
+
+# Upper bound on the cells a polygon may cover (~100 km^2)
+MAX_POLYGON_CELLS = 10_000
+
+
+def to_mercator(lat, lon):
+    """Vectorized lat/lon (EPSG:4326) -> EPSG:3857 x, y meters"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = EARTH_RADIUS_M * np.radians(lon)
+    y = EARTH_RADIUS_M * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def from_mercator(x, y):
+    """Vectorized EPSG:3857 x, y meters -> lon, lat (EPSG:4326)"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return np.degrees(x / EARTH_RADIUS_M), np.degrees(2 * np.arctan(np.exp(y / EARTH_RADIUS_M)) - np.pi / 2)
+
+
+def cell_ids(lat, lon) -> np.ndarray:
+    """Vectorized lat/lon -> id of the enclosing cell"""
+    x, y = to_mercator(lat, lon)
+    col = np.floor(x / CELL_SIZE_M).astype(np.int64) + CELL_OFFSET
+    row = np.floor(y / CELL_SIZE_M).astype(np.int64) + CELL_OFFSET
+    return row * CELL_STRIDE + col
+
+
+def cell_centers(ids) -> Dict[str, np.ndarray]:
+    """Vectorized cell id -> center lat/lon"""
+    rows, cols = np.divmod(np.asarray(ids, dtype=np.int64), CELL_STRIDE)
+    lon, lat = from_mercator((cols - CELL_OFFSET + 0.5) * CELL_SIZE_M, (rows - CELL_OFFSET + 0.5) * CELL_SIZE_M)
+    return {"lon": lon, "lat": lat}
+
+
+def cell_grid(width: int, height: int, origin_x: float, origin_y: float, cell_size: float) -> Dict[str, np.ndarray]:
+    """cell_id and center lat/lon of every cell of a north-up raster, as flat row-major arrays"""
+    rows, cols = np.divmod(np.arange(width * height), width)
+    cell_row = int(round(origin_y / cell_size)) - 1 - rows + CELL_OFFSET
+    cell_col = int(round(origin_x / cell_size)) + cols + CELL_OFFSET
+    ids = cell_row * CELL_STRIDE + cell_col
+    return {"cell_id": ids, **cell_centers(ids)}
+
+
+def cells_in_polygon(ring: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    Ids of the cells whose center lies inside a polygon ring of [lon, lat] pairs
+    (GeoJSON order; closing the ring is optional). Raises ValueError for huge polygons.
+    """
+    lon, lat = np.asarray(ring, dtype=np.float64).T
+    px, py = to_mercator(lat, lon)
+    col_min, col_max = int(np.floor(px.min() / CELL_SIZE_M)), int(np.floor(px.max() / CELL_SIZE_M))
+    row_min, row_max = int(np.floor(py.min() / CELL_SIZE_M)), int(np.floor(py.max() / CELL_SIZE_M))
+    if (col_max - col_min + 1) * (row_max - row_min + 1) > MAX_POLYGON_CELLS * 4:
+        raise ValueError(f"Polygon covers more than {MAX_POLYGON_CELLS} cells")
+
+    cols, rows = np.meshgrid(np.arange(col_min, col_max + 1), np.arange(row_min, row_max + 1))
+    cx, cy = (cols.ravel() + 0.5) * CELL_SIZE_M, (rows.ravel() + 0.5) * CELL_SIZE_M
+
+    # Even-odd ray casting, vectorized over all candidate centers at once per edge
+    inside = np.zeros(cx.shape, dtype=bool)
+    x0, y0 = px, py
+    x1, y1 = np.roll(px, -1), np.roll(py, -1)
+    for ax, ay, bx, by in zip(x0, y0, x1, y1):
+        if ay == by:
+            continue
+        crosses = (ay > cy) != (by > cy)
+        inside ^= crosses & (cx < ax + (cy - ay) * (bx - ax) / (by - ay))
+
+    if inside.sum() > MAX_POLYGON_CELLS:
+        raise ValueError(f"Polygon covers more than {MAX_POLYGON_CELLS} cells")
+    return (rows.ravel()[inside] + CELL_OFFSET) * CELL_STRIDE + cols.ravel()[inside] + CELL_OFFSET
+
+
+def month_labels(months: List[tuple]) -> List[str]:
+    return [f"{year}-{month:02d}" for year, month in months]
@@ -0,0 +1,163 @@
+"""
+On-demand request profiling
+
+Off by default: unless SIGAIDA_PROFILING=1, ProfilingMiddleware is not even installed
+and pyinstrument is never imported. When enabled, a request is profiled if it
+
+  - carries `X-Profile: 1` together with a valid X-Admin-Token (always profiled), or
+  - is picked by sampling: each request with probability sample_rate, at most
+    per_minute a minute (a token bucket, like the slow-query log).
+
+The profiler is pyinstrument (optional dependency, `pip install pyinstrument`), a
+statistical profiler that follows the request's coroutine across awaits, so handlers in
+main.py, DatabaseManager and MLPredictor show up in one call tree. It samples only the
+event loop thread; work handed to worker threads (coalesced calls, see singleflight.py)
+appears as time awaited. The response carries X-Profile-Id, and profiles are kept in a
+ring buffer for download from /api/admin/profiles as pyinstrument HTML or speedscope JSON.
+
+    SIGAIDA_PROFILING             1 to enable (default 0: no middleware, no overhead)
+    SIGAIDA_PROFILE_SAMPLE        fraction of requests profiled without the header (default 0)
+    SIGAIDA_PROFILE_PER_MINUTE    sampled profiles per minute at most (default 6)
+    SIGAIDA_PROFILE_INTERVAL_MS   profiler sampling interval (default 1)
+    SIGAIDA_PROFILE_BUFFER        profiles kept in memory (default 20)
+"""
+import os
+import random
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+FORMATS = {"html": "text/html", "speedscope": "application/json"}
+
+
+class ProfileStore:
+    """Decides which requests to profile and keeps the newest profiles"""
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.0, per_minute: int = 6,
+                 interval_ms: float = 1.0, size: int = 20):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.per_minute = per_minute
+        self.interval = interval_ms / 1000
+        self.size = size
+        self.profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tokens = float(per_minute)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ProfileStore":
+        enabled = os.getenv("SIGAIDA_PROFILING", "0") == "1"
+        if enabled:
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("SIGAIDA_PROFILING is set but pyinstrument is not installed; profiling disabled")
+                enabled = False
+        return cls(enabled=enabled,
+                   sample_rate=float(os.getenv("SIGAIDA_PROFILE_SAMPLE", "0")),
+                   per_minute=int(os.getenv("SIGAIDA_PROFILE_PER_MINUTE", "6")),
+                   interval_ms=float(os.getenv("SIGAIDA_PROFILE_INTERVAL_MS", "1")),
+                   size=int(os.getenv("SIGAIDA_PROFILE_BUFFER", "20")))
+
+    def trigger(self, headers: Dict[bytes, bytes]) -> Optional[str]:
+        """Why this request should be profiled ("header" or "sample"), or None"""
+        if headers.get(b"x-profile") == b"1":
+            token = os.getenv("SIGAIDA_ADMIN_TOKEN")
+            given = headers.get(b"x-admin-token", b"").decode("latin-1")
+            if token and secrets.compare_digest(given, token):
+                return "header"
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.per_minute, self._tokens + (now - self._refilled) * self.per_minute / 60)
+            self._refilled = now
+            if self._tokens < 1:
+                return None
+            self._tokens -= 1
+        return "sample"
+
+    def add(self, profile_id: str, info: Dict[str, Any], session) -> None:
+        with self._lock:
+            self.profiles[profile_id] = dict(info, id=profile_id, session=session)
+            while len(self.profiles) > self.size:
+                self.profiles.popitem(last=False)
+
+    def report(self) -> Dict[str, Any]:
+        """Settings and the stored profiles' metadata, newest first"""
+        with self._lock:
+            entries = list(reversed(self.profiles.values()))
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "per_minute": self.per_minute,
+            "profiles": [{k: v for k, v in entry.items() if k != "session"} for entry in entries],
+        }
+
+    def render(self, profile_id: str, fmt: str) -> Optional[str]:
+        """One profile as pyinstrument HTML or speedscope JSON; None if it is gone"""
+        with self._lock:
+            entry = self.profiles.get(profile_id)
+        if entry is None:
+            return None
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+        renderer = HTMLRenderer() if fmt == "html" else SpeedscopeRenderer()
+        return renderer.render(entry["session"])
+
+    def clear(self) -> None:
+        with self._lock:
+            self.profiles.clear()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running selected requests under pyinstrument"""
+
+    def __init__(self, app, store: ProfileStore, exclude: Iterable[str] = ()):
+        self.app = app
+        self.store = store
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        trigger = self.store.trigger(dict((k.lower(), v) for k, v in scope["headers"]))
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+        profile_id = uuid.uuid4().hex[:12]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())])
+            await send(message)
+
+        profiler = Profiler(interval=self.store.interval, async_mode="enabled")
+        started = datetime.now(timezone.utc)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop()
+            query = scope["query_string"].decode("latin-1")
+            self.store.add(profile_id, {
+                "time": started.isoformat(timespec="milliseconds"),
+                "method": scope["method"],
+                "path": scope["path"] + (f"?{query}" if query else ""),
+                "status": status[0],
+                "duration_ms": round(session.duration * 1000, 3),
+                "samples": session.sample_count,
+                "trigger": trigger,
+            }, session)
+
+
+profiles = ProfileStore.from_env()
@@ -0,0 +1,45 @@
+"""
+Request coalescing (singleflight)
+
+Expensive calls such as the dashboard summary, anomaly detection (an IsolationForest fit)
+and the ML forecast run in a worker thread, off the event loop. Concurrent calls with the
+same name and arguments share that one run: the first caller (the leader) starts it, and
+callers arriving while it is in flight (followers) await the same future. All of them get
+its result or its exception. Nothing is cached; a call made after the run finished
+starts a new one.
+
+The shared result is the same object for every caller, so callers must not mutate it.
+Counts per call and role are exported as singleflight_calls_total on /metrics.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from metrics import singleflight_calls
+
+
+class Singleflight:
+    """Shares one in-flight run of fn(*args) among concurrent identical calls"""
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+
+    async def do(self, name: str, fn: Callable[..., Any], *args: Hashable) -> Any:
+        key = (name, args)
+        future = self._inflight.get(key)
+        if future is None:
+            singleflight_calls.inc(name, "leader")
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            singleflight_calls.inc(name, "follower")
+        # Shielded: a caller that disconnects does not cancel the run the others await
+        return await asyncio.shield(future)
+
+    def _finished(self, key: Tuple[str, Hashable], future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # retrieved here too, in case every caller went away
+
+
+singleflight = Singleflight()
@@ -0,0 +1,51 @@
+"""
+Reading the DDSketch quantile sketches in aq_sketches (see data_collection/sketches.py)
+
+Sketches merge exactly by adding bin counts, so a percentile over any date range is
+read from the merged month and day sketches covering it. Every estimate is within
+RELATIVE_ACCURACY of the exact value (clamped to the exact min and max).
+"""
+import struct
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+HEADER = struct.Struct("<Idd")
+
+
+def merge(blobs: Iterable[bytes]) -> Optional[Dict[str, object]]:
+    """Merge sketch blobs into {zero, min, max, keys, counts}, or None if there are none"""
+    zero, lo, hi = 0, np.inf, -np.inf
+    all_keys, all_counts = [], []
+    for blob in blobs:
+        z, b_lo, b_hi = HEADER.unpack_from(blob)
+        n = (len(blob) - HEADER.size) // 6
+        zero, lo, hi = zero + z, min(lo, b_lo), max(hi, b_hi)
+        all_keys.append(np.frombuffer(blob, dtype="<i2", count=n, offset=HEADER.size))
+        all_counts.append(np.frombuffer(blob, dtype="<u4", count=n, offset=HEADER.size + 2 * n))
+    if lo == np.inf:
+        return None
+
+    keys = np.concatenate(all_keys).astype(np.int64)
+    counts = np.concatenate(all_counts).astype(np.int64)
+    if len(keys):
+        # Dense histogram over the key range, then drop empty bins
+        offset = keys.min()
+        dense = np.bincount(keys - offset, weights=counts).astype(np.int64)
+        present = np.flatnonzero(dense)
+        keys, counts = present + offset, dense[present]
+    return {"zero": zero, "min": lo, "max": hi, "keys": keys, "counts": counts}
+
+
+def quantiles(merged: Dict[str, object], qs: List[float]) -> List[float]:
+    """Estimated values at quantiles qs (0..1) of a merged sketch"""
+    counts = np.concatenate([[merged["zero"]], merged["counts"]])
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    # The midpoint of bin (GAMMA^(k-1), GAMMA^k] in relative terms; the zero bin holds values <= 0
+    values = np.concatenate([[min(merged["min"], 0.0)], 2 * GAMMA ** merged["keys"] / (GAMMA + 1)])
+    ranks = np.asarray(qs, dtype=np.float64) * (total - 1)
+    estimates = values[np.searchsorted(cumulative, ranks, side="right")]
+    return np.clip(estimates, merged["min"], merged["max"]).tolist()
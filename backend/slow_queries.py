@@ -0,0 +1,131 @@
+"""
+Slow-query log
+
+execute_query hands every query slower than the threshold to slow_log.record, which
+captures its parameters, duration, row count and EXPLAIN QUERY PLAN into a bounded ring
+buffer (GET /api/admin/slow-queries) and, if a log file is configured, appends it there
+as one JSON line.
+
+Under load only a sample is captured: each slow query is kept with probability
+sample_rate, and at most per_minute records are kept per minute (a token bucket); the
+rest are only counted. Plans are cached per SQL text, since a statement's plan only
+changes with the schema.
+
+    SIGAIDA_SLOW_QUERY_MS          threshold in milliseconds (default 100)
+    SIGAIDA_SLOW_QUERY_SAMPLE      fraction of slow queries captured (default 1.0)
+    SIGAIDA_SLOW_QUERY_PER_MINUTE  capture limit (default 60)
+    SIGAIDA_SLOW_QUERY_BUFFER      records kept in memory (default 200)
+    SIGAIDA_SLOW_QUERY_LOG         JSON-lines file to append records to (default: none)
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from cache import LRUCache
+
+MAX_PARAM_CHARS = 200
+
+
+def _param(value: Any) -> Any:
+    """A query parameter as JSON, long values (e.g. json_each id lists) truncated"""
+    if isinstance(value, bytes):
+        value = f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > MAX_PARAM_CHARS:
+        return value[:MAX_PARAM_CHARS] + f"... ({len(value)} chars)"
+    return value
+
+
+def explain(conn, sql: str, params) -> List[str]:
+    """EXPLAIN QUERY PLAN as indented lines, one per plan node"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Bounded, rate-limited record of slow queries and their plans"""
+
+    def __init__(self, threshold_ms: float = 100, sample_rate: float = 1.0, per_minute: int = 60,
+                 size: int = 200, path: Optional[str] = None):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.per_minute = per_minute
+        self.path = path
+        self.records: deque = deque(maxlen=size)
+        self.plans = LRUCache(maxsize=256)
+        self.seen = self.captured = self.skipped = 0
+        self._tokens = float(per_minute)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SlowQueryLog":
+        return cls(threshold_ms=float(os.getenv("SIGAIDA_SLOW_QUERY_MS", "100")),
+                   sample_rate=float(os.getenv("SIGAIDA_SLOW_QUERY_SAMPLE", "1.0")),
+                   per_minute=int(os.getenv("SIGAIDA_SLOW_QUERY_PER_MINUTE", "60")),
+                   size=int(os.getenv("SIGAIDA_SLOW_QUERY_BUFFER", "200")),
+                   path=os.getenv("SIGAIDA_SLOW_QUERY_LOG") or None)
+
+    def _admit(self) -> bool:
+        """Sample, then take a token from the per-minute bucket"""
+        with self._lock:
+            self.seen += 1
+            now = time.monotonic()
+            self._tokens = min(self.per_minute, self._tokens + (now - self._refilled) * self.per_minute / 60)
+            self._refilled = now
+            if random.random() >= self.sample_rate or self._tokens < 1:
+                self.skipped += 1
+                return False
+            self._tokens -= 1
+            self.captured += 1
+            return True
+
+    def record(self, conn, name: str, sql: str, params, seconds: float, rows: int) -> None:
+        """Capture one slow query, if the sample and rate limit let it through"""
+        if not self._admit():
+            return
+        sql = re.sub(r"\s+", " ", sql).strip()
+        try:
+            plan = self.plans.get_or_compute(sql, lambda: explain(conn, sql, params))
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        entry = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "query": name,
+            "sql": sql,
+            "params": [_param(p) for p in params],
+            "duration_ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "plan": plan,
+        }
+        with self._lock:
+            self.records.append(entry)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+
+    def report(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Settings, counters and the newest records first"""
+        with self._lock:
+            records = list(reversed(self.records))[:limit]
+            return {"threshold_ms": self.threshold * 1000, "sample_rate": self.sample_rate,
+                    "per_minute": self.per_minute, "seen": self.seen, "captured": self.captured,
+                    "skipped": self.skipped, "records": records}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self.seen = self.captured = self.skipped = 0
+        self.plans.clear()
+
+
+slow_log = SlowQueryLog.from_env()
@@ -0,0 +1,30 @@
+"""
+Great-circle helpers for the spatial stop queries
+
+transit_stops_rtree (built by data_collection/transit.py) indexes stop coordinates in
+degrees. Queries first cut candidates with a lat/lon box from the R*Tree, then compute
+exact haversine distances for the few stops left.
+"""
+import math
+from typing import Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8  # mean Earth radius
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized great-circle distance in meters"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(south, north, west, east) box in degrees containing every point within radius_m"""
+    dlat = radius_m / METERS_PER_DEGREE
+    # Widen the longitude span by the narrowest parallel inside the box; near the poles use all of it
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+    dlon = 180.0 if cos_lat < 1e-9 else min(radius_m / (METERS_PER_DEGREE * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
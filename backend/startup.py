@@ -0,0 +1,102 @@
+"""
+Startup phases and readiness
+
+Importing main only builds the app: no database is opened and pandas, scikit-learn and
+scipy stay unimported, so a worker starts listening in well under a second. The app's
+lifespan then runs warmup() in a background thread, one subsystem after another:
+
+    database  open the database and read its schema
+    caches    load the NDVI raster stack into ndvi_cache and import scipy for analytics
+    models    import ml.predict, which loads pandas/scikit-learn and trains the models
+
+/api/health answers as soon as the worker listens (liveness); /api/ready answers 503 until
+every subsystem has warmed, so an orchestrator only routes traffic to warm workers. A
+subsystem that fails is reported with its error and retried with exponential backoff
+(RETRY_MIN to RETRY_MAX seconds) until it warms, so a transient failure at boot, such as
+a locked database or a snapshot directory not yet published, only delays readiness.
+Later subsystems wait for earlier ones.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from database import db
+
+SUBSYSTEMS = ("database", "caches", "models")
+RETRY_MIN, RETRY_MAX = 1.0, 60.0
+
+
+def _warm_database() -> str:
+    mode = "immutable snapshot" if db.snapshot_dir is not None else "database"
+    return f"{db.check()} tables in {mode} {db.current_path()}"
+
+
+def _warm_caches() -> str:
+    import scipy.special, scipy.stats  # noqa: F401  (correlation and ndvi_change import these on use)
+    version = db.get_ndvi_grid_version()
+    if version is None:
+        return "no NDVI rasters"
+    stack = db.get_ndvi_stack(version)["stack"]
+    return f"NDVI stack {'x'.join(map(str, stack.shape))}"
+
+
+def _warm_models() -> str:
+    from ml.predict import ml_predictor
+    return "trained" if ml_predictor.models_trained else "not trained (using fallbacks)"
+
+
+WARMERS: Dict[str, Callable[[], str]] = {
+    "database": _warm_database,
+    "caches": _warm_caches,
+    "models": _warm_models,
+}
+
+
+class Readiness:
+    """Warm state of each subsystem, filled in by warmup()"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.status: Dict[str, Dict[str, Any]] = {
+            name: {"ready": False, "seconds": None, "detail": None, "error": None, "attempts": 0}
+            for name in SUBSYSTEMS
+        }
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def warmup(self, subsystems=SUBSYSTEMS) -> None:
+        """Warm each subsystem in order, retrying failures until they succeed or stop() is
+        called; meant to run in a worker thread"""
+        for name in subsystems:
+            delay, attempts = RETRY_MIN, 0
+            while True:
+                attempts += 1
+                start = time.perf_counter()
+                detail, error = None, None
+                try:
+                    detail = WARMERS[name]()
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    print(f"Warmup of {name} failed (attempt {attempts}, retrying in {delay:.0f} s): {error}")
+                with self._lock:
+                    self.status[name] = {"ready": error is None, "seconds": round(time.perf_counter() - start, 3),
+                                         "detail": detail, "error": error, "attempts": attempts}
+                if error is None:
+                    break
+                if self._stopped.wait(delay):
+                    return
+                delay = min(delay * 2, RETRY_MAX)
+
+    def stop(self) -> None:
+        """Abandon pending retries (at shutdown)"""
+        self._stopped.set()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            subsystems = {name: dict(s) for name, s in self.status.items()}
+        return {"ready": all(s["ready"] for s in subsystems.values()),
+                "uptime_seconds": round(time.monotonic() - self.started, 3),
+                "subsystems": subsystems}
+
+
+readiness = Readiness()
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import corr_matrix, lagged_corr
+
+
+def staggered(days=120, columns=4, seed=7):
+    """Correlated columns with different gaps, and ties from rounding"""
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(days, 1))
+    x = np.round(base + rng.normal(scale=0.8, size=(days, columns)), 1)
+    x[5:25, 0] = np.nan
+    x[40:70, 1] = np.nan
+    x[rng.random(days) < 0.2, 2] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_corr_matrix_matches_pandas(method):
+    x = staggered()
+    r, n = corr_matrix(x, method)
+    df = pd.DataFrame(x)
+    np.testing.assert_allclose(r, df.corr(method=method).to_numpy(), atol=1e-12)
+    mask = df.notna().to_numpy().astype(int)
+    np.testing.assert_array_equal(n, mask.T @ mask)
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_lagged_corr_matches_pandas(method):
+    x = staggered()
+    r, n = lagged_corr(x[:, :2], x[:, 2:], max_lag=3, method=method)
+    for a in range(2):
+        for b in range(2):
+            for i, lag in enumerate(range(-3, 4)):
+                expected = pd.Series(x[:, a]).corr(pd.Series(x[:, 2 + b]).shift(lag), method=method)
+                assert r[a, b, i] == pytest.approx(expected, abs=1e-12)
@@ -2,7 +2,14 @@ import sqlite3
 import pandas as pd
 from dotenv import load_dotenv
 import os
-from openaq import OpenAQ
+
+from http_client import fetch
+from rollups import refresh_rollups
+from sketches import refresh_sketches
+from storage import write_openaq
+
+API_URL = "https://api.openaq.org/v3"
+PAGE_LIMIT = 1000  # API maximum; the SDK defaulted to 100 per page
 
 # lat, lon = 40.1164, -88.2434
 # locations = client.locations.list(coordinates=[lat, lon], radius=10000, limit=50)  # gets location id at those coordinates
@@ -11,30 +18,33 @@ from openaq import OpenAQ
 # the only sensor in Urbana-Champaign has ID 8706090
 
 def get_aq(start_date, key, sensor_id = 8706090) -> pd.DataFrame:
-    client = OpenAQ(api_key=key)
-    
+    # Plain REST calls through the shared client: pooled connections, retries on 429/5xx
+    # and one request at a time to api.openaq.org. Measurements are never cached.
     all_results = []
     results = True
     page_num = 1
-    
+
     while results:
         try:
-            response = client.measurements.list(sensor_id,datetime_from=start_date,page=page_num)
+            response = fetch(f"{API_URL}/sensors/{sensor_id}/measurements",
+                             params={"datetime_from": start_date, "page": page_num, "limit": PAGE_LIMIT},
+                             headers={"X-API-Key": key}, cache=False)
+            response.raise_for_status()
         except Exception as e:
             print(e)  # results in http read time out - probably API throttling? Log the error but still save whatever data we got
             break
-        data = response.dict()['results']
+        data = response.json()['results']
         if len(data) == 0:
             results = False
         else:
             all_results.extend(data)
             page_num += 1
 
-    client.close()
-
     df = pd.json_normalize(all_results)  # value
+    if df.empty:
+        return pd.DataFrame(columns=['value', 'parameter_name', 'datetime_utc'])
 
-    df = df[['value', 'parameter.name', 'coverage.datetime_from.utc']]
+    df = df[['value', 'parameter.name', 'coverage.datetimeFrom.utc']]
     df.columns = ['value', 'parameter_name', 'datetime_utc']  # rename columns
 
     return df
@@ -49,6 +59,7 @@ if __name__ == "__main__":
     #client.close()
     # Open (or create) SQLite DB and insert data
     conn = sqlite3.connect("campus_data.db")
-    df.to_sql('historical_aq_openaq', conn, if_exists='append', index=False)  # save to database
-    conn.commit()
+    write_openaq(conn, df)  # upsert into openaq_measurements, so overlapping runs don't duplicate rows
+    refresh_rollups(conn, "openaq")
+    refresh_sketches(conn, "openaq")
     conn.close()
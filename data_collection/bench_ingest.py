@@ -0,0 +1,112 @@
+"""
+Offline ingest benchmark for the data collectors.
+
+Starts a ReplayServer (see replay.py), runs each collector as a subprocess against it
+in a scratch directory, and reports rows written per second, wall time and the peak
+RSS of the collector process.
+
+    python bench_ingest.py
+    python bench_ingest.py --latency-ms 80 --size aq_hours=100000 --only air_quality weather_history
+    python bench_ingest.py --cassettes cassettes/ --json results.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from replay import REPLAY_ENV, ReplayServer, parse_sizes, write_ndvi_csvs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# collector name -> (command args, tables it writes)
+COLLECTORS = {
+    "air_quality": (["historical_and_current_air_quality_data.py"],
+                    ["aq_hourly", "current_air_quality_data"]),
+    "weather_history": (["historical_weather_data.py"], ["weather_daily"]),
+    "weather_forecast": (["weather_forecast.py"], ["weather_forecast"]),
+    "weather_gov": (["weather_gov.py"], ["weather_gov"]),
+    "openaq": (["air_quality_openaq.py"], ["openaq_measurements"]),
+    "transit": (["transit.py"], ["transit_stops", "transit_routes", "transit_trips", "transit_stop_times",
+                                 "transit_shapes", "transit_calendar", "transit_calendar_dates"]),
+    "ndvi": (["push_ndvi_data.py", "sigaida_ndvi_data"], ["vegetation_data"]),
+}
+
+
+def count_rows(db_path, tables):
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        return sum(conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables if t in existing)
+    finally:
+        conn.close()
+
+
+def run_collector(name, replay_url, sizes):
+    """Run one collector in a scratch directory; returns a result dict"""
+    args, tables = COLLECTORS[name]
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        if name == "ndvi":
+            # Earth Engine exports to Drive asynchronously, so the ingest side starts from CSVs
+            write_ndvi_csvs(os.path.join(workdir, "sigaida_ndvi_data"), sizes)
+
+        # Each run gets its own HTTP response cache, so every collector starts cold
+        env = dict(os.environ, **{REPLAY_ENV: replay_url, "OPENAQ_KEY": "0" * 64,
+                                  "SIGAIDA_HTTP_CACHE": os.path.join(workdir, "http_cache.sqlite"),
+                                  "PYTHONPATH": os.pathsep.join(filter(None, [HERE, os.getenv("PYTHONPATH")]))})
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, args[0])] + args[1:], cwd=workdir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # wait4 gives the rusage of exactly this child, including its peak RSS
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        stderr = proc.stderr.read().decode(errors="replace")
+        proc.stderr.close()
+        rows = count_rows(os.path.join(workdir, "campus_data.db"), tables)
+
+    return {
+        "collector": name,
+        "ok": os.waitstatus_to_exitcode(status) == 0,
+        "rows": rows,
+        "wall_s": round(wall, 3),
+        "rows_per_s": round(rows / wall, 1) if wall > 0 else 0.0,
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),   # ru_maxrss is in KiB on Linux
+        "error": stderr.strip().splitlines()[-1] if status and stderr.strip() else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark collector ingest against replayed responses")
+    parser.add_argument("--only", nargs="+", choices=list(COLLECTORS), help="collectors to run (default: all)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added latency per replayed request")
+    parser.add_argument("--size", action="append", metavar="NAME=N", help="synthetic response size override")
+    parser.add_argument("--cassettes", help="replay recorded responses from this directory when available")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per collector; the fastest is reported")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    sizes = parse_sizes(args.size)
+    server = ReplayServer(latency_ms=args.latency_ms, sizes=sizes, cassette_dir=args.cassettes)
+    replay_url = server.start()
+
+    results = []
+    try:
+        for name in args.only or COLLECTORS:
+            runs = [run_collector(name, replay_url, sizes) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r["wall_s"]))
+    finally:
+        server.stop()
+
+    print(f"{'collector':<18}{'rows':>10}{'wall s':>10}{'rows/s':>12}{'peak RSS MB':>14}")
+    for r in results:
+        print(f"{r['collector']:<18}{r['rows']:>10}{r['wall_s']:>10.2f}{r['rows_per_s']:>12.0f}{r['peak_rss_mb']:>14.1f}"
+              + ("" if r["ok"] else f"  FAILED: {r['error']}"))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "sizes": sizes, "results": results}, f, indent=2)
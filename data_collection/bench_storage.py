@@ -0,0 +1,126 @@
+"""
+Compare DB size and query time of the legacy to_sql tables against the typed schema.
+
+Works on a copy of an existing legacy database, or on a synthetic one:
+
+    python bench_storage.py --db campus_data.db
+    python bench_storage.py --synthetic-hours 30000 --synthetic-days 31000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from migrate_storage import migrate
+from storage import AQ_COLUMNS, AQ_EXTRA_COLUMNS, LOCAL_TZ, WEATHER_COLUMNS, WEATHER_EXTRA_COLUMNS
+
+
+def build_synthetic_legacy(path, hours, days):
+    """Legacy-format tables exactly as the collectors' to_sql calls used to create them"""
+    rng = np.random.default_rng(0)
+    conn = sqlite3.connect(path)
+    aq_dates = pd.date_range(end=pd.Timestamp.now(tz="UTC").floor("h"), periods=hours, freq="h").tz_convert(LOCAL_TZ)
+    aq = pd.DataFrame({"date": aq_dates})
+    for column in AQ_COLUMNS + AQ_EXTRA_COLUMNS:
+        aq[column] = rng.gamma(2.0, 5.0, hours).astype(np.float32)
+    aq.to_sql("historical_air_quality_data", conn, index=False)
+
+    weather_dates = pd.date_range(end=pd.Timestamp.now(tz=LOCAL_TZ).normalize(), periods=days, freq="D")
+    weather = pd.DataFrame({"date": weather_dates})
+    for column in WEATHER_COLUMNS + WEATHER_EXTRA_COLUMNS:
+        weather[column] = rng.normal(50, 20, days).astype(np.float32)
+    weather.to_sql("historical_weather_data", conn, index=False)
+    conn.close()
+
+
+def _bounds(conn, legacy):
+    """Last 30 days / 1 year of AQ and last 10 years of weather, as keys of either layout"""
+    if not legacy:
+        aq_end = conn.execute("SELECT max(ts) FROM aq_hourly").fetchone()[0]
+        w_end = conn.execute("SELECT max(ts) FROM weather_daily").fetchone()[0]
+        return {"aq": (aq_end - 30 * 86400, aq_end), "aq_year": (aq_end - 365 * 86400, aq_end),
+                "weather": (w_end - 3652 * 86400, w_end)}
+
+    # Legacy keys are '2025-01-01 00:00:00-06:00' strings, compared as text
+    aq_end = pd.Timestamp(conn.execute("SELECT max(date) FROM historical_air_quality_data").fetchone()[0])
+    w_end = pd.Timestamp(conn.execute("SELECT max(date) FROM historical_weather_data").fetchone()[0])
+    return {"aq": (str(aq_end - pd.Timedelta(days=30)), str(aq_end)),
+            "aq_year": (str(aq_end - pd.Timedelta(days=365)), str(aq_end)),
+            "weather": (str(w_end - pd.Timedelta(days=3652)), str(w_end))}
+
+
+# name -> (legacy SQL, typed SQL, bounds key)
+QUERIES = {
+    "latest AQ row": (
+        "SELECT * FROM historical_air_quality_data ORDER BY date DESC LIMIT 1",
+        "SELECT * FROM aq_hourly ORDER BY ts DESC LIMIT 1", None),
+    "last 1000 AQ rows": (
+        "SELECT * FROM historical_air_quality_data ORDER BY date DESC LIMIT 1000",
+        "SELECT * FROM aq_hourly ORDER BY ts DESC LIMIT 1000", None),
+    "AQ 30-day range": (
+        "SELECT * FROM historical_air_quality_data WHERE date >= ? AND date <= ? ORDER BY date",
+        "SELECT * FROM aq_hourly WHERE ts >= ? AND ts <= ? ORDER BY ts", "aq"),
+    "AQ daily mean, 1 year": (
+        "SELECT substr(date, 1, 10) AS day, AVG(pm2_5) FROM historical_air_quality_data "
+        "WHERE date >= ? AND date <= ? GROUP BY day",
+        "SELECT ts / 86400 AS day, AVG(pm2_5) FROM aq_hourly WHERE ts >= ? AND ts <= ? GROUP BY day", "aq_year"),
+    "weather 10-year range": (
+        "SELECT * FROM historical_weather_data WHERE date >= ? AND date <= ? ORDER BY date DESC",
+        "SELECT * FROM weather_daily WHERE ts >= ? AND ts <= ? ORDER BY ts DESC", "weather"),
+}
+
+
+def time_queries(path, legacy, repeat):
+    conn = sqlite3.connect(path)
+    try:
+        bounds = _bounds(conn, legacy)
+        timings = {}
+        for name, (legacy_sql, typed_sql, key) in QUERIES.items():
+            sql, params = (legacy_sql if legacy else typed_sql), (bounds[key] if key else ())
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = statistics.median(samples)
+        return timings
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs typed storage layout")
+    parser.add_argument("--db", help="legacy-format database to copy (default: build a synthetic one)")
+    parser.add_argument("--synthetic-hours", type=int, default=24 * 365 * 3)
+    parser.add_argument("--synthetic-days", type=int, default=365 * 85)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path, typed_path = os.path.join(tmp, "legacy.db"), os.path.join(tmp, "typed.db")
+        if args.db:
+            shutil.copyfile(args.db, legacy_path)
+        else:
+            build_synthetic_legacy(legacy_path, args.synthetic_hours, args.synthetic_days)
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("VACUUM")
+        conn.close()
+
+        shutil.copyfile(legacy_path, typed_path)
+        migrate(typed_path)
+
+        legacy_times = time_queries(legacy_path, True, args.repeat)
+        typed_times = time_queries(typed_path, False, args.repeat)
+        legacy_size, typed_size = os.path.getsize(legacy_path), os.path.getsize(typed_path)
+
+    print(f"{'':<26}{'legacy':>12}{'typed':>12}{'speedup':>10}")
+    print(f"{'DB size (MB)':<26}{legacy_size / 2**20:>12.2f}{typed_size / 2**20:>12.2f}{legacy_size / typed_size:>9.1f}x")
+    for name in QUERIES:
+        before, after = legacy_times[name], typed_times[name]
+        print(f"{name + ' (ms)':<26}{before:>12.3f}{after:>12.3f}{before / max(after, 1e-9):>9.1f}x")
@@ -0,0 +1,157 @@
+"""
+Day-of-year weather climatology: normals, percentiles and records.
+
+For every daily weather column and calendar day this stores, in weather_climatology:
+
+    mean, std, p10, p25, p50, p75, p90   over the normals period (default 1991-2020),
+                                         using a +/-7 day window around the calendar day
+    record_high / record_low (+ year)    over all years, for that calendar day only
+
+Calendar days are numbered 1..366 on a leap-year calendar, so Feb 29 is day 60 and
+March 1 is always day 61. All days and columns are computed in one vectorized pass
+over a (year, day, column) array. Refreshes are incremental: only the calendar days
+whose window touches a day written since the last refresh (ingest_log) are rewritten.
+
+    python climatology.py
+    python climatology.py --full --normals 1981 2010
+"""
+import argparse
+import sqlite3
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from storage import WEATHER_COLUMNS, create_schema, mark_caught_up, pending_since
+
+# weather_code is categorical, and sunrise/sunset are times of day
+CLIMATOLOGY_COLUMNS = [c for c in WEATHER_COLUMNS if c != "weather_code"] + ["sunshine_duration", "daylight_duration"]
+NORMALS_PERIOD = (1991, 2020)
+WINDOW_DAYS = 7
+PERCENTILES = (10, 25, 50, 75, 90)
+
+STAT_COLUMNS = ["n", "mean", "std"] + [f"p{q}" for q in PERCENTILES] + \
+    ["record_high", "record_high_year", "record_low", "record_low_year"]
+INTEGER_STATS = {"n", "record_high_year", "record_low_year"}
+
+
+def create_climatology_table(conn):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS weather_climatology (
+        variable TEXT NOT NULL, doy INTEGER NOT NULL,
+        {', '.join(f'{c} INTEGER' if c in INTEGER_STATS else f'{c} REAL' for c in STAT_COLUMNS)},
+        PRIMARY KEY (variable, doy)
+    ) WITHOUT ROWID
+    """)
+
+
+def leap_doy(day_epoch):
+    """Day keys (epoch of 00:00 UTC on the date) -> day of year on a leap-year calendar, 1..366"""
+    dates = pd.DatetimeIndex(pd.to_datetime(np.asarray(day_epoch), unit="s"))
+    doy = dates.dayofyear.to_numpy()
+    # In common years every day from March 1 on shifts up by one to leave room for Feb 29
+    return doy + ((~dates.is_leap_year) & (dates.month > 2)).astype(int)
+
+
+def load_cube(conn):
+    """All daily weather as a (years, 366, columns) float array, NaN where missing"""
+    df = pd.read_sql_query(f"""
+        SELECT w.ts, {', '.join(CLIMATOLOGY_COLUMNS)}
+        FROM weather_daily w LEFT JOIN weather_daily_extra e ON e.ts = w.ts
+    """, conn)
+    years = pd.to_datetime(df["ts"], unit="s").dt.year.to_numpy()
+    first_year = years.min()
+    cube = np.full((years.max() - first_year + 1, 366, len(CLIMATOLOGY_COLUMNS)), np.nan)
+    cube[years - first_year, leap_doy(df["ts"]) - 1] = df[CLIMATOLOGY_COLUMNS].to_numpy(np.float64)
+    return cube, first_year
+
+
+def compute(cube, first_year, doys, normals=NORMALS_PERIOD):
+    """Statistics for the given calendar days (1-based) -> {stat: (len(doys), columns) array}"""
+    idx = np.asarray(doys) - 1
+    lo, hi = normals[0] - first_year, normals[1] - first_year + 1
+    base = cube[max(lo, 0):max(hi, 0)]
+
+    # Window of +/-WINDOW_DAYS around each day, wrapping around the year end:
+    # (years, days, 2w+1, columns) -> (days, columns, samples)
+    offsets = np.arange(-WINDOW_DAYS, WINDOW_DAYS + 1)
+    windows = base[:, (idx[:, None] + offsets) % 366]
+    samples = windows.transpose(1, 3, 0, 2).reshape(len(idx), cube.shape[2], -1)
+
+    # Windows with no data at all (e.g. a normals period before the record starts) are NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stats = {
+            "n": np.sum(~np.isnan(samples), axis=2),
+            "mean": np.nanmean(samples, axis=2),
+            "std": np.nanstd(samples, axis=2, ddof=1),
+        }
+        # nanpercentile drops the quantile axis when there are no samples at all
+        percentiles = (np.nanpercentile(samples, PERCENTILES, axis=2) if samples.shape[2]
+                       else np.full((len(PERCENTILES),) + samples.shape[:2], np.nan))
+        for q, values in zip(PERCENTILES, percentiles):
+            stats[f"p{q}"] = values
+
+        # Records use every year, and the calendar day only
+        days = cube[:, idx]
+        has = ~np.isnan(days).all(axis=0)
+        high = np.argmax(np.where(np.isnan(days), -np.inf, days), axis=0)
+        low = np.argmin(np.where(np.isnan(days), np.inf, days), axis=0)
+        stats["record_high"] = np.where(has, np.take_along_axis(days, high[None], 0)[0], np.nan)
+        stats["record_low"] = np.where(has, np.take_along_axis(days, low[None], 0)[0], np.nan)
+        stats["record_high_year"] = np.where(has, high + first_year, np.nan)
+        stats["record_low_year"] = np.where(has, low + first_year, np.nan)
+    return stats
+
+
+def affected_doys(conn, since):
+    """Calendar days whose window includes a day written from `since` on"""
+    if since == float("-inf"):
+        return np.arange(1, 367)
+    written = conn.execute("SELECT ts FROM weather_daily WHERE ts >= ?", (since,)).fetchall()
+    doys = np.unique(leap_doy(np.array([t for (t,) in written], dtype=np.int64)))
+    spread = (doys[:, None] - 1 + np.arange(-WINDOW_DAYS, WINDOW_DAYS + 1)) % 366 + 1
+    return np.unique(spread)
+
+
+def refresh_climatology(conn, full=False, normals=NORMALS_PERIOD):
+    """Recompute the climatology rows affected by weather written since the last refresh. Returns rows written."""
+    create_schema(conn)
+    create_climatology_table(conn)
+    since, version = pending_since(conn, "weather_climatology", "weather")
+    if full:
+        since = float("-inf")
+    if since is None:
+        return 0
+
+    doys = affected_doys(conn, since)
+    rows = []
+    if len(doys):
+        cube, first_year = load_cube(conn)
+        stats = compute(cube, first_year, doys, normals)
+        for j, variable in enumerate(CLIMATOLOGY_COLUMNS):
+            for i, doy in enumerate(doys.tolist()):
+                values = [float(stats[c][i, j]) for c in STAT_COLUMNS]
+                rows.append([variable, doy] + [None if np.isnan(v) else int(v) if c in INTEGER_STATS else v
+                                               for c, v in zip(STAT_COLUMNS, values)])
+
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO weather_climatology (variable, doy, {', '.join(STAT_COLUMNS)}) "
+                         f"VALUES ({', '.join(['?'] * (len(STAT_COLUMNS) + 2))})", rows)
+        mark_caught_up(conn, "weather_climatology", "weather", version)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the day-of-year weather climatology")
+    parser.add_argument("--db", default="campus_data.db")
+    parser.add_argument("--full", action="store_true", help="recompute every calendar day")
+    parser.add_argument("--normals", nargs=2, type=int, default=NORMALS_PERIOD, metavar=("FIRST", "LAST"),
+                        help="years of the normals period (default %(default)s)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        print(f"weather_climatology: {refresh_climatology(conn, args.full, tuple(args.normals))} rows written")
+    finally:
+        conn.close()
@@ -1,15 +1,12 @@
-import openmeteo_requests
 import sqlite3
 from datetime import datetime, timedelta
 
 import pandas as pd
-import requests_cache
-from retry_requests import retry
 
-# Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-openmeteo = openmeteo_requests.Client(session = retry_session)
+from http_client import get_open_meteo
+from rollups import refresh_rollups
+from sketches import refresh_sketches
+from storage import write_air_quality
 
 # Make sure all required weather variables are listed here
 # The order of variables in hourly or daily is important to assign them correctly below
@@ -38,7 +35,8 @@ params = {
 	"end_date": end_date,
     "timezone": "America/Chicago",
 }
-responses = openmeteo.weather_api(url, params=params)
+# Shared pooled client and response cache (see http_client.py); cached for an hour
+responses = get_open_meteo(url, params, ttl=3600)
 
 # Process first location. Add a for-loop for multiple locations or weather models
 response = responses[0]
@@ -71,11 +69,12 @@ df_current = pd.DataFrame(current_data)
 # Store in SQLite
 conn = sqlite3.connect("campus_data.db")
 
-table_name = "historical_air_quality_data"
 table_name_current = "current_air_quality_data"
 
-# Create/replace the table
-df.to_sql(table_name, conn, if_exists="replace", index=False)
+# Upsert the hourly history into the typed aq_hourly tables (see storage.py)
+write_air_quality(conn, df)
+refresh_rollups(conn, "air_quality")  # recompute only the day/week/month buckets this run touched
+refresh_sketches(conn, "air_quality")
 df_current.to_sql(table_name_current, conn, if_exists="replace", index=False)
 
 conn.close()
\ No newline at end of file
@@ -1,17 +1,12 @@
-import openmeteo_requests
 import sqlite3
-import requests
 from datetime import datetime, timedelta
 
 import pandas as pd
-import requests_cache
-from retry_requests import retry
 
+from http_client import get_open_meteo
+from climatology import refresh_climatology
+from storage import write_weather_daily
 
-# Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after = -1)
-retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-openmeteo = openmeteo_requests.Client(session = retry_session)
 
 # Required weather variables are listed here and retrieved from OpenMeteo
 url = "https://archive-api.open-meteo.com/v1/archive"
@@ -34,7 +29,10 @@ params = {
     "precipitation_unit": "inch",
     "timezone": "America/Chicago",
 }
-responses = openmeteo.weather_api(url, params=params)
+# Shared pooled client and response cache (see http_client.py). The archive request
+# includes today's date, so each day is a new cache entry; it expires after a day and is
+# purged at the end of a later run.
+responses = get_open_meteo(url, params, ttl=86400)
 
 # Process first location. Add a for-loop for multiple locations or weather models
 response = responses[0]
@@ -60,8 +58,7 @@ df["date"] = df["date"].dt.tz_convert("America/Chicago")
 # Store in SQLite
 conn = sqlite3.connect("campus_data.db")
 
-table_name = "historical_weather_data"
-
-# Create/replace the table
-df.to_sql(table_name, conn, if_exists="replace", index=False)
+# Upsert into the typed weather_daily tables (see storage.py)
+write_weather_daily(conn, df)
+refresh_climatology(conn)  # only calendar days near the days that changed are recomputed
 conn.close()
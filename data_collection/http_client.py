@@ -0,0 +1,322 @@
+"""
+Shared HTTP layer for the data collectors.
+
+One httpx.AsyncClient per process, running on a background event loop, gives every
+collector keep-alive connection reuse (HTTP/2 when the h2 package is installed), gzip
+transfer encoding, retries with backoff and per-host concurrency limits. Responses are
+cached in one SQLite file shared by all collectors and processes. Expiry follows
+Cache-Control / Expires, falling back to a per-call ttl, and stale entries with an
+ETag or Last-Modified are revalidated with a conditional request. Entries that expired
+more than a week ago are purged when a collector process exits.
+
+Synchronous scripts call fetch() / get_json(); async code can await afetch() directly
+and run many requests concurrently with gather().
+"""
+import asyncio
+import atexit
+import email.utils
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+
+from replay import resolve_url
+
+CACHE_PATH = os.getenv("SIGAIDA_HTTP_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache.sqlite"))
+USER_AGENT = "UIUCEnvApp (timkhaiet@gmail.com)"  # NWS requires a contact in the User-Agent
+
+MAX_CONNECTIONS = 20
+DEFAULT_HOST_LIMIT = 4
+# Concurrent requests per host; OpenAQ and NWS rate limit aggressively
+HOST_LIMITS = {"api.openaq.org": 1, "api.weather.gov": 2}
+
+RETRIES = 5
+BACKOFF_FACTOR = 0.2
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+@dataclass
+class Response:
+    status_code: int
+    headers: dict
+    content: bytes
+    url: str
+    from_cache: bool = False
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise httpx.HTTPStatusError(f"{self.status_code} for {self.url}", request=None, response=None)
+
+
+# ---- shared on-disk cache ----
+
+class ResponseCache:
+    """SQLite response cache shared by all collectors; safe across processes (WAL)"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB,
+                stored_at REAL, expires_at REAL, etag TEXT, last_modified TEXT
+            )
+            """)
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT status, headers, body, expires_at, etag, last_modified FROM http_cache WHERE key = ?",
+                (key,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "headers": json.loads(row[1]), "body": row[2], "expires_at": row[3],
+                "etag": row[4], "last_modified": row[5]}
+
+    def put(self, key, status, headers, body, expires_at):
+        with self._lock, self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, status, json.dumps(headers), body, time.time(), expires_at,
+                          headers.get("etag"), headers.get("last-modified")))
+
+    def touch(self, key, expires_at):
+        with self._lock, self._connection() as conn:
+            conn.execute("UPDATE http_cache SET expires_at = ?, stored_at = ? WHERE key = ?",
+                         (expires_at, time.time(), key))
+
+    def purge_expired(self, older_than=7 * 86400):
+        """Drop entries that expired more than older_than seconds ago"""
+        with self._lock, self._connection() as conn:
+            conn.execute("DELETE FROM http_cache WHERE expires_at < ?", (time.time() - older_than,))
+
+
+def expiry_from_headers(headers, ttl, now=None):
+    """
+    Absolute expiry time for a response, or None if it must not be stored.
+    Cache-Control max-age/s-maxage wins over Expires, which wins over the caller's ttl.
+    ttl=-1 means never expire (e.g. archive data that doesn't change).
+    """
+    now = time.time() if now is None else now
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return now   # store for revalidation, but never serve without asking
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name, "").isdigit():
+            age = int(headers.get("age", "0") or 0) if str(headers.get("age", "0")).isdigit() else 0
+            return now + int(directives[name]) - age
+    if "expires" in headers:
+        try:
+            return email.utils.parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return now
+    if ttl == -1:
+        return float("inf")
+    return now + ttl if ttl else None
+
+
+def cache_key(method, url, params):
+    query = urlencode(sorted((params or {}).items()))
+    return f"{method} {url}?{query}"
+
+
+def _encode_params(params):
+    # Open-Meteo (and friends) take comma-separated lists
+    return {k: ",".join(map(str, v)) if isinstance(v, (list, tuple)) else v for k, v in (params or {}).items()}
+
+
+# ---- pooled async client ----
+
+class CollectorClient:
+    """Keep-alive pooled async client with per-host limits, retries and the shared cache"""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else ResponseCache()
+        self._client = None
+        self._host_semaphores = {}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                                    keepalive_expiry=60),
+                timeout=TIMEOUT,
+                headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+                follow_redirects=True,
+            )
+        return self._client
+
+    def _semaphore(self, host):
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+        return self._host_semaphores[host]
+
+    async def _send(self, method, url, params, headers):
+        """Send with retries on connection errors and retryable statuses"""
+        host = urlsplit(url).hostname
+        for attempt in range(RETRIES + 1):
+            try:
+                async with self._semaphore(host):
+                    response = await self._get_client().request(method, url, params=params, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                    return response
+                delay = float(response.headers.get("retry-after", 0) or 0) if response.headers.get("retry-after", "").isdigit() else 0
+            except httpx.TransportError:
+                if attempt == RETRIES:
+                    raise
+                delay = 0
+            await asyncio.sleep(max(delay, BACKOFF_FACTOR * (2 ** attempt)))
+
+    async def fetch(self, url, params=None, headers=None, ttl=None, cache=True, method="GET"):
+        """
+        Fetch url (rewritten to the replay server when configured) and return a Response.
+        ttl is the fallback freshness in seconds when the server sends no caching headers.
+        """
+        url = resolve_url(url)
+        params = _encode_params(params)
+        headers = dict(headers or {})
+        key = cache_key(method, url, params)
+
+        cached = self.cache.get(key) if cache else None
+        if cached and cached["expires_at"] is not None and cached["expires_at"] > time.time():
+            return Response(cached["status"], cached["headers"], cached["body"], url, from_cache=True)
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._send(method, url, params, headers)
+        response_headers = {k.lower(): v for k, v in response.headers.items()}
+
+        if response.status_code == 304 and cached:
+            expires_at = expiry_from_headers(response_headers, ttl)
+            self.cache.touch(key, expires_at if expires_at is not None else time.time())
+            return Response(cached["status"], cached["headers"], cached["body"], url, from_cache=True)
+
+        result = Response(response.status_code, response_headers, response.content, url)
+        if cache and response.status_code == 200:
+            expires_at = expiry_from_headers(response_headers, ttl)
+            if expires_at is not None:
+                self.cache.put(key, response.status_code, response_headers, response.content, expires_at)
+        return result
+
+    async def download(self, url, write, headers=None):
+        """Stream a large body through write(chunk), uncached. Returns the Response without content."""
+        url = resolve_url(url)
+        async with self._semaphore(urlsplit(url).hostname):
+            async with self._get_client().stream("GET", url, headers=headers) as response:
+                if response.status_code == 200:
+                    async for chunk in response.aiter_bytes(1 << 16):
+                        write(chunk)
+                return Response(response.status_code, {k.lower(): v for k, v in response.headers.items()}, b"", url)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# ---- process-wide client on a background loop, for synchronous collectors ----
+
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def _ensure_loop():
+    global _loop, _client
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="collector-http", daemon=True).start()
+            _client = CollectorClient()
+            atexit.register(_shutdown)
+    return _loop, _client
+
+
+def _shutdown():
+    # End of a collector run: drop entries that expired long ago, so dated requests
+    # (e.g. the weather archive up to today) don't pile up in the shared cache file
+    if _client is not None and _client.cache._conn is not None:
+        try:
+            _client.cache.purge_expired()
+        except sqlite3.Error as e:
+            print(f"Could not purge the HTTP cache: {e}")
+    if _loop is not None and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(_client.aclose(), _loop).result(timeout=5)
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+def run(coro):
+    """Run a coroutine on the shared loop from synchronous code"""
+    loop, _ = _ensure_loop()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def client():
+    return _ensure_loop()[1]
+
+
+async def afetch(url, **kwargs):
+    return await client().fetch(url, **kwargs)
+
+
+async def gather(*coros):
+    return await asyncio.gather(*coros)
+
+
+def fetch(url, **kwargs):
+    """Synchronous fetch through the shared pool and cache"""
+    return run(client().fetch(url, **kwargs))
+
+
+def get_json(url, **kwargs):
+    response = fetch(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+def download(url, write, headers=None):
+    return run(client().download(url, write, headers))
+
+
+def get_open_meteo(url, params, ttl=3600):
+    """Fetch an Open-Meteo endpoint in FlatBuffers format and decode every location's response"""
+    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+    response = fetch(url, params=dict(params, format="flatbuffers"), ttl=ttl)
+    if response.status_code in (400, 429):
+        raise RuntimeError(f"Open-Meteo error: {response.content.decode(errors='replace')}")
+    response.raise_for_status()
+
+    # The body is a sequence of size-prefixed messages, one per location
+    data, messages, pos = response.content, [], 0
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "little")
+        messages.append(WeatherApiResponse.GetRootAs(data, pos + 4))
+        pos += length + 4
+    return messages
@@ -0,0 +1,72 @@
+"""
+Migrate campus_data.db from the text-timestamped to_sql tables to the typed schema in
+storage.py. Safe to re-run: rows are upserted by timestamp and tables that were already
+migrated are skipped.
+
+    python migrate_storage.py
+    python migrate_storage.py --db other.db --keep-legacy
+"""
+import argparse
+import sqlite3
+
+import pandas as pd
+
+from climatology import refresh_climatology
+from rollups import SOURCES as ROLLUP_SOURCES, refresh_rollups
+from sketches import refresh_sketches
+from storage import create_compat_views, create_schema, write_air_quality, write_openaq, write_weather_daily
+
+READ_CHUNK = 50000
+
+# legacy table -> writer into the typed tables
+LEGACY_TABLES = {
+    "historical_air_quality_data": write_air_quality,
+    "historical_weather_data": write_weather_daily,
+    "historical_aq_openaq": write_openaq,
+}
+
+
+def migrate(db_path, keep_legacy=False, vacuum=True):
+    """Copy legacy tables into the typed schema, then drop (or rename) them. Returns rows per table."""
+    conn = sqlite3.connect(db_path)
+    migrated = {}
+    try:
+        create_schema(conn)
+        for table, writer in LEGACY_TABLES.items():
+            kind = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+            if not kind or kind[0] != "table":
+                continue
+            migrated[table] = 0
+            for chunk in pd.read_sql_query(f"SELECT * FROM {table}", conn, chunksize=READ_CHUNK):
+                migrated[table] += writer(conn, chunk)
+            if keep_legacy:
+                conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+            else:
+                conn.execute(f"DROP TABLE {table}")
+            conn.commit()
+
+        create_compat_views(conn)
+        for source in ROLLUP_SOURCES:
+            refresh_rollups(conn, source)
+            refresh_sketches(conn, source)
+        refresh_climatology(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+        if vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate campus_data.db to the typed epoch-keyed schema")
+    parser.add_argument("--db", default="campus_data.db")
+    parser.add_argument("--keep-legacy", action="store_true", help="rename legacy tables to *_legacy instead of dropping them")
+    args = parser.parse_args()
+
+    migrated = migrate(args.db, args.keep_legacy)
+    if not migrated:
+        print("Nothing to migrate")
+    for table, rows in migrated.items():
+        print(f"{table}: {rows} rows migrated")
@@ -0,0 +1,160 @@
+"""
+NDVI grid definition and per-month rasters.
+
+vegetation_data holds one row per 100 m cell of the EPSG:3857 grid exported by
+vegetation_data.py. For every (year, month) this packs those cells into ndvi_rasters:
+
+    data    float32 little-endian, row-major, north-up (first row is the northern edge),
+            NaN where a cell has no value
+    png     the same grid color-mapped (one pixel per cell, transparent where NaN)
+
+All months share one extent (the bounding box of every cell ever loaded), so rasters of
+different months line up pixel for pixel. origin_x / origin_y are the EPSG:3857 meters
+of the top-left corner. push_ndvi_data.py rebuilds the months it loaded; a change of
+extent rebuilds every month.
+
+    python ndvi_raster.py          # rebuild all months
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# Grid definition, shared with the API: 100 m cells on the EPSG:3857 grid. cell_id packs
+# the (row, col) index of a cell into one integer so grids from different months can be
+# aligned without comparing float coordinates.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from ndvi_grid import CELL_OFFSET, CELL_SIZE_M, CELL_STRIDE, cell_ids  # noqa: E402
+
+# Upper bounds and colors of the map legend (frontend/lib/utils.ts getNDVIColor), drawn at
+# the map's 0.7 fill opacity
+COLOR_STEPS = [
+    (0.2, "#e5e7eb"),
+    (0.3, "#d1fae5"),
+    (0.4, "#6ee7b7"),
+    (0.5, "#34d399"),
+    (0.6, "#10b981"),
+    (np.inf, "#059669"),
+]
+ALPHA = 179
+
+
+def create_raster_table(conn):
+    # Blobs of a few KB to a few hundred KB per row, so a rowid table rather than WITHOUT ROWID
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ndvi_rasters (
+        year INTEGER NOT NULL, month INTEGER NOT NULL,
+        width INTEGER NOT NULL, height INTEGER NOT NULL,
+        origin_x REAL NOT NULL, origin_y REAL NOT NULL, cell_size REAL NOT NULL,
+        valid_cells INTEGER NOT NULL, min REAL, max REAL, mean REAL,
+        digest TEXT NOT NULL, data BLOB NOT NULL, png BLOB NOT NULL,
+        PRIMARY KEY (year, month)
+    )
+    """)
+
+
+def grid_extent(conn):
+    """(min_row, max_row, min_col, max_col) over every loaded cell, or None if there are none"""
+    extent = conn.execute(f"""
+        SELECT MIN(cell_id / {CELL_STRIDE}), MAX(cell_id / {CELL_STRIDE}),
+               MIN(cell_id % {CELL_STRIDE}), MAX(cell_id % {CELL_STRIDE})
+        FROM vegetation_data
+    """).fetchone()
+    return None if extent[0] is None else tuple(extent)
+
+
+def rasterize(cells, values, extent):
+    """Mean NDVI per cell on the extent as a north-up float32 (height, width) array"""
+    min_row, max_row, min_col, max_col = extent
+    height, width = max_row - min_row + 1, max_col - min_col + 1
+    rows = max_row - cells // CELL_STRIDE
+    cols = cells % CELL_STRIDE - min_col
+    flat = rows * width + cols
+    # Several exported centroids can fall in one cell; average them
+    sums = np.bincount(flat, weights=values, minlength=height * width)
+    counts = np.bincount(flat, minlength=height * width)
+    with np.errstate(invalid="ignore"):
+        grid = sums / counts
+    return grid.astype(np.float32).reshape(height, width)
+
+
+def colorize(grid):
+    """float32 grid -> (height, width, 4) uint8 RGBA using the legend colors"""
+    bounds = np.array([upper for upper, _ in COLOR_STEPS[:-1]])
+    palette = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] + [ALPHA] for _, color in COLOR_STEPS],
+                       dtype=np.uint8)
+    rgba = palette[np.searchsorted(bounds, np.nan_to_num(grid), side="right")]
+    rgba[np.isnan(grid)] = 0
+    return rgba
+
+
+def encode_png(rgba):
+    """Minimal PNG encoder for an (height, width, 4) uint8 array (8-bit RGBA, no filtering)"""
+    height, width = rgba.shape[:2]
+
+    def chunk(kind, payload):
+        return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+    # Every scanline starts with filter type 0
+    scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)])
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 9))
+            + chunk(b"IEND", b""))
+
+
+def refresh_rasters(conn, months=None):
+    """
+    Rebuild the rasters of the given (year, month) pairs (default: all). Every month is
+    rebuilt when the grid extent changed. Returns the number of rasters written.
+    """
+    create_raster_table(conn)
+    extent = grid_extent(conn)
+    if extent is None:
+        return 0
+    min_row, max_row, min_col, max_col = extent
+    origin_x = float((min_col - CELL_OFFSET) * CELL_SIZE_M)
+    origin_y = float((max_row + 1 - CELL_OFFSET) * CELL_SIZE_M)
+
+    stored = conn.execute("SELECT DISTINCT width, height, origin_x, origin_y FROM ndvi_rasters").fetchall()
+    rebuild = months is None or stored != [(max_col - min_col + 1, max_row - min_row + 1, origin_x, origin_y)]
+    if rebuild:
+        months = conn.execute("SELECT DISTINCT year, month FROM vegetation_data").fetchall()
+
+    written = 0
+    with conn:
+        if rebuild:
+            conn.execute("DELETE FROM ndvi_rasters")
+        for year, month in sorted(set(months)):
+            rows = conn.execute("SELECT cell_id, ndvi FROM vegetation_data WHERE year = ? AND month = ?",
+                                (year, month)).fetchall()
+            if not rows:
+                conn.execute("DELETE FROM ndvi_rasters WHERE year = ? AND month = ?", (year, month))
+                continue
+            cells, values = (np.array(col) for col in zip(*rows))
+            grid = rasterize(cells.astype(np.int64), values.astype(np.float64), extent)
+            valid = grid[~np.isnan(grid)]
+            data = grid.astype("<f4").tobytes()
+            conn.execute("INSERT OR REPLACE INTO ndvi_rasters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                int(year), int(month), grid.shape[1], grid.shape[0], origin_x, origin_y, float(CELL_SIZE_M),
+                int(valid.size), float(valid.min()), float(valid.max()), float(valid.mean()),
+                hashlib.sha256(data).hexdigest()[:16], data, encode_png(colorize(grid))))
+            written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-month NDVI rasters and PNGs")
+    parser.add_argument("--db", default="campus_data.db")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        print(f"ndvi_rasters: {refresh_rasters(conn)} months written")
+    finally:
+        conn.close()
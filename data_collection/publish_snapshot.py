@@ -0,0 +1,136 @@
+"""
+Publish an immutable snapshot of campus_data.db for the API to serve.
+
+The collectors keep writing the live database; after an update this copies it with
+VACUUM INTO (one consistent read transaction, compacted) to a new versioned file in the
+snapshot directory and then atomically replaces the CURRENT pointer file with its name:
+
+    snapshots/
+        campus_data-20261019T140502Z.db
+        campus_data-20261019T150501Z.db
+        CURRENT                             -> "campus_data-20261019T150501Z.db"
+
+A backend started with SIGAIDA_SNAPSHOT_DIR=snapshots opens the file CURRENT names
+read-only with immutable=1 (no locking, memory-mapped) and switches to a new snapshot on
+its next query after CURRENT changes. Superseded snapshots are deleted once there are
+more than --keep of them and they were superseded more than --grace seconds ago, so
+requests still reading an old file can finish.
+
+    python publish_snapshot.py                              # snapshots/ next to campus_data.db
+    python publish_snapshot.py --dir /srv/sigaida/snapshots --keep 3 --grace 600
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+POINTER = "CURRENT"
+PREFIX, SUFFIX = "campus_data-", ".db"
+
+
+def _fsync(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _order(name):
+    """(stamp, n) of a snapshot name; the first of a second is stamp.db, later ones stamp-n.db"""
+    stamp, _, n = name[len(PREFIX):-len(SUFFIX)].partition("-")
+    return stamp, int(n) if n.isdigit() else 1
+
+
+def snapshots(directory):
+    """Published snapshot file names, oldest first"""
+    # Not a plain name sort: "-" sorts before ".", which would put stamp-2.db before stamp.db
+    return sorted((name for name in os.listdir(directory) if name.startswith(PREFIX) and name.endswith(SUFFIX)),
+                  key=_order)
+
+
+def current(directory):
+    """Name of the snapshot CURRENT points to, or None"""
+    try:
+        with open(os.path.join(directory, POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(db_path, directory):
+    """Copy db_path into a new snapshot and point CURRENT at it; returns the snapshot's path"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    name, n = f"{PREFIX}{stamp}{SUFFIX}", 1
+    while os.path.exists(os.path.join(directory, name)):
+        n += 1
+        name = f"{PREFIX}{stamp}-{n}{SUFFIX}"
+    path = os.path.join(directory, name)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)  # left over from an interrupted publish
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("VACUUM INTO ?", (tmp,))
+    finally:
+        conn.close()
+    _fsync(tmp)
+    os.replace(tmp, path)
+
+    pointer_tmp = os.path.join(directory, POINTER + ".tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(directory, POINTER))
+    _fsync(directory)
+    return path
+
+
+def prune(directory, keep=3, grace=600):
+    """Delete snapshots beyond the newest keep that were superseded more than grace seconds ago"""
+    names = snapshots(directory)
+    live = current(directory)
+    removed = []
+    for older, newer in zip(names[:-keep] if keep > 0 else names, names[1:]):
+        if older == live:
+            continue
+        superseded = os.path.getmtime(os.path.join(directory, newer))
+        if time.time() - superseded < grace:
+            continue
+        try:
+            os.remove(os.path.join(directory, older))
+            removed.append(older)
+        except OSError as e:
+            # e.g. still open on Windows; tried again after the next publish
+            print(f"Could not remove {older}: {e}")
+    return removed
+
+
+if __name__ == "__main__":
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Publish an immutable snapshot of the database for serving")
+    parser.add_argument("--db", default=os.path.join(here, "campus_data.db"), help="live database to copy")
+    # A relative SIGAIDA_SNAPSHOT_DIR is taken from the repository root, as the backend does
+    env_dir = os.getenv("SIGAIDA_SNAPSHOT_DIR")
+    default_dir = os.path.join(os.path.dirname(here), env_dir) if env_dir else os.path.join(here, "snapshots")
+    parser.add_argument("--dir", default=default_dir,
+                        help="snapshot directory (default: $SIGAIDA_SNAPSHOT_DIR or snapshots/)")
+    parser.add_argument("--keep", type=int, default=3, help="snapshots to keep, including the current one")
+    parser.add_argument("--grace", type=float, default=600,
+                        help="seconds a superseded snapshot is kept for requests still reading it")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = publish(args.db, args.dir)
+    print(f"Published {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f} s")
+    for name in prune(args.dir, args.keep, args.grace):
+        print(f"Removed {name}")
@@ -1,26 +1,159 @@
-import pandas as pd
-import sqlite3
+import argparse
 import glob
+import hashlib
 import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ndvi_raster import cell_ids, refresh_rasters
 
 # Folder where you downloaded the exported CSVs from Google Drive
 csv_folder = "sigaida_ndvi_data"
+sqlite_path = "campus_data.db"
+table_name = "vegetation_data"
 
-# Get all CSV files
-csv_files = glob.glob(os.path.join(csv_folder, "*.csv"))
+CHUNK_SIZE = 50000
 
-# Read and concatenate
-df = pd.concat([pd.read_csv(f) for f in csv_files], ignore_index=True)
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-# Optional: ensure correct column order
-columns = ['year', 'month', 'lon', 'lat', 'ndvi']
-df = df[columns]
 
-# Save to SQLite
-sqlite_path = "campus_data.db"
-table_name = "vegetation_data"
-conn = sqlite3.connect(sqlite_path)
-df.to_sql(table_name, conn, if_exists="replace", index=False)
-conn.close()
+def parse_file(path):
+    """Parse one exported CSV into compact column arrays (runs in a worker process)"""
+    df = pd.read_csv(path, usecols=["year", "month", "lon", "lat", "ndvi"])
+    # Every month the file covers, including ones with no valid NDVI left
+    months = sorted(set(zip(df["year"].astype(int).tolist(), df["month"].astype(int).tolist())))
+    # Months without cloud-free imagery export empty NDVI values; they carry no data
+    df = df.dropna(subset=["ndvi"])
+    return {
+        "months": months,
+        "year": df["year"].to_numpy(np.int64),
+        "month": df["month"].to_numpy(np.int64),
+        "lon": df["lon"].to_numpy(np.float64),
+        "lat": df["lat"].to_numpy(np.float64),
+        "ndvi": df["ndvi"].to_numpy(np.float64),
+        "cell_id": cell_ids(df["lat"], df["lon"]),
+    }
+
+
+def create_tables(conn):
+    """Create vegetation_data with a (year, month, lat, lon) key, migrating the old to_sql table"""
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+    if existing and "cell_id" not in existing:
+        conn.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_legacy")
+
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        year INTEGER NOT NULL, month INTEGER NOT NULL, lon REAL NOT NULL, lat REAL NOT NULL,
+        ndvi REAL NOT NULL, cell_id INTEGER NOT NULL,
+        PRIMARY KEY (year, month, lat, lon)
+    ) WITHOUT ROWID
+    """)
+    # Per-cell time series lookups; covers ndvi so they never touch the table
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_vegetation_cell ON {table_name} (cell_id, year, month, ndvi)")
+    # One row per export file with the hash of its last loaded content. It used to be keyed
+    # by sha256 alone, which skipped a file restored to content loaded before (A -> B -> A)
+    files = {row[1]: row[5] for row in conn.execute("PRAGMA table_info(ndvi_files)")}
+    if files.get("sha256"):
+        conn.execute("ALTER TABLE ndvi_files RENAME TO ndvi_files_legacy")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ndvi_files (
+        filename TEXT PRIMARY KEY, sha256 TEXT, row_count INTEGER, loaded_at INTEGER
+    )
+    """)
+    if files.get("sha256"):
+        # The newest load of each file is what vegetation_data holds now
+        conn.execute("""
+        INSERT INTO ndvi_files SELECT filename, sha256, row_count, MAX(loaded_at)
+        FROM ndvi_files_legacy GROUP BY filename
+        """)
+        conn.execute("DROP TABLE ndvi_files_legacy")
+        conn.commit()
+
+    if existing and "cell_id" not in existing:
+        cursor = conn.execute(f"SELECT year, month, lon, lat, ndvi FROM {table_name}_legacy WHERE ndvi IS NOT NULL")
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            year, month, lon, lat, ndvi = (np.array(col) for col in zip(*rows))
+            write_rows(conn, {"year": year, "month": month, "lon": lon, "lat": lat,
+                              "ndvi": ndvi, "cell_id": cell_ids(lat, lon)})
+        conn.execute(f"DROP TABLE {table_name}_legacy")
+        conn.commit()
+
+
+def replace_months(conn, arrays):
+    """Replace every month the parsed file covers, so cells missing from a re-export do not linger"""
+    conn.executemany(f"DELETE FROM {table_name} WHERE year = ? AND month = ?", arrays["months"])
+    return write_rows(conn, arrays)
+
+
+def write_rows(conn, arrays):
+    """Upsert parsed arrays into vegetation_data in CHUNK_SIZE executemany batches"""
+    upsert_sql = f"""
+    INSERT INTO {table_name} (year, month, lon, lat, ndvi, cell_id) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (year, month, lat, lon) DO UPDATE SET ndvi = excluded.ndvi, cell_id = excluded.cell_id
+    """
+    columns = [arrays[name].tolist() for name in ("year", "month", "lon", "lat", "ndvi", "cell_id")]
+    total = len(columns[0])
+    for start in range(0, total, CHUNK_SIZE):
+        conn.executemany(upsert_sql, zip(*(col[start:start + CHUNK_SIZE] for col in columns)))
+    return total
+
+
+def load_ndvi(folder=csv_folder, db_path=sqlite_path, workers=None):
+    """
+    Load new or changed NDVI CSV exports into SQLite.
+    A file is skipped when its sha256 equals the one ndvi_files recorded for its name, the
+    rest are parsed in a process pool. Each file replaces the months it covers in one
+    transaction (the exports are one file per month, see vegetation_data.py), then the
+    rasters of those months are rebuilt (ndvi_raster.py). Returns the number of rows written.
+    """
+    csv_files = sorted(glob.glob(os.path.join(folder, "*.csv")))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        create_tables(conn)
+        known = dict(conn.execute("SELECT filename, sha256 FROM ndvi_files"))
+        pending = {}
+        for path in csv_files:
+            sha256 = hash_file(path)
+            if known.get(os.path.basename(path)) != sha256:
+                pending[path] = sha256
+        print(f"{len(csv_files) - len(pending)} of {len(csv_files)} files already loaded")
+        if not pending:
+            return 0
+
+        total, months = 0, set()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, arrays in zip(pending, pool.map(parse_file, pending)):
+                with conn:
+                    count = replace_months(conn, arrays)
+                    conn.execute("INSERT OR REPLACE INTO ndvi_files VALUES (?, ?, ?, ?)",
+                                 (os.path.basename(path), pending[path], count, int(time.time())))
+                total += count
+                months.update(arrays["months"])
+        print(f"ndvi_rasters: {refresh_rasters(conn, months)} months written")
+        return total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load exported NDVI CSVs into campus_data.db")
+    parser.add_argument("folder", nargs="?", default=csv_folder)
+    parser.add_argument("--db", default=sqlite_path)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
 
-print(f"Saved {len(df)} rows to {sqlite_path}")
+    rows = load_ndvi(args.folder, args.db, args.workers)
+    print(f"Saved {rows} rows to {args.db}")
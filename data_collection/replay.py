@@ -0,0 +1,477 @@
+"""
+Local stand-in for the external data APIs used by the collectors.
+
+Collector URLs pass through resolve_url() (in http_client.py). When SIGAIDA_REPLAY_URL is
+set, https://<host>/<path> is rewritten to <SIGAIDA_REPLAY_URL>/<host>/<path>, so the
+requests land on a ReplayServer instead of Open-Meteo, OpenAQ, NWS or MTD. The server
+answers from recorded cassettes when one exists for the request, otherwise it
+synthesizes a response of a configurable size, optionally after a fixed latency.
+
+    python replay.py --port 8765 --latency-ms 50 --size aq_hours=50000
+    SIGAIDA_REPLAY_URL=http://127.0.0.1:8765 python weather_forecast.py
+
+With --record DIR the server proxies to the real services and saves every response
+as a cassette under DIR, which later runs replay with --cassettes DIR.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+REPLAY_ENV = "SIGAIDA_REPLAY_URL"
+
+# Query parameters left out of cassette names: credentials, and the date range the
+# collectors compute from today, so a recording still matches on later runs
+UNKEYED_PARAMS = ("api_key", "start_date", "end_date")
+
+# Champaign standard time, the utc_offset_seconds Open-Meteo reports for timezone=auto
+LOCAL_OFFSET_S = -6 * 3600
+
+# Default synthetic response sizes; override with --size name=value
+DEFAULT_SIZES = {
+    "aq_hours": 24 * 365 * 3,      # Open-Meteo air quality, hourly rows
+    "weather_days": 365 * 85,      # Open-Meteo archive, daily rows
+    "forecast_hours": 24 * 16,     # Open-Meteo forecast, hourly rows
+    "nws_periods": 156,            # weather.gov hourly forecast periods
+    "openaq_rows": 5000,           # OpenAQ measurements across all pages
+    "gtfs_stops": 2500,
+    "gtfs_trips": 4000,
+    "gtfs_stops_per_trip": 30,
+    "gtfs_shape_points": 200,
+    "ndvi_cells": 1200,            # NDVI grid cells per monthly CSV
+    "ndvi_months": 120,
+}
+
+# Rough (mean, amplitude) per variable so synthetic values look plausible
+_VALUE_PROFILES = [
+    ("temperature", (52.0, 25.0)), ("pm2_5", (8.0, 4.0)), ("pm10", (12.0, 6.0)),
+    ("aqi", (35.0, 15.0)), ("ozone", (60.0, 25.0)), ("carbon_dioxide", (440.0, 10.0)),
+    ("carbon_monoxide", (180.0, 60.0)), ("humidity", (70.0, 15.0)), ("pressure", (1015.0, 8.0)),
+    ("wind_direction", (180.0, 90.0)), ("wind", (9.0, 5.0)), ("cloud", (50.0, 40.0)),
+    ("precipitation", (0.05, 0.05)), ("rain", (0.05, 0.05)), ("snow", (0.01, 0.01)),
+    ("radiation", (150.0, 120.0)), ("duration", (40000.0, 8000.0)), ("weather_code", (3.0, 3.0)),
+]
+
+
+INTEGER_VARIABLES = {"weather_code", "cloud_cover", "cloud_cover_low", "cloud_cover_mid", "cloud_cover_high",
+                     "relative_humidity_2m", "precipitation_probability", "is_day"}
+
+
+def resolve_url(url):
+    """Rewrite an upstream URL to the replay server when SIGAIDA_REPLAY_URL is set"""
+    base = os.getenv(REPLAY_ENV)
+    if not base or url.startswith(base):
+        return url
+    parts = urlsplit(url)
+    rewritten = f"{base.rstrip('/')}/{parts.netloc}{parts.path}"
+    return f"{rewritten}?{parts.query}" if parts.query else rewritten
+
+
+def _series(name, times, rng, hourly=False):
+    """
+    Seasonal sine + noise, clipped at zero, for a variable name at the given epoch seconds.
+    The phase comes from each timestamp's local day of year (peak in late June), plus the
+    hour of day for hourly series (peak mid-afternoon), so any requested range is in season.
+    """
+    mean, amplitude = next((p for key, p in _VALUE_PROFILES if key in name), (10.0, 5.0))
+    local = (np.asarray(times, dtype=np.int64) + LOCAL_OFFSET_S).astype("datetime64[s]")
+    day_of_year = (local.astype("datetime64[D]") - local.astype("datetime64[Y]")).astype(np.float64)
+    wave = np.sin((day_of_year - 80) * (2 * np.pi / 365.25))
+    if hourly:
+        hour = (local - local.astype("datetime64[D]")).astype(np.float64) / 3600
+        wave = 0.7 * wave + 0.3 * np.sin((hour - 9) * (2 * np.pi / 24))
+    values = mean + amplitude * wave + rng.normal(0, amplitude * 0.2, local.size)
+    return np.clip(values, 0, None).astype(np.float32)
+
+
+def _hours(start, n):
+    """Epoch seconds of n hourly steps from an aware or local datetime"""
+    return int(start.timestamp()) + np.arange(n, dtype=np.int64) * 3600
+
+
+def _list_param(query, name):
+    values = []
+    for value in query.get(name, []):
+        values.extend(v for v in value.split(",") if v)
+    return values
+
+
+def _epoch(date_str):
+    return int(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+# ---- Open-Meteo FlatBuffers ----
+
+def _variables_with_time(builder, start, interval, columns, single_value=False):
+    """Build an openmeteo_sdk VariablesWithTime table and return its offset"""
+    var_offsets = []
+    for values in columns:
+        if not single_value:
+            vector = builder.CreateNumpyVector(values)
+        builder.StartObject(4)
+        if single_value:
+            builder.PrependFloat32Slot(2, float(values[0]), 0.0)   # value
+        else:
+            builder.PrependUOffsetTRelativeSlot(3, vector, 0)       # values
+        var_offsets.append(builder.EndObject())
+
+    builder.StartVector(4, len(var_offsets), 4)
+    for offset in reversed(var_offsets):
+        builder.PrependUOffsetTRelative(offset)
+    variables = builder.EndVector()
+
+    n = 1 if single_value else (len(columns[0]) if columns else 0)
+    builder.StartObject(4)
+    builder.PrependInt64Slot(0, start, 0)                  # time
+    builder.PrependInt64Slot(1, start + n * interval, 0)   # time_end
+    builder.PrependInt32Slot(2, interval, 0)               # interval
+    builder.PrependUOffsetTRelativeSlot(3, variables, 0)   # variables
+    return builder.EndObject()
+
+
+def openmeteo_flatbuffer(query, blocks):
+    """
+    Size-prefixed WeatherApiResponse message as returned with format=flatbuffers.
+    blocks maps "current"/"daily"/"hourly" to (start_epoch, interval_s, [float32 arrays]).
+    """
+    import flatbuffers
+
+    slots = {"current": 9, "daily": 10, "hourly": 11}
+    builder = flatbuffers.Builder(1 << 20)
+    offsets = {
+        name: _variables_with_time(builder, start, interval, columns, single_value=(name == "current"))
+        for name, (start, interval, columns) in blocks.items()
+    }
+    builder.StartObject(12)
+    builder.PrependFloat32Slot(0, float(query.get("latitude", ["40.1164"])[0]), 0.0)
+    builder.PrependFloat32Slot(1, float(query.get("longitude", ["-88.2434"])[0]), 0.0)
+    builder.PrependInt32Slot(6, LOCAL_OFFSET_S, 0)   # utc_offset_seconds
+    for name, offset in offsets.items():
+        builder.PrependUOffsetTRelativeSlot(slots[name], offset, 0)
+    builder.Finish(builder.EndObject())
+    message = bytes(builder.Output())
+    return len(message).to_bytes(4, "little") + message
+
+
+# ---- Synthetic responses per upstream endpoint ----
+
+class SyntheticResponses:
+    """Generates deterministic responses for each collector endpoint"""
+
+    def __init__(self, sizes=None):
+        self.sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+        self._gtfs = None
+
+    def respond(self, host, path, query, headers):
+        """Return (status, content_type, body, extra_headers) or None if the endpoint is unknown"""
+        rng = np.random.default_rng(zlib.crc32(f"{host}{path}".encode()))
+        if host == "air-quality-api.open-meteo.com":
+            return self._open_meteo(query, rng, "hourly", 3600, self.sizes["aq_hours"])
+        if host == "archive-api.open-meteo.com":
+            return self._open_meteo(query, rng, "daily", 86400, self.sizes["weather_days"])
+        if host == "api.open-meteo.com":
+            return self._forecast(query, rng)
+        if host == "api.weather.gov" and path.startswith("/points/"):
+            forecast = "https://api.weather.gov/gridpoints/ILX/96,71/forecast/hourly"
+            return 200, "application/geo+json", json.dumps({"properties": {"forecastHourly": forecast}}).encode(), {}
+        if host == "api.weather.gov" and path.endswith("/forecast/hourly"):
+            return self._nws_hourly(rng)
+        if host == "api.openaq.org" and path.endswith("/measurements"):
+            return self._openaq(query, rng)
+        if host == "developer.mtd.org" and path.endswith(".zip"):
+            return self._gtfs_zip(headers)
+        return None
+
+    def _open_meteo(self, query, rng, block, interval, n):
+        # The last n intervals of the requested range, like a real archive ending today
+        if "end_date" in query:
+            start = _epoch(query["end_date"][0]) - LOCAL_OFFSET_S + 86400 - n * interval
+        else:
+            start = _epoch(query["start_date"][0]) - LOCAL_OFFSET_S if "start_date" in query else 0
+        times = start + np.arange(n, dtype=np.int64) * interval
+        blocks = {block: (start, interval, [_series(name, times, rng, hourly=interval < 86400)
+                                            for name in _list_param(query, block)])}
+        if "current" in query:
+            now = int(time.time())
+            blocks["current"] = (now, 900, [_series(name, [now], rng, hourly=True)
+                                            for name in _list_param(query, "current")])
+        return 200, "application/octet-stream", openmeteo_flatbuffer(query, blocks), {}
+
+    def _forecast(self, query, rng):
+        n = self.sizes["forecast_hours"]
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        hourly = {"time": [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(n)]}
+        for name in _list_param(query, "hourly"):
+            values = _series(name, _hours(start, n), rng, hourly=True)
+            # Codes and percentages are integers in the real API
+            if name in INTEGER_VARIABLES:
+                hourly[name] = np.round(values).astype(int).tolist()
+            else:
+                hourly[name] = np.round(values, 2).tolist()
+        body = {"latitude": 40.1164, "longitude": -88.2434, "timezone": "America/Chicago", "hourly": hourly}
+        return 200, "application/json", json.dumps(body).encode(), {}
+
+    def _nws_hourly(self, rng):
+        n = self.sizes["nws_periods"]
+        start = datetime.now(timezone(timedelta(hours=-6))).replace(minute=0, second=0, microsecond=0)
+        temps = _series("temperature", _hours(start, n), rng, hourly=True)
+        periods = [{
+            "number": i + 1,
+            "startTime": (start + timedelta(hours=i)).isoformat(),
+            "endTime": (start + timedelta(hours=i + 1)).isoformat(),
+            "temperature": int(temps[i]),
+            "windSpeed": f"{int(rng.integers(0, 20))} mph",
+            "shortForecast": ["Sunny", "Partly Cloudy", "Chance Rain Showers"][i % 3],
+        } for i in range(n)]
+        return 200, "application/geo+json", json.dumps({"properties": {"periods": periods}}).encode(), {}
+
+    def _openaq(self, query, rng):
+        total = self.sizes["openaq_rows"]
+        page = int(query.get("page", ["1"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        first, last = (page - 1) * limit, min(page * limit, total)
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        values = _series("pm2_5", _hours(start + timedelta(hours=first), max(last - first, 0)), rng, hourly=True)
+        results = []
+        for i, value in zip(range(first, last), values):
+            t0, t1 = start + timedelta(hours=i), start + timedelta(hours=i + 1)
+            span = {"datetimeFrom": {"utc": t0.isoformat().replace("+00:00", "Z"), "local": t0.isoformat()},
+                    "datetimeTo": {"utc": t1.isoformat().replace("+00:00", "Z"), "local": t1.isoformat()}}
+            results.append({
+                "value": float(value),
+                "flagInfo": {"hasFlags": False},
+                "parameter": {"id": 2, "name": "pm25", "units": "µg/m³", "displayName": None},
+                "period": {"label": "raw", "interval": "01:00:00", **span},
+                "coordinates": None,
+                "summary": None,
+                "coverage": {"expectedCount": 1, "expectedInterval": "01:00:00", "observedCount": 1,
+                             "observedInterval": "01:00:00", "percentComplete": 100.0,
+                             "percentCoverage": 100.0, **span},
+            })
+        body = {"meta": {"name": "openaq-api", "website": "/", "page": page, "limit": limit, "found": total},
+                "results": results}
+        # The OpenAQ client throttles itself on these headers, so never report exhaustion
+        rate_limit = {"x-ratelimit-limit": "60", "x-ratelimit-remaining": "59", "x-ratelimit-reset": "60"}
+        return 200, "application/json", json.dumps(body).encode(), rate_limit
+
+    def _gtfs_zip(self, headers):
+        if self._gtfs is None:
+            self._gtfs = build_gtfs_zip(self.sizes)
+        etag = '"%s"' % hashlib.sha1(self._gtfs).hexdigest()
+        if headers.get("If-None-Match") == etag:
+            return 304, "application/zip", b"", {"ETag": etag}
+        return 200, "application/zip", self._gtfs, {"ETag": etag}
+
+
+def build_gtfs_zip(sizes):
+    """Synthetic GTFS feed with the members transit.py loads"""
+    sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+    rng = np.random.default_rng(7)
+    n_stops, n_trips = sizes["gtfs_stops"], sizes["gtfs_trips"]
+    per_trip, shape_points = sizes["gtfs_stops_per_trip"], sizes["gtfs_shape_points"]
+    n_routes, n_shapes = 30, 60
+
+    def table(header, rows):
+        out = io.StringIO()
+        out.write(",".join(header) + "\n")
+        for row in rows:
+            out.write(",".join(str(v) for v in row) + "\n")
+        return out.getvalue()
+
+    lats = 40.09 + rng.random(n_stops) * 0.05
+    lons = -88.27 + rng.random(n_stops) * 0.08
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("stops.txt", table(
+            ["stop_id", "stop_code", "stop_name", "stop_lat", "stop_lon"],
+            ((f"S{i}", 1000 + i, f"Stop {i}", f"{lats[i]:.6f}", f"{lons[i]:.6f}") for i in range(n_stops))))
+        z.writestr("routes.txt", table(
+            ["route_id", "agency_id", "route_short_name", "route_long_name", "route_type"],
+            ((f"R{i}", "MTD", i + 1, f"Route {i + 1}", 3) for i in range(n_routes))))
+        z.writestr("trips.txt", table(
+            ["route_id", "service_id", "trip_id", "direction_id", "shape_id"],
+            ((f"R{i % n_routes}", f"SV{i % 3}", f"T{i}", i % 2, f"SH{i % n_shapes}") for i in range(n_trips))))
+        z.writestr("stop_times.txt", table(
+            ["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"],
+            ((f"T{t}", f"{6 + (t + s) // 60 % 18:02d}:{(t + s) % 60:02d}:00",
+              f"{6 + (t + s) // 60 % 18:02d}:{(t + s) % 60:02d}:00", f"S{(t * 7 + s) % n_stops}", s + 1)
+             for t in range(n_trips) for s in range(per_trip))))
+        z.writestr("shapes.txt", table(
+            ["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"],
+            ((f"SH{sh}", f"{40.09 + p * 1e-4:.6f}", f"{-88.27 + sh * 1e-3:.6f}", p + 1)
+             for sh in range(n_shapes) for p in range(shape_points))))
+        z.writestr("calendar.txt", table(
+            ["service_id", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+             "start_date", "end_date"],
+            ((f"SV{i}", 1, 1, 1, 1, 1, int(i > 0), int(i > 1), "20250101", "20251231") for i in range(3))))
+        z.writestr("calendar_dates.txt", table(
+            ["service_id", "date", "exception_type"], [("SV0", "20250704", 2), ("SV2", "20250704", 1)]))
+    return buf.getvalue()
+
+
+def write_ndvi_csvs(folder, sizes=None):
+    """Write synthetic monthly NDVI exports in the Earth Engine CSV layout"""
+    sizes = dict(DEFAULT_SIZES, **(sizes or {}))
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(11)
+    side = int(np.ceil(np.sqrt(sizes["ndvi_cells"])))
+    lat, lon = np.meshgrid(40.09 + np.arange(side) * 0.0009, -88.25 + np.arange(side) * 0.0012)
+    lat, lon = lat.ravel()[:sizes["ndvi_cells"]], lon.ravel()[:sizes["ndvi_cells"]]
+    base = rng.random(lat.size) * 0.5
+    for i in range(sizes["ndvi_months"]):
+        year, month = 2016 + i // 12, i % 12 + 1
+        ndvi = base + 0.3 * np.sin((month - 4) * np.pi / 6) + rng.normal(0, 0.03, lat.size)
+        path = os.path.join(folder, f"uiuc_ndvi_{year}_{month:02d}.csv")
+        with open(path, "w") as f:
+            f.write("system:index,lat,lon,month,ndvi,year,.geo\n")
+            for j in range(lat.size):
+                f.write(f"{j},{lat[j]:.7f},{lon[j]:.7f},{month},{ndvi[j]:.6f},{year},\n")
+
+
+# ---- Server ----
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = parse_qs(parts.query)
+
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+
+        cassette = self.server.cassette_path(host, path, parts.query)
+        if self.server.record_dir:
+            result = self.server.record(host, path, parts.query, self.headers, cassette)
+        elif cassette and os.path.exists(cassette + ".body"):
+            result = self.server.load_cassette(cassette)
+        else:
+            result = self.server.synthetic.respond(host, path, query, self.headers)
+
+        if result is None:
+            result = 404, "application/json", json.dumps({"detail": f"no replay for {host}{path}"}).encode(), {}
+        status, content_type, body, extra_headers = result
+
+        # Compress like the real services do, so clients pay the same decode cost
+        if len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", "") and content_type != "application/zip":
+            body = gzip.compress(body, compresslevel=5)
+            extra_headers = dict(extra_headers, **{"Content-Encoding": "gzip"})
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP server replaying cassettes or synthetic responses for the collectors"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, sizes=None,
+                 cassette_dir=None, record_dir=None, verbose=False):
+        super().__init__((host, port), _ReplayHandler)
+        self.latency_s = latency_ms / 1000.0
+        self.synthetic = SyntheticResponses(sizes)
+        self.cassette_dir = record_dir or cassette_dir
+        self.record_dir = record_dir
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def cassette_path(self, host, path, query_string):
+        if not self.cassette_dir:
+            return None
+        query = "&".join(sorted(q for q in query_string.split("&")
+                                if q and q.partition("=")[0] not in UNKEYED_PARAMS))
+        key = hashlib.sha1(query.encode()).hexdigest()[:16]
+        return os.path.join(self.cassette_dir, host, path.strip("/").replace("/", "_") or "_", key)
+
+    def load_cassette(self, cassette):
+        with open(cassette + ".json") as f:
+            meta = json.load(f)
+        with open(cassette + ".body", "rb") as f:
+            body = f.read()
+        return meta["status"], meta["content_type"], body, {}
+
+    def record(self, host, path, query_string, headers, cassette):
+        url = f"https://{host}{path}" + (f"?{query_string}" if query_string else "")
+        forward = {k: v for k, v in headers.items() if k.lower() in ("user-agent", "accept", "x-api-key")}
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=forward), timeout=120) as resp:
+                status, content_type, body = resp.status, resp.headers.get("Content-Type", ""), resp.read()
+        except urllib.error.HTTPError as e:
+            # Upstream errors (bad parameters, rate limits) are recorded and replayed like any response
+            with e:
+                status, content_type, body = e.code, e.headers.get("Content-Type", ""), e.read()
+        os.makedirs(os.path.dirname(cassette), exist_ok=True)
+        with open(cassette + ".body", "wb") as f:
+            f.write(body)
+        with open(cassette + ".json", "w") as f:
+            json.dump({"url": url.split("?")[0], "status": status, "content_type": content_type}, f)
+        return status, content_type, body, {}
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_sizes(items):
+    sizes = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        if name not in DEFAULT_SIZES:
+            raise SystemExit(f"Unknown size {name!r}, expected one of {', '.join(DEFAULT_SIZES)}")
+        sizes[name] = int(value)
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic API responses for the collectors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--size", action="append", metavar="NAME=N", help="synthetic response size override")
+    parser.add_argument("--cassettes", help="directory of recorded responses to replay")
+    parser.add_argument("--record", help="proxy to the real APIs and record cassettes into this directory")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.host, args.port, args.latency_ms, parse_sizes(args.size),
+                          args.cassettes, args.record, args.verbose)
+    print(f"Replay server on {server.url} - export {REPLAY_ENV}={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,125 @@
+"""
+Daily / weekly / monthly rollups of the air quality tables.
+
+Each rollup row holds n, sum, min, max and sum of squares for one metric and bucket,
+so means and variances of any set of buckets can be merged exactly:
+
+    mean = sum(sum) / sum(n)        var = sum(sumsq) / sum(n) - mean^2
+
+Buckets follow local (America/Chicago) calendar days; `bucket` is the epoch of 00:00 UTC
+on the local start date of the day, week (Monday) or month, like weather_daily.ts.
+
+Rollups are refreshed incrementally: only the buckets overlapping keys written since the
+last refresh (ingest_log, see storage.py) are recomputed from the raw rows.
+
+    python rollups.py            # catch up after an ingest
+    python rollups.py --full     # rebuild everything
+"""
+import argparse
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from storage import AQ_COLUMNS, LOCAL_TZ, create_schema, mark_caught_up, pending_since
+
+PERIODS = ("day", "week", "month")
+
+# source -> SQL returning raw rows with ts >= ?, either wide (ts, metric columns...)
+# or long (ts, metric, value)
+SOURCES = {
+    "air_quality": f"SELECT ts, {', '.join(AQ_COLUMNS)} FROM aq_hourly WHERE ts >= ?",
+    "openaq": "SELECT ts, parameter AS metric, value FROM openaq_measurements WHERE ts >= ?",
+}
+
+
+def read_wide(conn, source, start):
+    """Raw rows from start on as a ts-indexed frame with one column per metric"""
+    df = pd.read_sql_query(SOURCES[source], conn, params=(start,), index_col="ts")
+    if list(df.columns) == ["metric", "value"]:
+        df = df.pivot(columns="metric", values="value")
+    return df.astype("float64")
+
+
+def create_rollup_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS aq_rollups (
+        source TEXT NOT NULL, period TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL, sum REAL, min REAL, max REAL, sumsq REAL,
+        PRIMARY KEY (source, period, metric, bucket)
+    ) WITHOUT ROWID
+    """)
+
+
+def bucket_keys(ts):
+    """UTC epoch seconds -> {period: bucket key} arrays on local calendar boundaries"""
+    local = pd.Series(pd.to_datetime(ts, unit="s", utc=True)).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    day = local.dt.normalize()
+    starts = {"day": day, "week": day - pd.to_timedelta(day.dt.weekday, unit="D"),
+              "month": day - pd.to_timedelta(day.dt.day - 1, unit="D")}
+    epoch = pd.Timestamp("1970-01-01")
+    return {p: ((s - epoch) // pd.Timedelta(seconds=1)).to_numpy(np.int64) for p, s in starts.items()}
+
+
+def stale_buckets(since):
+    """
+    For keys written from `since` on: the first stale bucket of each period, and the raw
+    key to re-read from (local midnight starting the earliest of them) so each is
+    recomputed whole
+    """
+    first = {p: int(k[0]) for p, k in bucket_keys(np.array([since])).items()}
+    start = pd.Timestamp(min(first.values()), unit="s").tz_localize(LOCAL_TZ)
+    return first, int(start.timestamp())
+
+
+def refresh_rollups(conn, source, full=False):
+    """Recompute the rollup buckets of source that changed since the last refresh. Returns rows written."""
+    create_schema(conn)
+    create_rollup_tables(conn)
+    since, version = pending_since(conn, "aq_rollups", source)
+    if full:
+        since = float("-inf")
+    if since is None:
+        return 0
+
+    if since == float("-inf"):
+        first, start = dict.fromkeys(PERIODS, -(2 ** 62)), -(2 ** 62)
+    else:
+        first, start = stale_buckets(since)
+    raw = read_wide(conn, source, start)
+    written = 0
+    with conn:
+        if len(raw):
+            keys = bucket_keys(raw.index.to_numpy())
+            squares = raw ** 2
+            for period in PERIODS:
+                # Earlier buckets of this period may be only partly covered by raw; they didn't change
+                mask = keys[period] >= first[period]
+                by_bucket = raw[mask].groupby(keys[period][mask])
+                stats = pd.concat({
+                    "n": by_bucket.count(), "sum": by_bucket.sum(), "min": by_bucket.min(),
+                    "max": by_bucket.max(), "sumsq": squares[mask].groupby(keys[period][mask]).sum(),
+                }, axis=1).stack(level=1, future_stack=True)
+                stats = stats[stats["n"] > 0]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO aq_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(source, period, m, int(b), int(n), s, lo, hi, sq)
+                     for (b, m), n, s, lo, hi, sq in zip(stats.index, *(stats[c].tolist() for c in
+                                                                         ("n", "sum", "min", "max", "sumsq")))])
+                written += len(stats)
+        mark_caught_up(conn, "aq_rollups", source, version)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the air quality rollup tables")
+    parser.add_argument("--db", default="campus_data.db")
+    parser.add_argument("--full", action="store_true", help="rebuild all buckets instead of catching up")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        for source in SOURCES:
+            print(f"{source}: {refresh_rollups(conn, source, args.full)} rollup rows written")
+    finally:
+        conn.close()
@@ -0,0 +1,117 @@
+"""
+Mergeable quantile sketches (DDSketch) of the air quality tables.
+
+For every metric and local day / month bucket, aq_sketches stores a histogram of the
+values on logarithmic bins of ratio GAMMA = (1 + ALPHA) / (1 - ALPHA). Any quantile read
+back from one or many merged sketches is within ALPHA (1%) relative error of the exact
+value, and merging is exact (bin counts add), so percentiles over any date range are
+answered by merging a few month sketches plus day sketches at the edges.
+
+Sketch blob layout (little-endian):
+
+    uint32 zero_count, float64 min, float64 max     values <= MIN_VALUE count as zero
+    int16  keys[n]                                  bin k holds (GAMMA^(k-1), GAMMA^k]
+    uint32 counts[n]
+
+Buckets follow the rollup keys (see rollups.py) and are refreshed incrementally the
+same way, from ingest_log.
+
+    python sketches.py           # catch up after an ingest
+    python sketches.py --full    # rebuild everything
+"""
+import argparse
+import sqlite3
+import struct
+
+import numpy as np
+
+from rollups import SOURCES, bucket_keys, read_wide, stale_buckets
+from storage import create_schema, mark_caught_up, pending_since
+
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+MIN_VALUE = 1e-9
+PERIODS = ("day", "month")
+HEADER = struct.Struct("<Idd")
+
+
+def create_sketch_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS aq_sketches (
+        source TEXT NOT NULL, period TEXT NOT NULL, metric TEXT NOT NULL, bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL, sketch BLOB NOT NULL,
+        PRIMARY KEY (source, period, metric, bucket)
+    ) WITHOUT ROWID
+    """)
+
+
+def bin_keys(values):
+    """Vectorized value -> DDSketch bin key; values <= MIN_VALUE get no key (-32768)"""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keys = np.ceil(np.log(values) / np.log(GAMMA))
+    return np.where(values > MIN_VALUE, keys, -32768).astype(np.int16)
+
+
+def encode(keys, counts, zero_count, lo, hi):
+    return (HEADER.pack(int(zero_count), float(lo), float(hi))
+            + np.asarray(keys, dtype="<i2").tobytes() + np.asarray(counts, dtype="<u4").tobytes())
+
+
+def refresh_sketches(conn, source, full=False):
+    """Rebuild the sketches of source's buckets that changed since the last refresh. Returns rows written."""
+    create_schema(conn)
+    create_sketch_table(conn)
+    since, version = pending_since(conn, "aq_sketches", source)
+    if full:
+        since = float("-inf")
+    if since is None:
+        return 0
+
+    if since == float("-inf"):
+        first, start = dict.fromkeys(PERIODS, -(2 ** 62)), -(2 ** 62)
+    else:
+        first, start = stale_buckets(since)
+    raw = read_wide(conn, source, start)
+    written = 0
+    with conn:
+        if len(raw):
+            keys = bucket_keys(raw.index.to_numpy())
+            # One row per (time, metric) value
+            long = raw.reset_index(drop=True).melt(var_name="metric", ignore_index=False).dropna()
+            for period in PERIODS:
+                long["bucket"] = keys[period][long.index.to_numpy()]
+                current = long[long["bucket"] >= first[period]]
+                current = current.assign(key=bin_keys(current["value"].to_numpy()))
+                # Sorted by (bucket, metric, key), so each sketch is one contiguous run and
+                # its zero bin (key -32768) comes first
+                bins = current.groupby(["bucket", "metric", "key"]).size()
+                extremes = current.groupby(["bucket", "metric"])["value"].agg(["min", "max", "size"])
+                b, m, k = (bins.index.get_level_values(i).to_numpy() for i in range(3))
+                counts = bins.to_numpy()
+                starts = np.flatnonzero(np.r_[True, (b[1:] != b[:-1]) | (m[1:] != m[:-1])])
+                rows = []
+                for i, j, (bucket, metric), (lo, hi, n) in zip(
+                        starts, np.r_[starts[1:], len(b)], extremes.index, extremes.itertuples(index=False)):
+                    has_zero = int(k[i] == -32768)
+                    zero = int(counts[i]) if has_zero else 0
+                    rows.append((source, period, metric, int(bucket), int(n),
+                                 encode(k[i + has_zero:j], counts[i + has_zero:j], zero, lo, hi)))
+                conn.executemany("INSERT OR REPLACE INTO aq_sketches VALUES (?, ?, ?, ?, ?, ?)", rows)
+                written += len(rows)
+        mark_caught_up(conn, "aq_sketches", source, version)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the air quality quantile sketches")
+    parser.add_argument("--db", default="campus_data.db")
+    parser.add_argument("--full", action="store_true", help="rebuild all buckets instead of catching up")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        for source in SOURCES:
+            print(f"{source}: {refresh_sketches(conn, source, args.full)} sketch rows written")
+    finally:
+        conn.close()
@@ -0,0 +1,256 @@
+"""
+Typed storage schema for the time-series tables in campus_data.db.
+
+Rows are keyed by integer epoch seconds in WITHOUT ROWID tables, so the primary key
+is the clustered order on disk and range scans / ORDER BY never compare strings.
+Columns the API doesn't serve (pollen, methane, dust, sunrise, ...) live in *_extra
+side tables with the same key, which keeps the hot rows narrow.
+
+    aq_hourly / aq_hourly_extra        hourly Open-Meteo air quality, ts = UTC epoch seconds
+    weather_daily / weather_daily_extra daily Open-Meteo archive, ts = epoch of 00:00 UTC
+                                        on the local calendar date
+    openaq_measurements                OpenAQ sensor values, ts = UTC epoch seconds
+    ingest_state                       per-source watermark and version counter
+    ingest_log / derived_state         key range written by each ingest, and the last version
+                                       each derived table (rollups.py, ...) has caught up with
+
+The old table names (historical_air_quality_data, ...) are recreated as views over the
+typed tables for notebooks and ad-hoc queries.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+LOCAL_TZ = "America/Chicago"
+CHUNK_SIZE = 20000
+
+AQ_COLUMNS = [
+    "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "sulphur_dioxide", "ozone", "carbon_dioxide",
+    "us_aqi", "us_aqi_pm2_5", "us_aqi_pm10", "us_aqi_nitrogen_dioxide", "us_aqi_ozone",
+    "us_aqi_sulphur_dioxide", "us_aqi_carbon_monoxide",
+]
+AQ_EXTRA_COLUMNS = [
+    "ammonia", "aerosol_optical_depth", "methane", "dust", "uv_index", "uv_index_clear_sky",
+    "alder_pollen", "birch_pollen", "grass_pollen", "mugwort_pollen", "olive_pollen", "ragweed_pollen",
+]
+
+WEATHER_COLUMNS = [
+    "weather_code", "temperature_2m_max", "temperature_2m_min", "apparent_temperature_max",
+    "apparent_temperature_min", "precipitation_sum", "rain_sum", "snowfall_sum", "precipitation_hours",
+    "wind_speed_10m_max", "wind_gusts_10m_max", "wind_direction_10m_dominant", "shortwave_radiation_sum",
+    "et0_fao_evapotranspiration",
+]
+WEATHER_EXTRA_COLUMNS = ["sunrise", "sunset", "sunshine_duration", "daylight_duration"]
+
+INTEGER_COLUMNS = {"weather_code"}
+
+# table -> (columns, legacy table name, legacy timestamp column)
+TYPED_TABLES = {
+    "aq_hourly": (AQ_COLUMNS, "historical_air_quality_data", "date"),
+    "aq_hourly_extra": (AQ_EXTRA_COLUMNS, "historical_air_quality_data", "date"),
+    "weather_daily": (WEATHER_COLUMNS, "historical_weather_data", "date"),
+    "weather_daily_extra": (WEATHER_EXTRA_COLUMNS, "historical_weather_data", "date"),
+}
+
+# Timestamps as text for the compatibility views
+AQ_TIME_SQL = "strftime('%Y-%m-%dT%H:%M:%SZ', {ts}, 'unixepoch')"
+DAY_SQL = "strftime('%Y-%m-%d', {ts}, 'unixepoch')"
+
+
+def create_schema(conn):
+    """Create the typed tables and ingest_state if they don't exist"""
+    for table, (columns, _, _) in TYPED_TABLES.items():
+        column_sql = ", ".join(f"{c} {'INTEGER' if c in INTEGER_COLUMNS else 'REAL'}" for c in columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (ts INTEGER PRIMARY KEY, {column_sql}) WITHOUT ROWID")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS openaq_measurements (
+        ts INTEGER NOT NULL, parameter TEXT NOT NULL, value REAL,
+        PRIMARY KEY (ts, parameter)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        source TEXT PRIMARY KEY, watermark INTEGER, version INTEGER NOT NULL DEFAULT 0, updated_at INTEGER
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        source TEXT NOT NULL, version INTEGER NOT NULL, low INTEGER, high INTEGER, logged_at INTEGER,
+        PRIMARY KEY (source, version)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS derived_state (
+        name TEXT NOT NULL, source TEXT NOT NULL, version INTEGER NOT NULL,
+        PRIMARY KEY (name, source)
+    ) WITHOUT ROWID
+    """)
+
+
+def create_compat_views(conn):
+    """Recreate the legacy table names as views, unless a real table still has the name"""
+    existing = dict(conn.execute("SELECT name, type FROM sqlite_master").fetchall())
+    views = {
+        "historical_air_quality_data": f"""
+            SELECT {AQ_TIME_SQL.format(ts='a.ts')} AS date, a.ts, {', '.join('a.' + c for c in AQ_COLUMNS)},
+                   {', '.join('e.' + c for c in AQ_EXTRA_COLUMNS)}
+            FROM aq_hourly a LEFT JOIN aq_hourly_extra e ON e.ts = a.ts""",
+        "historical_weather_data": f"""
+            SELECT {DAY_SQL.format(ts='w.ts')} AS date, w.ts, {', '.join('w.' + c for c in WEATHER_COLUMNS)},
+                   {', '.join('e.' + c for c in WEATHER_EXTRA_COLUMNS)}
+            FROM weather_daily w LEFT JOIN weather_daily_extra e ON e.ts = w.ts""",
+        "historical_aq_openaq": f"""
+            SELECT value, parameter AS parameter_name, {AQ_TIME_SQL.format(ts='ts')} AS datetime_utc, ts
+            FROM openaq_measurements""",
+    }
+    for name, select in views.items():
+        if existing.get(name) == "table":
+            continue
+        conn.execute(f"DROP VIEW IF EXISTS {name}")
+        conn.execute(f"CREATE VIEW {name} AS {select}")
+
+
+def to_epoch(timestamps):
+    """tz-aware (or UTC-naive) timestamps -> int64 epoch seconds"""
+    ts = pd.Series(pd.to_datetime(timestamps, utc=True))
+    return ((ts - pd.Timestamp("1970-01-01", tz="UTC")) // pd.Timedelta(seconds=1)).to_numpy(np.int64)
+
+
+def to_day_epoch(timestamps, tz=LOCAL_TZ):
+    """Timestamps -> epoch seconds of 00:00 UTC on their local calendar date"""
+    ts = pd.Series(pd.to_datetime(timestamps, utc=True)).dt.tz_convert(tz)
+    days = ts.dt.tz_localize(None).dt.normalize()
+    return ((days - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).to_numpy(np.int64)
+
+
+def _rows(ts, df, columns):
+    """Yield (ts, *values) tuples with NaN/missing columns as NULL"""
+    values = []
+    for column in columns:
+        if column in df:
+            col = pd.to_numeric(df[column], errors="coerce").astype("float64").to_numpy()
+            values.append([None if np.isnan(v) else v for v in col.tolist()])
+        else:
+            values.append([None] * len(ts))
+    return zip(ts.tolist(), *values)
+
+
+def _upsert(conn, table, columns, rows):
+    sql = f"INSERT OR REPLACE INTO {table} (ts, {', '.join(columns)}) VALUES ({', '.join(['?'] * (len(columns) + 1))})"
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def _first_changed(conn, table, columns, rows):
+    """Oldest ts among rows (ts, *values) that are new or differ from what table holds, or None"""
+    if not rows:
+        return None
+    lo, hi = min(r[0] for r in rows), max(r[0] for r in rows)
+    existing = {r[0]: r[1:] for r in conn.execute(
+        f"SELECT ts, {', '.join(columns)} FROM {table} WHERE ts BETWEEN ? AND ?", (lo, hi))}
+    changed = [r[0] for r in rows if existing.get(r[0]) != tuple(r[1:])]
+    return min(changed) if changed else None
+
+
+def _write_wide(conn, source, ts, df, tables):
+    """Upsert into (table, columns) pairs sharing the ts key; the ingest is only logged
+    (and the data version bumped) when some row actually changed"""
+    lows = []
+    for table, columns in tables:
+        rows = list(_rows(ts, df, columns))
+        lows.append(_first_changed(conn, table, columns, rows))
+        _upsert(conn, table, columns, rows)
+    lows = [low for low in lows if low is not None]
+    if lows:
+        bump_ingest_state(conn, source, ts.max(), min(lows))
+
+
+def bump_ingest_state(conn, source, watermark, low=None):
+    """
+    Record a committed ingest: advance the watermark, bump the data version and log
+    the key range written (low..watermark) for derived tables to catch up from
+    """
+    now = int(time.time())
+    conn.execute("""
+    INSERT INTO ingest_state (source, watermark, version, updated_at) VALUES (?, ?, 1, ?)
+    ON CONFLICT (source) DO UPDATE SET
+        watermark = max(coalesce(watermark, 0), excluded.watermark),
+        version = version + 1,
+        updated_at = excluded.updated_at
+    """, (source, int(watermark), now))
+    version = conn.execute("SELECT version FROM ingest_state WHERE source = ?", (source,)).fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO ingest_log VALUES (?, ?, ?, ?, ?)",
+                 (source, version, int(watermark if low is None else low), int(watermark), now))
+
+
+def pending_since(conn, name, source):
+    """
+    Oldest key written to source since the derived table `name` last caught up, and the
+    version to record once it has: (low, version). low is None when nothing is pending.
+    """
+    create_schema(conn)
+    current = conn.execute("SELECT version FROM ingest_state WHERE source = ?", (source,)).fetchone()
+    if current is None:
+        return None, 0
+    done = conn.execute("SELECT version FROM derived_state WHERE name = ? AND source = ?", (name, source)).fetchone()
+    if done is None:
+        # Never built: everything is pending
+        return float("-inf"), current[0]
+    low = conn.execute("SELECT min(low) FROM ingest_log WHERE source = ? AND version > ?",
+                       (source, done[0])).fetchone()[0]
+    return low, current[0]
+
+
+def mark_caught_up(conn, name, source, version):
+    conn.execute("INSERT OR REPLACE INTO derived_state VALUES (?, ?, ?)", (name, source, int(version)))
+
+
+def write_air_quality(conn, df, time_column="date"):
+    """Upsert hourly air quality rows (a DataFrame with a timestamp column) into aq_hourly(+_extra)"""
+    ts = to_epoch(df[time_column])
+    with conn:
+        create_schema(conn)
+        _write_wide(conn, "air_quality", ts, df,
+                    [("aq_hourly", AQ_COLUMNS), ("aq_hourly_extra", AQ_EXTRA_COLUMNS)])
+        create_compat_views(conn)
+    return len(ts)
+
+
+def write_weather_daily(conn, df, time_column="date"):
+    """Upsert daily weather rows into weather_daily(+_extra)"""
+    ts = to_day_epoch(df[time_column])
+    with conn:
+        create_schema(conn)
+        _write_wide(conn, "weather", ts, df,
+                    [("weather_daily", WEATHER_COLUMNS), ("weather_daily_extra", WEATHER_EXTRA_COLUMNS)])
+        create_compat_views(conn)
+    return len(ts)
+
+
+def write_openaq(conn, df):
+    """Upsert OpenAQ measurements (value, parameter_name, datetime_utc) into openaq_measurements"""
+    df = df.dropna(subset=["datetime_utc"])
+    ts = to_epoch(df["datetime_utc"])
+    rows = [(t, p, None if np.isnan(v) else v) for t, p, v in zip(
+        ts.tolist(), df["parameter_name"].astype(str).tolist(),
+        pd.to_numeric(df["value"], errors="coerce").astype("float64").tolist())]
+    with conn:
+        create_schema(conn)
+        changed = []
+        if rows:
+            existing = dict(((t, p), v) for t, p, v in conn.execute(
+                "SELECT ts, parameter, value FROM openaq_measurements WHERE ts BETWEEN ? AND ?",
+                (int(ts.min()), int(ts.max()))))
+            changed = [t for t, p, v in rows if (t, p) not in existing or existing[(t, p)] != v]
+        conn.executemany("INSERT OR REPLACE INTO openaq_measurements (ts, parameter, value) VALUES (?, ?, ?)", rows)
+        if changed:
+            bump_ingest_state(conn, "openaq", ts.max(), min(changed))
+        create_compat_views(conn)
+    return len(ts)
@@ -0,0 +1,89 @@
+"""
+Build a complete campus_data.db from synthetic data at a chosen scale.
+
+Every collector runs against a ReplayServer (see replay.py) in a scratch directory, so
+the result has exactly the tables, indexes and derived tables (rollups, sketches,
+climatology, NDVI rasters, stop R*Tree) the real pipeline produces, only sized by the
+options below. Pair it with backend/bench_api.py to measure how the API scales.
+
+    python synthetic_db.py --out /tmp/campus_1y.db --aq-years 1
+    python synthetic_db.py --out /tmp/campus_big.db --aq-years 10 --weather-years 85 \\
+        --ndvi-cells 10000 --ndvi-months 120 --stops 5000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_ingest import COLLECTORS, HERE
+from replay import REPLAY_ENV, ReplayServer, parse_sizes, write_ndvi_csvs
+
+
+def scaled_sizes(aq_years, weather_years, ndvi_cells, ndvi_months, stops, overrides=None):
+    """Replay response sizes for a dataset of the given scale"""
+    hours = int(aq_years * 24 * 365)
+    sizes = {"aq_hours": hours, "openaq_rows": hours, "weather_days": int(weather_years * 365),
+             "ndvi_cells": ndvi_cells, "ndvi_months": ndvi_months, "gtfs_stops": stops}
+    sizes.update(overrides or {})
+    return sizes
+
+
+def table_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE '%rtree_%' ORDER BY name")]
+        return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+    finally:
+        conn.close()
+
+
+def build(out, sizes):
+    """Run all collectors into a fresh database and move it to out"""
+    server = ReplayServer(sizes=sizes)
+    replay_url = server.start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="synthetic_db_") as workdir:
+            write_ndvi_csvs(os.path.join(workdir, "sigaida_ndvi_data"), sizes)
+            env = dict(os.environ, **{REPLAY_ENV: replay_url, "OPENAQ_KEY": "0" * 64,
+                                      "SIGAIDA_HTTP_CACHE": os.path.join(workdir, "http_cache.sqlite"),
+                                      "PYTHONPATH": os.pathsep.join(filter(None, [HERE, os.getenv("PYTHONPATH")]))})
+            for name, (args, _) in COLLECTORS.items():
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, os.path.join(HERE, args[0])] + args[1:], cwd=workdir,
+                                        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                if result.returncode:
+                    error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode
+                    raise SystemExit(f"{name} failed: {error}")
+                print(f"{name:<18}{time.perf_counter() - start:>8.1f} s", flush=True)
+            shutil.move(os.path.join(workdir, "campus_data.db"), out)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a synthetic campus_data.db at a configurable scale")
+    parser.add_argument("--out", default=os.path.join(tempfile.gettempdir(), "campus_synthetic.db"),
+                        help="database to write (replaced if it exists; default outside the source tree)")
+    parser.add_argument("--aq-years", type=float, default=3, help="years of hourly air quality and OpenAQ data")
+    parser.add_argument("--weather-years", type=float, default=85, help="years of daily weather history, ending today")
+    parser.add_argument("--ndvi-cells", type=int, default=1200, help="NDVI grid cells per month")
+    parser.add_argument("--ndvi-months", type=int, default=120, help="months of NDVI grids")
+    parser.add_argument("--stops", type=int, default=2500, help="GTFS stops")
+    parser.add_argument("--size", action="append", metavar="NAME=N", help="any other replay size (see replay.py)")
+    args = parser.parse_args()
+
+    sizes = scaled_sizes(args.aq_years, args.weather_years, args.ndvi_cells, args.ndvi_months, args.stops,
+                         parse_sizes(args.size))
+    if os.path.exists(args.out):
+        os.remove(args.out)
+    build(args.out, sizes)
+
+    print(f"\n{args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+    for table, rows in table_counts(args.out).items():
+        print(f"  {table:<32}{rows:>12}")
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pandas as pd
+
+from push_ndvi_data import load_ndvi
+
+
+def write_export(folder, name, cells, ndvi):
+    pd.DataFrame({
+        "year": 2024, "month": 6,
+        "lon": [lon for _, lon in cells], "lat": [lat for lat, _ in cells],
+        "ndvi": ndvi,
+    }).to_csv(folder / name, index=False)
+
+
+def test_repush_removes_missing_and_nan_cells(tmp_path):
+    folder = tmp_path / "exports"
+    folder.mkdir()
+    db_path = str(tmp_path / "campus_data.db")
+    cells = [(40.100, -88.230), (40.102, -88.228), (40.104, -88.226)]
+
+    write_export(folder, "uiuc_ndvi_2024_06.csv", cells, [0.5, 0.6, 0.7])
+    assert load_ndvi(str(folder), db_path, workers=1) == 3
+
+    # Re-exported: the second cell became NaN and the third dropped out
+    write_export(folder, "uiuc_ndvi_2024_06.csv", cells[:2], [0.55, None])
+    assert load_ndvi(str(folder), db_path, workers=1) == 1
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT lat, lon, ndvi FROM vegetation_data WHERE year = 2024 AND month = 6").fetchall()
+        (valid,) = conn.execute("SELECT valid_cells FROM ndvi_rasters WHERE year = 2024 AND month = 6").fetchone()
+    finally:
+        conn.close()
+    assert rows == [(40.100, -88.230, 0.55)]
+    assert valid == 1
+
+
+def test_restored_export_is_reloaded(tmp_path):
+    folder = tmp_path / "exports"
+    folder.mkdir()
+    db_path = str(tmp_path / "campus_data.db")
+    cells = [(40.100, -88.230), (40.102, -88.228)]
+
+    # A -> B -> A: the restored content was loaded before, but not as this file's latest
+    for ndvi in ([0.5, 0.6], [0.1, 0.2], [0.5, 0.6]):
+        write_export(folder, "uiuc_ndvi_2024_06.csv", cells, ndvi)
+        assert load_ndvi(str(folder), db_path, workers=1) == 2
+    assert load_ndvi(str(folder), db_path, workers=1) == 0
+
+    conn = sqlite3.connect(db_path)
+    try:
+        values = [row[0] for row in conn.execute("SELECT ndvi FROM vegetation_data ORDER BY lat")]
+    finally:
+        conn.close()
+    assert values == [0.5, 0.6]
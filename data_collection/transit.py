@@ -1,38 +1,230 @@
-import requests, zipfile, io, csv, sqlite3
+import argparse, csv, hashlib, io, os, sqlite3, tempfile, time, zipfile
 
-# Download MTD GTFS zip
+from http_client import download
+
+# MTD GTFS feed
 gtfs_url = "https://developer.mtd.org/gtfs/google_transit.zip"
-resp = requests.get(gtfs_url)
-resp.raise_for_status()
-z = zipfile.ZipFile(io.BytesIO(resp.content))
-
-# Parse stops.txt from GTFS
-stops_csv = csv.reader(io.TextIOWrapper(z.open("stops.txt"), encoding="utf-8"))
-headers = next(stops_csv)  # header row
-conn = sqlite3.connect("campus_data.db")
-cursor = conn.cursor()
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS transit_stops (
-    stop_id TEXT PRIMARY KEY, stop_name TEXT, stop_lat REAL, stop_lon REAL
-)
-""")
-for row in stops_csv:
-    stop_id, stop_name, stop_lat, stop_lon = row[0], row[2], row[4], row[5]
-    cursor.execute("INSERT OR IGNORE INTO transit_stops VALUES (?, ?, ?, ?)",
-                   (stop_id, stop_name, stop_lat, stop_lon))  # TODO: other values?
-
-# Parse routes.txt from GTFS
-routes_csv = csv.reader(io.TextIOWrapper(z.open("routes.txt"), encoding="utf-8"))
-next(routes_csv)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS transit_routes (
-    route_id TEXT PRIMARY KEY, route_short_name TEXT, route_long_name TEXT
-)
-""")
-for row in routes_csv:
-    route_id, short_name, long_name = row[0], row[2], row[3]
-    cursor.execute("INSERT OR IGNORE INTO transit_routes VALUES (?, ?, ?)",
-                   (route_id, short_name, long_name))
-
-conn.commit()
-conn.close()
+
+BATCH_SIZE = 5000
+
+# GTFS member -> (table, [(column, sqlite type)], primary key, extra indexes)
+# Columns are looked up by header name, so optional GTFS columns that are missing
+# from a feed are simply stored as NULL.
+GTFS_TABLES = {
+    "stops.txt": ("transit_stops", [
+        ("stop_id", "TEXT"), ("stop_code", "TEXT"), ("stop_name", "TEXT"), ("stop_desc", "TEXT"),
+        ("stop_lat", "REAL"), ("stop_lon", "REAL"), ("zone_id", "TEXT"), ("stop_url", "TEXT"),
+        ("location_type", "INTEGER"), ("parent_station", "TEXT"), ("wheelchair_boarding", "INTEGER"),
+    ], "stop_id", []),
+    "routes.txt": ("transit_routes", [
+        ("route_id", "TEXT"), ("agency_id", "TEXT"), ("route_short_name", "TEXT"),
+        ("route_long_name", "TEXT"), ("route_desc", "TEXT"), ("route_type", "INTEGER"),
+        ("route_url", "TEXT"), ("route_color", "TEXT"), ("route_text_color", "TEXT"),
+    ], "route_id", []),
+    "trips.txt": ("transit_trips", [
+        ("trip_id", "TEXT"), ("route_id", "TEXT"), ("service_id", "TEXT"), ("trip_headsign", "TEXT"),
+        ("direction_id", "INTEGER"), ("block_id", "TEXT"), ("shape_id", "TEXT"),
+    ], "trip_id", [("route_id",), ("service_id",), ("shape_id",)]),
+    "stop_times.txt": ("transit_stop_times", [
+        ("trip_id", "TEXT"), ("arrival_time", "TEXT"), ("departure_time", "TEXT"), ("stop_id", "TEXT"),
+        ("stop_sequence", "INTEGER"), ("pickup_type", "INTEGER"), ("drop_off_type", "INTEGER"),
+        ("shape_dist_traveled", "REAL"),
+    ], "trip_id, stop_sequence", [("stop_id", "departure_time")]),
+    "shapes.txt": ("transit_shapes", [
+        ("shape_id", "TEXT"), ("shape_pt_lat", "REAL"), ("shape_pt_lon", "REAL"),
+        ("shape_pt_sequence", "INTEGER"), ("shape_dist_traveled", "REAL"),
+    ], "shape_id, shape_pt_sequence", []),
+    "calendar.txt": ("transit_calendar", [
+        ("service_id", "TEXT"), ("monday", "INTEGER"), ("tuesday", "INTEGER"), ("wednesday", "INTEGER"),
+        ("thursday", "INTEGER"), ("friday", "INTEGER"), ("saturday", "INTEGER"), ("sunday", "INTEGER"),
+        ("start_date", "TEXT"), ("end_date", "TEXT"),
+    ], "service_id", []),
+    "calendar_dates.txt": ("transit_calendar_dates", [
+        ("service_id", "TEXT"), ("date", "TEXT"), ("exception_type", "INTEGER"),
+    ], "service_id, date", [("date",)]),
+}
+
+
+def create_tables(conn):
+    """Create the GTFS tables and the feed bookkeeping table if they don't exist"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gtfs_feed_state (
+        source TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT, loaded_at INTEGER
+    )
+    """)
+    for table, columns, primary_key, indexes in GTFS_TABLES.values():
+        # Tables from the old stops/routes-only loader have fewer columns; they are
+        # fully reloaded from the feed anyway, so just recreate them
+        existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if existing and existing != [name for name, _ in columns]:
+            conn.execute(f"DROP TABLE {table}")
+        column_sql = ", ".join(f"{name} {sqltype}" for name, sqltype in columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_sql}, PRIMARY KEY ({primary_key}))")
+        for index_cols in indexes:
+            index_name = f"idx_{table}_{'_'.join(index_cols)}"
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(index_cols)})")
+
+    # Spatial index for the nearest / radius / bounding box stop queries of the API
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS transit_stops_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+    """)
+    if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM transit_stops_rtree)").fetchone()[0]:
+        with conn:
+            build_stop_index(conn)
+
+
+def build_stop_index(conn):
+    """Rebuild the R*Tree over stop coordinates (transit_stops_rtree.id = transit_stops.rowid)"""
+    conn.execute("DELETE FROM transit_stops_rtree")
+    conn.execute("""
+    INSERT INTO transit_stops_rtree
+    SELECT rowid, stop_lat, stop_lat, stop_lon, stop_lon FROM transit_stops
+    WHERE stop_lat IS NOT NULL AND stop_lon IS NOT NULL
+    """)
+
+
+def get_feed_state(conn, source):
+    row = conn.execute("SELECT etag, last_modified, sha256 FROM gtfs_feed_state WHERE source = ?",
+                       (source,)).fetchone()
+    return {"etag": row[0], "last_modified": row[1], "sha256": row[2]} if row else {}
+
+
+def download_feed(url, state, dest):
+    """
+    Stream the feed into dest using a conditional GET.
+    Returns (etag, last_modified, sha256), or None if the server says the feed is unchanged.
+    """
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    digest = hashlib.sha256()
+
+    def write(chunk):
+        digest.update(chunk)
+        dest.write(chunk)
+
+    # Streamed through the shared client, bypassing its response cache (gtfs_feed_state
+    # already does the conditional GET for this one large body)
+    resp = download(url, write, headers=headers)
+    if resp.status_code == 304:
+        return None
+    resp.raise_for_status()
+    return resp.headers.get("etag"), resp.headers.get("last-modified"), digest.hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _convert(value, sqltype):
+    if value is None or value == "":
+        return None
+    if sqltype == "INTEGER":
+        return int(value)
+    if sqltype == "REAL":
+        return float(value)
+    return value
+
+
+def load_member(conn, z, member):
+    """Stream one GTFS CSV member from the zip into its table with executemany batches"""
+    table, columns, _, _ = GTFS_TABLES[member]
+    if member not in z.namelist():
+        return 0
+
+    with z.open(member) as raw:
+        # utf-8-sig strips the BOM some feeds put in front of the header row
+        reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+        header = [h.strip() for h in next(reader)]
+        positions = [header.index(name) if name in header else None for name, _ in columns]
+        types = [sqltype for _, sqltype in columns]
+
+        placeholders = ", ".join(["?"] * len(columns))
+        insert_sql = f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})"
+
+        count = 0
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            batch.append(tuple(
+                _convert(row[pos], sqltype) if pos is not None and pos < len(row) else None
+                for pos, sqltype in zip(positions, types)
+            ))
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany(insert_sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.executemany(insert_sql, batch)
+            count += len(batch)
+    return count
+
+
+def load_gtfs(source=gtfs_url, db_path="campus_data.db", force=False):
+    """
+    Load a GTFS feed (URL or local zip path) into SQLite.
+    The feed is skipped when the server answers 304 or its sha256 matches the last load.
+    Returns a dict of row counts per table, or None if the feed was unchanged.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        create_tables(conn)
+        state = {} if force else get_feed_state(conn, source)
+
+        with tempfile.TemporaryFile() as tmp:
+            if os.path.exists(source):
+                etag, last_modified, sha256 = None, None, hash_file(source)
+                zip_file = source
+            else:
+                result = download_feed(source, state, tmp)
+                if result is None:
+                    print("GTFS feed not modified (304), skipping")
+                    return None
+                etag, last_modified, sha256 = result
+                tmp.seek(0)
+                zip_file = tmp
+
+            if sha256 == state.get("sha256"):
+                # Same content under new validators: remember them so the next run gets a 304
+                with conn:
+                    conn.execute("UPDATE gtfs_feed_state SET etag = ?, last_modified = ? WHERE source = ?",
+                                 (etag, last_modified, source))
+                print("GTFS feed content unchanged, skipping")
+                return None
+
+            counts = {}
+            with zipfile.ZipFile(zip_file) as z, conn:
+                # A feed is a consistent snapshot, so replace all tables in one transaction
+                for member, (table, _, _, _) in GTFS_TABLES.items():
+                    conn.execute(f"DELETE FROM {table}")
+                    counts[table] = load_member(conn, z, member)
+                build_stop_index(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO gtfs_feed_state VALUES (?, ?, ?, ?, ?)",
+                    (source, etag, last_modified, sha256, int(time.time())),
+                )
+            conn.execute("ANALYZE")
+        return counts
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the MTD GTFS feed into campus_data.db")
+    parser.add_argument("source", nargs="?", default=gtfs_url, help="GTFS zip URL or local path")
+    parser.add_argument("--db", default="campus_data.db")
+    parser.add_argument("--force", action="store_true", help="reload even if the feed is unchanged")
+    args = parser.parse_args()
+
+    counts = load_gtfs(args.source, args.db, args.force)
+    if counts:
+        for table, count in counts.items():
+            print(f"{table}: {count} rows")
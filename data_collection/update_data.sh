@@ -40,5 +40,26 @@ else
     echo "✗ Failed to update weather forecast data" >> "$LOG_FILE"
 fi
 
+# Update transit GTFS data (skipped automatically when the feed is unchanged)
+echo "Updating transit data..." >> "$LOG_FILE"
+python3 transit.py >> "$LOG_FILE" 2>&1
+if [ $? -eq 0 ]; then
+    echo "✓ Transit data updated successfully" >> "$LOG_FILE"
+else
+    echo "✗ Failed to update transit data" >> "$LOG_FILE"
+fi
+
+# Publish an immutable snapshot for a backend serving from SIGAIDA_SNAPSHOT_DIR
+if [ -n "$SIGAIDA_SNAPSHOT_DIR" ]; then
+    echo "Publishing snapshot..." >> "$LOG_FILE"
+    # publish_snapshot.py reads SIGAIDA_SNAPSHOT_DIR itself, resolving a relative value like the backend
+    python3 publish_snapshot.py >> "$LOG_FILE" 2>&1
+    if [ $? -eq 0 ]; then
+        echo "✓ Snapshot published" >> "$LOG_FILE"
+    else
+        echo "✗ Failed to publish snapshot" >> "$LOG_FILE"
+    fi
+fi
+
 echo "Data update completed at: $(date)" >> "$LOG_FILE"
 echo "" >> "$LOG_FILE"
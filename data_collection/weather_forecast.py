@@ -1,6 +1,10 @@
-import requests, sqlite3
+import sqlite3
+
 import pandas as pd
 
+from http_client import get_json
+from storage import bump_ingest_state, create_schema
+
 lat, lon = 40.1164, -88.2434
 meteo_url = "https://api.open-meteo.com/v1/forecast"
 
@@ -25,9 +29,8 @@ params = {
     "timezone": "America/Chicago",
     "forecast_days": 16
 }
-response = requests.get(meteo_url, params=params)
-response.raise_for_status()
-data = response.json()
+# Forecast models update hourly, so a cached copy younger than that is still current
+data = get_json(meteo_url, params=params, ttl=3600)
 
 # Extract hourly data
 hourly_data = data["hourly"]
@@ -55,8 +58,11 @@ insert_sql = f"INSERT INTO weather_forecast ({quoted_cols}) VALUES ({placeholder
 # Convert DataFrame rows to list of tuples for executemany
 param_rows = [tuple(row) for row in rows]
 
-# Insert rows in a transaction
+# Insert rows in a transaction, logging the run so the API can push the new forecast
 cursor.executemany(insert_sql, param_rows)
+create_schema(connection)
+first, last = (pd.Timestamp(hourly_data["time"][i]).tz_localize("America/Chicago").timestamp() for i in (0, -1))
+bump_ingest_state(connection, "weather_forecast", last, first)
 connection.commit()
 
 # Clean up
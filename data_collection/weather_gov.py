@@ -1,19 +1,18 @@
-import requests, sqlite3
+import sqlite3
 
-USER_AGENT = "UIUCEnvApp (timkhaiet@gmail.com)"  # per NWS API rules
+from http_client import get_json
+
+# The shared client sends the User-Agent contact the NWS API rules require
 lat, lon = 40.1164, -88.2434
 points_url = f"https://api.weather.gov/points/{lat},{lon}"
 
-# Get forecast endpoints for UIUC point
-resp = requests.get(points_url, headers={"User-Agent": USER_AGENT})
-resp.raise_for_status()
-point_data = resp.json()
+# Get forecast endpoints for UIUC point. The grid mapping rarely changes; NWS sends
+# Cache-Control for both responses, and the ttl only applies when it doesn't.
+point_data = get_json(points_url, ttl=86400)
 forecast_url = point_data["properties"]["forecastHourly"]
 
 # Fetch hourly forecast JSON
-resp2 = requests.get(forecast_url, headers={"User-Agent": USER_AGENT})
-resp2.raise_for_status()
-weather_data = resp2.json()
+weather_data = get_json(forecast_url, ttl=900)
 
 # Create SQLite table for weather (timestamp, temperature, etc.)
 conn = sqlite3.connect("campus_data.db")
@@ -8,6 +8,9 @@ import { WeatherData, WeatherForecastData } from '@/lib/types';
 import { formatTemperature, formatNumber, getDateRange } from '@/lib/utils';
 import { Cloud, Droplet, Wind, Sun, CloudRain } from 'lucide-react';
 
+// Charts can't draw more points than this, so longer ranges are downsampled server-side
+const CHART_POINTS = 600;
+
 export default function WeatherPage() {
   const [currentWeather, setCurrentWeather] = useState<WeatherData | null>(null);
   const [historicalWeather, setHistoricalWeather] = useState<WeatherData[]>([]);
@@ -23,7 +26,7 @@ export default function WeatherPage() {
 
         const [current, historical, forecastData] = await Promise.all([
           getCurrentWeather(),
-          getHistoricalWeather(start, end, dateRange),
+          getHistoricalWeather(start, end, dateRange, { maxPoints: CHART_POINTS }),
           getWeatherForecast(),
         ]);
 
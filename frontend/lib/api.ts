@@ -4,16 +4,31 @@ import type {
   CurrentAirQualityResponse,
   HistoricalAirQualityResponse,
   OpenAQResponse,
+  RollupResponse,
+  PercentileResponse,
   HistoricalWeatherResponse,
+  ClimatologyResponse,
   WeatherForecastResponse,
   LatestNDVIResponse,
   NDVITimeSeriesResponse,
+  NDVIBatchTimeSeriesResponse,
   NDVIStatsResponse,
   NDVIMonthlyAverageResponse,
+  NDVIRastersResponse,
+  NDVIRaster,
+  NDVIChangeResponse,
+  NDVITrendResponse,
   TransitStopsResponse,
   TransitRoutesResponse,
+  NearbyStopsResponse,
+  NearbyStopsBatchResponse,
   DashboardSummary,
   HealthResponse,
+  CorrelationResponse,
+  BatchSubRequest,
+  BatchResponse,
+  LiveTopic,
+  LiveDelta,
 } from './types';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
@@ -26,6 +41,21 @@ const api = axios.create({
   },
 });
 
+// Server-side downsampling for long time-series ranges
+export interface DownsampleOptions {
+  resolution?: 'hour' | 'day' | 'week' | 'month';
+  agg?: 'mean' | 'min' | 'max';
+  maxPoints?: number; // e.g. the chart width in pixels
+  lttbColumn?: string;
+}
+
+const appendDownsample = (params: URLSearchParams, options: DownsampleOptions) => {
+  if (options.resolution) params.append('resolution', options.resolution);
+  if (options.agg) params.append('agg', options.agg);
+  if (options.maxPoints) params.append('max_points', Math.round(options.maxPoints).toString());
+  if (options.lttbColumn) params.append('lttb_column', options.lttbColumn);
+};
+
 // Health Check
 export const getHealth = async (): Promise<HealthResponse> => {
   const response = await api.get<HealthResponse>('/api/health');
@@ -41,12 +71,14 @@ export const getCurrentAirQuality = async (): Promise<CurrentAirQualityResponse>
 export const getHistoricalAirQuality = async (
   startDate?: string,
   endDate?: string,
-  limit: number = 1000
+  limit: number = 1000,
+  options: DownsampleOptions = {}
 ): Promise<HistoricalAirQualityResponse> => {
   const params = new URLSearchParams();
   if (startDate) params.append('start_date', startDate);
   if (endDate) params.append('end_date', endDate);
   params.append('limit', limit.toString());
+  appendDownsample(params, options);
 
   const response = await api.get<HistoricalAirQualityResponse>(
     `/api/air-quality/historical?${params.toString()}`
@@ -59,6 +91,36 @@ export const getOpenAQData = async (hours: number = 24): Promise<OpenAQResponse>
   return response.data;
 };
 
+export const getAirQualityRollups = async (
+  metric: string = 'pm2_5',
+  period: 'day' | 'week' | 'month' = 'day',
+  source: 'air_quality' | 'openaq' = 'air_quality',
+  startDate?: string,
+  endDate?: string
+): Promise<RollupResponse> => {
+  const params = new URLSearchParams({ metric, period, source });
+  if (startDate) params.append('start_date', startDate);
+  if (endDate) params.append('end_date', endDate);
+
+  const response = await api.get<RollupResponse>(`/api/air-quality/rollups?${params.toString()}`);
+  return response.data;
+};
+
+export const getAirQualityPercentiles = async (
+  metric: string = 'pm2_5',
+  quantiles: number[] = [0.05, 0.5, 0.95],
+  source: 'air_quality' | 'openaq' = 'air_quality',
+  startDate?: string,
+  endDate?: string
+): Promise<PercentileResponse> => {
+  const params = new URLSearchParams({ metric, q: quantiles.join(','), source });
+  if (startDate) params.append('start_date', startDate);
+  if (endDate) params.append('end_date', endDate);
+
+  const response = await api.get<PercentileResponse>(`/api/air-quality/percentiles?${params.toString()}`);
+  return response.data;
+};
+
 // Weather APIs
 export const getCurrentWeather = async () => {
   const response = await api.get('/api/weather/current');
@@ -68,12 +130,14 @@ export const getCurrentWeather = async () => {
 export const getHistoricalWeather = async (
   startDate?: string,
   endDate?: string,
-  limit: number = 365
+  limit: number = 365,
+  options: DownsampleOptions = {}
 ): Promise<HistoricalWeatherResponse> => {
   const params = new URLSearchParams();
   if (startDate) params.append('start_date', startDate);
   if (endDate) params.append('end_date', endDate);
   params.append('limit', limit.toString());
+  appendDownsample(params, options);
 
   const response = await api.get<HistoricalWeatherResponse>(
     `/api/weather/historical?${params.toString()}`
@@ -81,6 +145,19 @@ export const getHistoricalWeather = async (
   return response.data;
 };
 
+export const getWeatherClimatology = async (
+  startDate?: string,
+  endDate?: string,
+  variables: string[] = ['temperature_2m_max', 'temperature_2m_min', 'precipitation_sum']
+): Promise<ClimatologyResponse> => {
+  const params = new URLSearchParams({ variables: variables.join(',') });
+  if (startDate) params.append('start_date', startDate);
+  if (endDate) params.append('end_date', endDate);
+
+  const response = await api.get<ClimatologyResponse>(`/api/weather/climatology?${params.toString()}`);
+  return response.data;
+};
+
 export const getWeatherForecast = async (): Promise<WeatherForecastResponse> => {
   const response = await api.get<WeatherForecastResponse>('/api/weather/forecast');
   return response.data;
@@ -103,6 +180,15 @@ export const getNDVITimeSeries = async (
   return response.data;
 };
 
+// polygon is a ring of [lon, lat] pairs (GeoJSON order)
+export const getNDVITimeSeriesBatch = async (
+  points: { lat: number; lon: number }[],
+  polygon?: [number, number][]
+): Promise<NDVIBatchTimeSeriesResponse> => {
+  const response = await api.post<NDVIBatchTimeSeriesResponse>('/api/ndvi/timeseries/batch', { points, polygon });
+  return response.data;
+};
+
 export const getNDVIStats = async (): Promise<NDVIStatsResponse> => {
   const response = await api.get<NDVIStatsResponse>('/api/ndvi/stats');
   return response.data;
@@ -113,12 +199,136 @@ export const getNDVIMonthlyAverage = async (): Promise<NDVIMonthlyAverageRespons
   return response.data;
 };
 
+export const getNDVIRasters = async (): Promise<NDVIRastersResponse> => {
+  const response = await api.get<NDVIRastersResponse>('/api/ndvi/rasters');
+  return response.data;
+};
+
+// Latest month when year/month are omitted
+export const getNDVIRaster = async (year?: number, month?: number): Promise<NDVIRaster> => {
+  const params = year !== undefined && month !== undefined ? `?year=${year}&month=${month}` : '';
+  const response = await api.get<ArrayBuffer>(`/api/ndvi/raster${params}`, { responseType: 'arraybuffer' });
+  const header = (name: string) => Number(response.headers[`x-raster-${name}`]);
+  return {
+    year: header('year'),
+    month: header('month'),
+    width: header('width'),
+    height: header('height'),
+    originX: header('origin-x'),
+    originY: header('origin-y'),
+    cellSize: header('cell-size'),
+    values: new Float32Array(response.data),
+  };
+};
+
+// Color-mapped PNG (one pixel per cell) for an image overlay on the raster's bounds
+export const getNDVIRasterImageUrl = (year?: number, month?: number): string => {
+  const params = year !== undefined && month !== undefined ? `?year=${year}&month=${month}` : '';
+  return `${API_BASE_URL}/api/ndvi/raster.png${params}`;
+};
+
+// Periods are inclusive YYYY-MM ranges; the end defaults to the start month
+export const getNDVIChange = async (
+  before: { start: string; end?: string },
+  after: { start: string; end?: string },
+  alpha: number = 0.05
+): Promise<NDVIChangeResponse> => {
+  const params = new URLSearchParams({
+    before_start: before.start,
+    after_start: after.start,
+    alpha: String(alpha),
+  });
+  if (before.end) params.append('before_end', before.end);
+  if (after.end) params.append('after_end', after.end);
+
+  const response = await api.get<NDVIChangeResponse>(`/api/ndvi/change?${params.toString()}`);
+  return response.data;
+};
+
+export const getNDVITrend = async (
+  startMonth?: string,
+  endMonth?: string,
+  monthsOfYear: number[] = [],
+  alpha: number = 0.05
+): Promise<NDVITrendResponse> => {
+  const params = new URLSearchParams({ alpha: String(alpha) });
+  if (startMonth) params.append('start_month', startMonth);
+  if (endMonth) params.append('end_month', endMonth);
+  if (monthsOfYear.length) params.append('months_of_year', monthsOfYear.join(','));
+
+  const response = await api.get<NDVITrendResponse>(`/api/ndvi/trend?${params.toString()}`);
+  return response.data;
+};
+
 // Transit APIs
 export const getTransitStops = async (): Promise<TransitStopsResponse> => {
   const response = await api.get<TransitStopsResponse>('/api/transit/stops');
   return response.data;
 };
 
+export const getNearestStops = async (
+  lat: number,
+  lon: number,
+  k: number = 5,
+  maxDistanceM: number = 5000
+): Promise<NearbyStopsResponse> => {
+  const response = await api.get<NearbyStopsResponse>(
+    `/api/transit/stops/nearest?lat=${lat}&lon=${lon}&k=${k}&max_distance_m=${maxDistanceM}`
+  );
+  return response.data;
+};
+
+export const getStopsWithin = async (
+  lat: number,
+  lon: number,
+  radiusM: number = 500,
+  limit: number = 100
+): Promise<NearbyStopsResponse> => {
+  const response = await api.get<NearbyStopsResponse>(
+    `/api/transit/stops/within?lat=${lat}&lon=${lon}&radius_m=${radiusM}&limit=${limit}`
+  );
+  return response.data;
+};
+
+export const getStopsInBounds = async (
+  south: number,
+  west: number,
+  north: number,
+  east: number,
+  limit: number = 1000
+): Promise<NearbyStopsResponse> => {
+  const response = await api.get<NearbyStopsResponse>(
+    `/api/transit/stops/bbox?south=${south}&west=${west}&north=${north}&east=${east}&limit=${limit}`
+  );
+  return response.data;
+};
+
+export const getNearestStopsBatch = async (
+  points: { lat: number; lon: number }[],
+  k: number = 5,
+  maxDistanceM: number = 5000
+): Promise<NearbyStopsBatchResponse> => {
+  const response = await api.post<NearbyStopsBatchResponse>('/api/transit/stops/nearest/batch', {
+    points,
+    k,
+    max_distance_m: maxDistanceM,
+  });
+  return response.data;
+};
+
+export const getStopsWithinBatch = async (
+  points: { lat: number; lon: number }[],
+  radiusM: number = 500,
+  limit: number = 100
+): Promise<NearbyStopsBatchResponse> => {
+  const response = await api.post<NearbyStopsBatchResponse>('/api/transit/stops/within/batch', {
+    points,
+    radius_m: radiusM,
+    limit,
+  });
+  return response.data;
+};
+
 export const getTransitRoutes = async (): Promise<TransitRoutesResponse> => {
   const response = await api.get<TransitRoutesResponse>('/api/transit/routes');
   return response.data;
@@ -130,4 +340,42 @@ export const getDashboardSummary = async (): Promise<DashboardSummary> => {
   return response.data;
 };
 
+// Analytics APIs
+export const getCorrelations = async (
+  aqVariables: string[] = ['pm2_5', 'ozone'],
+  weatherVariables: string[] = ['temperature_2m_max', 'wind_speed_10m_max', 'precipitation_sum'],
+  options: { startDate?: string; endDate?: string; method?: 'pearson' | 'spearman'; maxLag?: number } = {}
+): Promise<CorrelationResponse> => {
+  const params = new URLSearchParams({
+    aq_variables: aqVariables.join(','),
+    weather_variables: weatherVariables.join(','),
+  });
+  if (options.startDate) params.append('start_date', options.startDate);
+  if (options.endDate) params.append('end_date', options.endDate);
+  if (options.method) params.append('method', options.method);
+  if (options.maxLag !== undefined) params.append('max_lag', String(options.maxLag));
+
+  const response = await api.get<CorrelationResponse>(`/api/analytics/correlation?${params.toString()}`);
+  return response.data;
+};
+
+// Batch API: several calls in one round trip, answered from one database snapshot
+export const batchRequests = async (requests: BatchSubRequest[]): Promise<BatchResponse> => {
+  const response = await api.post<BatchResponse>('/api/batch', { requests });
+  return response.data;
+};
+
+// Live updates: server-sent deltas after each ingest instead of polling.
+// Returns a function that closes the stream.
+export const subscribeLive = (
+  handlers: Partial<Record<LiveTopic, (delta: LiveDelta) => void>>
+): (() => void) => {
+  const topics = Object.keys(handlers) as LiveTopic[];
+  const source = new EventSource(`${API_BASE_URL}/api/stream?topics=${topics.join(',')}`);
+  topics.forEach((topic) => {
+    source.addEventListener(topic, (event) => handlers[topic]?.(JSON.parse((event as MessageEvent).data)));
+  });
+  return () => source.close();
+};
+
 export default api;
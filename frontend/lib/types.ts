@@ -42,6 +42,41 @@ export interface OpenAQResponse {
   sensor_id: string;
 }
 
+export interface RollupPoint {
+  time: string;
+  n: number;
+  mean?: number;
+  min?: number;
+  max?: number;
+  std?: number;
+}
+
+export interface RollupResponse {
+  data: RollupPoint[];
+  count: number;
+  source: 'air_quality' | 'openaq';
+  metric: string;
+  period: 'day' | 'week' | 'month';
+}
+
+export interface PercentileValue {
+  q: number;
+  value: number;
+}
+
+export interface PercentileResponse {
+  data: PercentileValue[];
+  metric: string;
+  source: 'air_quality' | 'openaq';
+  count: number;
+  min: number;
+  max: number;
+  relative_accuracy: number;
+  sketches_merged: number;
+  start_date?: string;
+  end_date?: string;
+}
+
 export interface WeatherData {
   time: string;
   temperature_2m_max?: number;
@@ -58,6 +93,33 @@ export interface WeatherData {
   et0_fao_evapotranspiration?: number;
 }
 
+export interface ClimatologyPoint {
+  time: string;
+  variable: string;
+  doy: number;
+  n?: number;
+  mean?: number;
+  std?: number;
+  p10?: number;
+  p25?: number;
+  p50?: number;
+  p75?: number;
+  p90?: number;
+  record_high?: number;
+  record_high_year?: number;
+  record_low?: number;
+  record_low_year?: number;
+  observed?: number;
+  anomaly?: number;
+}
+
+export interface ClimatologyResponse {
+  data: ClimatologyPoint[];
+  count: number;
+  start_date?: string;
+  end_date?: string;
+}
+
 export interface WeatherForecastData {
   time: string;
   temperature_2m?: number;
@@ -112,6 +174,20 @@ export interface NDVITimeSeriesResponse {
   location: { lat: number; lon: number };
 }
 
+export interface NDVICellSeries {
+  cell_id: number;
+  lat: number;
+  lon: number;
+  ndvi: (number | null)[]; // aligned with NDVIBatchTimeSeriesResponse.months
+}
+
+export interface NDVIBatchTimeSeriesResponse {
+  months: string[];
+  cells: NDVICellSeries[];
+  count: number;
+  point_cells: (number | null)[]; // cell of each requested point, null without data
+}
+
 export interface NDVIStatistics {
   mean_ndvi: number;
   min_ndvi: number;
@@ -137,6 +213,90 @@ export interface NDVIMonthlyAverageResponse {
   count: number;
 }
 
+export interface NDVIRasterInfo {
+  year: number;
+  month: number;
+  width: number;
+  height: number;
+  origin_x: number; // EPSG:3857 meters, top-left corner
+  origin_y: number;
+  cell_size: number;
+  valid_cells: number;
+  min: number | null;
+  max: number | null;
+  mean: number | null;
+  digest: string;
+  bounds: { west: number; south: number; east: number; north: number };
+}
+
+export interface NDVIRastersResponse {
+  data: NDVIRasterInfo[];
+  count: number;
+}
+
+export interface NDVIChangeSummary {
+  cells: number;
+  mean_delta?: number | null;
+  mean_slope?: number | null;
+  significant_increase: number;
+  significant_decrease: number;
+  before_months?: number | null;
+  after_months?: number | null;
+  months?: number | null;
+}
+
+export interface NDVIChangeCell {
+  cell_id: number;
+  lat: number;
+  lon: number;
+  before: number | null;
+  after: number | null;
+  delta: number;
+  p_value: number | null; // null unless both periods span 2+ months
+  significant: boolean | null;
+}
+
+export interface NDVIChangeResponse {
+  data: NDVIChangeCell[];
+  count: number;
+  summary: NDVIChangeSummary;
+  before: { start: string; end: string };
+  after: { start: string; end: string };
+  grid_version: string;
+}
+
+export interface NDVITrendCell {
+  cell_id: number;
+  lat: number;
+  lon: number;
+  slope: number; // NDVI per year
+  n: number;
+  p_value: number | null;
+  significant: boolean | null;
+}
+
+export interface NDVITrendResponse {
+  data: NDVITrendCell[];
+  count: number;
+  summary: NDVIChangeSummary;
+  start_month: string | null;
+  end_month: string | null;
+  months_of_year: number[];
+  grid_version: string;
+}
+
+// Packed float32 grid, row-major and north-up; NaN where a cell has no data
+export interface NDVIRaster {
+  year: number;
+  month: number;
+  width: number;
+  height: number;
+  originX: number;
+  originY: number;
+  cellSize: number;
+  values: Float32Array;
+}
+
 export interface TransitStop {
   stop_id: string;
   stop_name: string;
@@ -144,6 +304,21 @@ export interface TransitStop {
   stop_lon: number;
 }
 
+export interface NearbyStop extends TransitStop {
+  distance_m?: number | null; // great-circle meters from the query point
+}
+
+export interface NearbyStopsResponse {
+  data: NearbyStop[];
+  count: number;
+  query: Record<string, number>;
+}
+
+export interface NearbyStopsBatchResponse {
+  results: NearbyStop[][]; // one list per query point, in request order
+  count: number;
+}
+
 export interface TransitRoute {
   route_id: string;
   route_short_name?: string;
@@ -174,3 +349,57 @@ export interface HealthResponse {
   database_connected: boolean;
   version: string;
 }
+
+// Analytics types
+export interface LaggedCorrelation {
+  x: string;
+  y: string;
+  lags: number[]; // days; positive means the weather variable leads
+  r: (number | null)[];
+  n: number[];
+  best_lag: number | null;
+  best_r: number | null;
+}
+
+export interface CorrelationResponse {
+  variables: string[];
+  method: 'pearson' | 'spearman';
+  matrix: (number | null)[][];
+  n: number[][];
+  lagged: LaggedCorrelation[];
+  start_date: string;
+  end_date: string;
+  days: number;
+  data_version: string;
+}
+
+// Batch API
+export interface BatchSubRequest {
+  id?: string;
+  method?: 'GET' | 'POST';
+  path: string; // e.g. '/api/weather/historical?limit=30'
+  body?: unknown;
+}
+
+export interface BatchResult<T = any> {
+  id: string;
+  status: number;
+  duration_ms: number;
+  content_type?: string | null;
+  body: T | null;
+}
+
+export interface BatchResponse {
+  results: BatchResult[];
+  count: number;
+  duration_ms: number;
+}
+
+// Live updates (/api/stream)
+export type LiveTopic = 'aq' | 'openaq' | 'forecast' | 'anomalies';
+
+export interface LiveDelta<T = any> {
+  version: number;
+  rows?: T[];
+  reset?: boolean; // too much changed; refetch over REST
+}